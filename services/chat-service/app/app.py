@@ -12,6 +12,9 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from common.accessfilter import AccessFilter
+from common.instrumentation import InstrumentedFernet, setup_metrics
+from common.tracing import setup_tracing
 from .schemas import Chat, ChatIn, Message, MessageIn, MessageUpdate, MessageDocument
 from . import schemas
 from . import crud
@@ -34,6 +37,9 @@ app_config: config.Config = config.load_config()
 
 app = FastAPI(title='Chat Service')
 
+setup_metrics(app, database.pool_monitor)
+setup_tracing(app, app_config, 'chat-service')
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Разрешите запросы с любых источников
@@ -42,10 +48,15 @@ app.add_middleware(
     allow_headers=["*"],  # Разрешите все заголовки
 )
 
-CIPHER_SUITE: Fernet = Fernet(
+CIPHER_SUITE: Fernet = InstrumentedFernet(
     base64.b64decode(app_config.encrypt_key.get_secret_value())
 )
 
+# Список встреч проверяется шлюзом целиком: пациент видит только встречи по своим записям
+ACCESS_FILTER: AccessFilter = AccessFilter(
+    app_config.gateway_url, app_config.gateway_timeout, app_config.authorize_batch_size
+)
+
 ROOT_SERVICE_DIR = pathlib.Path(__file__).parent.parent.resolve()
 
 room_managers = {}
@@ -200,19 +211,32 @@ async def get_meeting(
 
 
 @app.get("/meetings", response_model=list[schemas.MeetingDB], tags=["meetings"])
-async def get_meetings( 
+async def get_meetings(
+    request: Request,
     session: AsyncSession = Depends(database.get_async_session)
 ):
-    return await crud.get_meetings_list(session)
+    meetings = await crud.get_meetings_list(session)
+    return await ACCESS_FILTER.filter(request, meetings, lambda meeting: f'/meetings/{meeting.meeting_id}')
+
+
+@app.get("/metrics/db-pool", summary="Возвращает статистику пула соединений с базой данных", tags=["metrics"])
+async def get_db_pool_metrics():
+    return database.pool_monitor.stats
 
 
 @app.on_event("startup")
 async def on_startup():
     await database.DB_INITIALIZER.init_database(
-        app_config.postgres_dsn_async.unicode_string()
+        app_config.postgres_dsn_async.unicode_string(),
+        **database.make_engine_options(app_config)
     )
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await ACCESS_FILTER.close()
+
+
 async def get_meeting_id(topic, start_date, start_time):
     access_token = get_token()
     headers = {
@@ -6,13 +6,15 @@ from cryptography.fernet import Fernet
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_, update, delete
 
+from common.instrumentation import InstrumentedFernet
+
 from .database import models
 from .schemas import ChatIn, MessageIn, MessageUpdate, MeetingIn
 from . import config
 
 
 cfg: config.Config = config.load_config();
-CIPHER_SUITE: Fernet = Fernet(
+CIPHER_SUITE: Fernet = InstrumentedFernet(
     base64.b64decode(cfg.encrypt_key.get_secret_value())
 )
 
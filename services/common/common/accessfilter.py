@@ -0,0 +1,81 @@
+from typing import Callable, TypeVar
+
+import httpx
+from fastapi import HTTPException, Request
+
+from common.tracing import tracer
+
+
+T = TypeVar('T')
+
+
+class AccessFilter:
+    """
+    Оставляет в ответе-списке только ресурсы, доступные пользователю запроса. Доступ ко всем ресурсам
+    списка проверяется шлюзом одним запросом POST /authorize с токеном пользователя,
+    а не отдельной проверкой каждого ресурса
+    """
+
+    def __init__(
+            self, gateway_url: str, timeout: float = 5, batch_size: int = 1000,
+            transport: httpx.AsyncBaseTransport | None = None
+        ) -> None:
+        self.gateway_url = gateway_url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.gateway_url)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Клиент создается один раз, соединения со шлюзом переиспользуются между запросами
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.gateway_url, timeout=self.timeout, transport=self.transport
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def authorize(self, authorization: str, resources: list[str], method: str = 'GET') -> set[str]:
+        """
+        Возвращает доступные ресурсы. Если шлюз недоступен, запрос завершается ошибкой 503:
+        без ответа шлюза список не отдается, чтобы не раскрыть чужие ресурсы
+        """
+        allowed = set()
+        headers = tracer.inject_headers([(b'authorization', authorization.encode())])
+        # Шлюз ограничивает число ресурсов в одном запросе, длинный список проверяется частями
+        for start in range(0, len(resources), self.batch_size):
+            try:
+                response = await self.client.post('/authorize', headers=headers, json={
+                    'method': method, 'resources': resources[start:start + self.batch_size]
+                })
+            except httpx.HTTPError:
+                raise HTTPException(detail='Не удалось проверить доступ к ресурсам', status_code=503)
+            if response.status_code != 200:
+                raise HTTPException(detail='Не удалось проверить доступ к ресурсам', status_code=503)
+            allowed.update(response.json()['allowed'])
+        return allowed
+
+    async def filter(
+            self, request: Request, items: list[T], get_resource: Callable[[T], str], method: str = 'GET'
+        ) -> list[T]:
+        """
+        Возвращает элементы списка, ресурсы которых (например, /meetings/<id>) доступны пользователю, в исходном порядке
+        """
+        if not self.enabled or not items:
+            return items
+        authorization = request.headers.get('authorization')
+        if authorization is None:
+            return []
+        resources = [get_resource(item) for item in items]
+        with tracer.child_span('authorize.list', attributes={'authorize.resources': len(resources)}):
+            allowed = await self.authorize(authorization, resources, method)
+        return [item for item, resource in zip(items, resources) if resource in allowed]
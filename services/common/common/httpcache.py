@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable
+
+from fastapi import Request, Response
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    etag: str
+    expire_at: float
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def make_entry(body: bytes, ttl: float = 0, etag: str | None = None) -> CacheEntry:
+    """
+    Создает запись кэша с готовым телом ответа. Если ETag не передан, он вычисляется по телу
+    """
+    return CacheEntry(
+        body=body,
+        etag=etag if etag is not None else make_etag(body),
+        expire_at=time.monotonic() + ttl
+    )
+
+
+def make_response(entry: CacheEntry, request: Request) -> Response:
+    """
+    Формирует JSON-ответ из записи кэша с учетом заголовка If-None-Match
+    """
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in etags or entry.etag in etags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+class ReferenceCache:
+    """
+    Кэш справочников, которые почти не меняются.
+    Каждый справочник имеет версию, которая увеличивается при любой записи в него,
+    поэтому данные, прочитанные из базы до записи, не попадут в кэш после нее.
+    Хранится не больше max_entries записей: при переполнении удаляются давно не использованные.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 64) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__versions: dict[str, int] = {}
+        self.__entries: OrderedDict[tuple[str, Hashable], CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, name: str) -> int:
+        """
+        Возвращает текущую версию справочника
+        """
+        with self.__lock:
+            return self.__versions.get(name, 0)
+
+    def get(self, name: str, key: Hashable = None) -> CacheEntry | None:
+        """
+        Возвращает сериализованный справочник из кэша
+        """
+        with self.__lock:
+            entry = self.__entries.get((name, key))
+            if entry is not None and entry.expire_at < time.monotonic():
+                del self.__entries[(name, key)]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end((name, key))
+            self.hits += 1
+            return entry
+
+    def set(self, name: str, key: Hashable, version: int, body: bytes) -> CacheEntry:
+        """
+        Сохраняет сериализованный справочник, если с момента чтения его версия не изменилась
+        """
+        entry = make_entry(body, self.ttl)
+        with self.__lock:
+            if self.__versions.get(name, 0) == version:
+                self.__entries[(name, key)] = entry
+                self.__entries.move_to_end((name, key))
+                while len(self.__entries) > self.max_entries:
+                    self.__entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, name: str) -> None:
+        """
+        Сбрасывает справочник и увеличивает его версию
+        """
+        with self.__lock:
+            self.__versions[name] = self.__versions.get(name, 0) + 1
+            for entry_key in [k for k in self.__entries if k[0] == name]:
+                del self.__entries[entry_key]
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.__entries),
+            "versions": dict(self.__versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
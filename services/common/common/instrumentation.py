@@ -0,0 +1,352 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+from fastapi import FastAPI, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .tracing import tracer
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+
+# Границы корзин гистограмм длительности, в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+# Длина текста SQL-запроса, сохраняемого в атрибутах span
+MAX_STATEMENT_LENGTH = 1000
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}', *self.samples()]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()) -> None:
+        super().__init__(name, description, label_names)
+        self.__values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self.__values[labels] = self.__values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self.__values.items())
+        for labels, value in values:
+            yield f'{self.name}{format_labels(self.label_names, labels)} {value}'
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()) -> None:
+        super().__init__(name, description, label_names)
+        self.__values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self.__values[labels] = self.__values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            self.__values[labels] = value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self.__values.items())
+        for labels, value in values:
+            yield f'{self.name}{format_labels(self.label_names, labels)} {value}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+            self, name: str, description: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS
+        ) -> None:
+        super().__init__(name, description, label_names)
+        self.buckets = buckets
+        # Для каждого набора меток: счетчики корзин (без накопления), сумма и количество
+        self.__values: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            item = self.__values.get(labels)
+            if item is None:
+                item = self.__values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            item[0][index] += 1
+            item[1] += value
+            item[2] += 1
+
+    @contextmanager
+    def time(self, labels: tuple = ()):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(labels, time.perf_counter() - started)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.__values.items()]
+        for labels, counts, total, count in values:
+            yield from render_histogram(
+                self.name, self.label_names, labels, self.buckets, counts, total, count
+            )
+
+
+def render_histogram(
+        name: str, label_names: tuple, labels: tuple, buckets: tuple,
+        counts: list[int], total: float, count: int
+    ) -> Iterable[str]:
+    cumulative = 0
+    for bound, bucket_count in zip([*buckets, '+Inf'], counts):
+        cumulative += bucket_count
+        le = 'le="' + str(bound) + '"'
+        yield f'{name}_bucket{format_labels(label_names, labels, le)} {cumulative}'
+    yield f'{name}_sum{format_labels(label_names, labels)} {total}'
+    yield f'{name}_count{format_labels(label_names, labels)} {count}'
+
+
+class Registry:
+    """
+    Набор метрик сервиса. Помимо метрик можно зарегистрировать функции,
+    которые формируют строки метрик в момент запроса
+    """
+
+    def __init__(self) -> None:
+        self.__metrics: list[Metric] = []
+        self.__collectors: list[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.__metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        self.__collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.__metrics:
+            lines.extend(metric.render())
+        for collector in self.__collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY: Registry = Registry()
+
+HTTP_REQUEST_DURATION: Histogram = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Длительность обработки HTTP-запроса', ('method', 'route', 'status')
+))
+HTTP_REQUESTS_IN_FLIGHT: Gauge = REGISTRY.register(Gauge(
+    'http_requests_in_flight', 'Количество HTTP-запросов в обработке', ('method',)
+))
+DB_QUERY_DURATION: Histogram = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'Длительность выполнения запроса к базе данных', ('operation',)
+))
+DB_QUERY_ERRORS: Counter = REGISTRY.register(Counter(
+    'db_query_errors_total', 'Количество запросов к базе данных, завершившихся ошибкой', ('operation',)
+))
+CRYPTO_OPERATION_DURATION: Histogram = REGISTRY.register(Histogram(
+    'crypto_operation_duration_seconds', 'Длительность шифрования и расшифровки Fernet', ('operation',),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01)
+))
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware, которое измеряет длительность запросов по шаблонам маршрутов
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc((method,))
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec((method,))
+            # Маршрут добавляется в scope при маршрутизации, в метку попадает его шаблон,
+            # а не фактический путь, чтобы число временных рядов не зависело от идентификаторов
+            route = scope.get('route')
+            HTTP_REQUEST_DURATION.observe(
+                (method, route.path if route is not None else 'unmatched', str(status)),
+                time.perf_counter() - started
+            )
+
+
+def get_operation(statement: str) -> str:
+    operation = statement.lstrip()[:6].upper()
+    if operation in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+        return operation.lower()
+    return 'other'
+
+
+def on_before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    context._query_started = time.perf_counter()
+    # Запросы вне обработки запроса (например, при запуске) не трассируются
+    if tracer.is_recording():
+        context._trace_span = tracer.start_span(
+            'db.' + statement.lstrip().split(' ', 1)[0].lower(), kind='client',
+            attributes={'db.statement': statement[:MAX_STATEMENT_LENGTH]}
+        )
+
+
+def on_after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = getattr(context, '_query_started', None)
+    if started is not None:
+        DB_QUERY_DURATION.observe((get_operation(statement),), time.perf_counter() - started)
+    span = getattr(context, '_trace_span', None)
+    if span is not None:
+        context._trace_span = None
+        tracer.end_span(span)
+
+
+def on_handle_error(exception_context) -> None:
+    statement = exception_context.statement or ''
+    DB_QUERY_ERRORS.inc((get_operation(statement),))
+    span = getattr(exception_context.execution_context, '_trace_span', None)
+    if span is not None:
+        exception_context.execution_context._trace_span = None
+        span.set_error(exception_context.original_exception)
+        tracer.end_span(span)
+
+
+def instrument_sqlalchemy() -> None:
+    """
+    Подписывается на выполнение запросов всеми движками SQLAlchemy процесса: учитывает
+    длительность запросов в метриках и создает span запросов, если трасса попала в выборку
+    """
+    if event.contains(Engine, 'before_cursor_execute', on_before_cursor_execute):
+        return
+    event.listen(Engine, 'before_cursor_execute', on_before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', on_after_cursor_execute)
+    event.listen(Engine, 'handle_error', on_handle_error)
+
+
+if Fernet is not None:
+    class InstrumentedFernet(Fernet):
+        """
+        Fernet, который учитывает время шифрования и расшифровки в метриках и трассировке
+        """
+
+        def encrypt(self, data: bytes) -> bytes:
+            with CRYPTO_OPERATION_DURATION.time(('encrypt',)), tracer.child_span('crypto.encrypt'):
+                return super().encrypt(data)
+
+        def decrypt(self, token, ttl: int | None = None) -> bytes:
+            with CRYPTO_OPERATION_DURATION.time(('decrypt',)), tracer.child_span('crypto.decrypt'):
+                return super().decrypt(token, ttl)
+
+
+def collect_pool_metrics(pool_monitor) -> Iterable[str]:
+    stats = pool_monitor.stats
+    for name, key, description in (
+        ('db_pool_size', 'size', 'Размер пула соединений'),
+        ('db_pool_checked_out', 'checked_out', 'Количество выданных соединений'),
+        ('db_pool_overflow', 'overflow', 'Количество соединений сверх размера пула'),
+    ):
+        yield f'# HELP {name} {description}'
+        yield f'# TYPE {name} gauge'
+        yield f'{name} {stats[key]}'
+    yield '# HELP db_pool_long_held_total Количество соединений, удерживавшихся дольше порога'
+    yield '# TYPE db_pool_long_held_total counter'
+    yield f'db_pool_long_held_total {stats["long_held"]}'
+    yield '# HELP db_pool_checkout_seconds Время получения соединения из пула'
+    yield '# TYPE db_pool_checkout_seconds histogram'
+    buckets = tuple(bound for bound in stats['checkout_buckets'] if bound != '+Inf')
+    yield from render_histogram(
+        'db_pool_checkout_seconds', (), (), buckets,
+        list(stats['checkout_buckets'].values()),
+        stats['checkout_avg_ms'] * stats['checkouts'] / 1000,
+        stats['checkouts']
+    )
+
+
+def collect_cache_metrics(prefix: str, description: str, stats: dict) -> Iterable[str]:
+    for name, key, kind, title in (
+        (f'{prefix}_hits_total', 'hits', 'counter', 'Количество попаданий в кэш'),
+        (f'{prefix}_misses_total', 'misses', 'counter', 'Количество промахов кэша'),
+        (f'{prefix}_size', 'size', 'gauge', 'Количество записей в кэше'),
+    ):
+        yield f'# HELP {name} {title} ({description})'
+        yield f'# TYPE {name} {kind}'
+        yield f'{name} {stats[key]}'
+
+
+def register_cache_metrics(prefix: str, description: str, cache) -> None:
+    """
+    Добавляет в /metrics попадания, промахи и размер кэша по его свойству stats
+    (ключи hits, misses и size) под именами <prefix>_hits_total, <prefix>_misses_total и <prefix>_size
+    """
+    REGISTRY.add_collector(lambda: collect_cache_metrics(prefix, description, cache.stats))
+
+
+async def get_metrics() -> Response:
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def setup_metrics(app: FastAPI, pool_monitor=None, metrics_app: FastAPI | None = None) -> None:
+    """
+    Подключает сбор метрик к приложению и добавляет ресурс /metrics. Если передано metrics_app,
+    ресурс добавляется в него, а не в само приложение
+    """
+    instrument_sqlalchemy()
+    app.add_middleware(MetricsMiddleware)
+    if pool_monitor is not None:
+        REGISTRY.add_collector(lambda: collect_pool_metrics(pool_monitor))
+    (metrics_app or app).add_api_route('/metrics', get_metrics, methods=['GET'], include_in_schema=False)
@@ -0,0 +1,123 @@
+import bisect
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы времени получения соединения из пула, в секундах
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolMonitor:
+    """
+    Собирает статистику пула соединений: время получения соединения,
+    занятые и сверхлимитные соединения, соединения, удерживаемые дольше порога
+    """
+
+    def __init__(self) -> None:
+        self.session_warn_seconds = 5.0
+        self.__lock = threading.Lock()
+        self.__engine = None
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.checkout_max_seconds = 0.0
+        self.checkout_buckets = [0] * (len(CHECKOUT_BUCKETS) + 1)
+        self.long_held = 0
+        self.held_max_seconds = 0.0
+
+    def pool_class(self, base: type) -> type:
+        """
+        Возвращает класс пула, который измеряет время получения соединения,
+        включая ожидание свободного соединения
+        """
+        monitor = self
+
+        class InstrumentedPool(base):
+            def _do_get(self):
+                started = time.perf_counter()
+                connection = super()._do_get()
+                monitor.observe_checkout(time.perf_counter() - started)
+                return connection
+
+        return InstrumentedPool
+
+    def observe_checkout(self, seconds: float) -> None:
+        with self.__lock:
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            self.checkout_max_seconds = max(self.checkout_max_seconds, seconds)
+            self.checkout_buckets[bisect.bisect_left(CHECKOUT_BUCKETS, seconds)] += 1
+
+    def attach(self, engine) -> None:
+        """
+        Подписывается на выдачу и возврат соединений пула движка
+        """
+        self.__engine = engine
+        sync_engine = getattr(engine, 'sync_engine', engine)
+        event.listen(sync_engine, 'checkout', self.__on_checkout)
+        event.listen(sync_engine, 'checkin', self.__on_checkin)
+
+    def __on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info['checkout_at'] = time.monotonic()
+
+    def __on_checkin(self, dbapi_connection, connection_record) -> None:
+        checkout_at = connection_record.info.pop('checkout_at', None)
+        if checkout_at is None:
+            return
+        held = time.monotonic() - checkout_at
+        with self.__lock:
+            self.held_max_seconds = max(self.held_max_seconds, held)
+            if held < self.session_warn_seconds:
+                return
+            self.long_held += 1
+        logger.warning('Соединение с базой данных удерживалось %.1f с', held)
+
+    @property
+    def stats(self) -> dict:
+        pool = self.__engine.pool if self.__engine is not None else None
+        is_queue_pool = isinstance(pool, QueuePool)
+        with self.__lock:
+            return {
+                "size": pool.size() if is_queue_pool else 0,
+                "checked_out": pool.checkedout() if is_queue_pool else 0,
+                "checked_in": pool.checkedin() if is_queue_pool else 0,
+                "overflow": max(pool.overflow(), 0) if is_queue_pool else 0,
+                "checkouts": self.checkouts,
+                "checkout_avg_ms": self.checkout_seconds / self.checkouts * 1000 if self.checkouts else 0.0,
+                "checkout_max_ms": self.checkout_max_seconds * 1000,
+                "checkout_buckets": dict(zip(
+                    [str(bound) for bound in CHECKOUT_BUCKETS] + ["+Inf"], self.checkout_buckets
+                )),
+                "long_held": self.long_held,
+                "held_max_ms": self.held_max_seconds * 1000
+            }
+
+
+def make_engine_options(cfg, is_async: bool = True) -> dict:
+    """
+    Возвращает параметры движка из конфигурации сервиса и настраивает монитор пула
+    """
+    pool_monitor.session_warn_seconds = cfg.db_session_warn_seconds
+    options = {
+        "poolclass": pool_monitor.pool_class(AsyncAdaptedQueuePool if is_async else QueuePool),
+        "pool_size": cfg.db_pool_size,
+        "max_overflow": cfg.db_max_overflow,
+        "pool_timeout": cfg.db_pool_timeout,
+        "pool_recycle": cfg.db_pool_recycle,
+        "pool_pre_ping": cfg.db_pool_pre_ping
+    }
+    if cfg.db_statement_timeout > 0:
+        timeout = str(int(cfg.db_statement_timeout))
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+pool_monitor: PoolMonitor = PoolMonitor()
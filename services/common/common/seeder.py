@@ -0,0 +1,74 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass
+class SeedTable:
+    """
+    Данные для заполнения одной таблицы: модель, строки и обновляемые при конфликте колонки
+    """
+    model: Any
+    rows: list[dict]
+    update_columns: list[str] = field(default_factory=list)
+
+
+async def seed(
+        session: AsyncSession, seed_hash_model: Any, seed_name: str, content: bytes,
+        load_tables: Callable[[bytes], list[SeedTable]]
+    ) -> bool:
+    """
+    Заполняет таблицы начальными данными одним многострочным INSERT ... ON CONFLICT на таблицу
+    в одной транзакции. Ничего не делает, если файл с данными не изменился с прошлого запуска.
+    Хэш файла хранится в таблице модели seed_hash_model (колонки name и hash),
+    строки таблиц получает load_tables из содержимого файла только при его изменении.
+    Возвращает True, если данные были записаны
+    """
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    async with session.begin():
+        if await get_seed_hash(session, seed_hash_model, seed_name) == content_hash:
+            return False
+
+        # Реплики, запущенные одновременно, заполняют таблицы по очереди
+        await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(seed_name))))
+        if await get_seed_hash(session, seed_hash_model, seed_name) == content_hash:
+            return False
+
+        for table in load_tables(content):
+            if not table.rows:
+                continue
+            stm = insert(table.model).values(table.rows)
+            primary_keys = [c.name for c in table.model.__table__.primary_key]
+            if table.update_columns:
+                stm = stm.on_conflict_do_update(
+                    index_elements=primary_keys,
+                    set_={column: stm.excluded[column] for column in table.update_columns}
+                )
+            else:
+                stm = stm.on_conflict_do_nothing(index_elements=primary_keys)
+            await session.execute(stm)
+
+        stm = insert(seed_hash_model).values(name=seed_name, hash=content_hash)
+        stm = stm.on_conflict_do_update(
+            index_elements=['name'],
+            set_={"hash": content_hash}
+        )
+        await session.execute(stm)
+    return True
+
+
+async def get_seed_hash(
+        session: AsyncSession, seed_hash_model: Any, seed_name: str
+    ) -> str | None:
+    """
+    Возвращает хэш файла, которым таблицы были заполнены в прошлый раз
+    """
+    result = await session.execute(select(seed_hash_model.hash) \
+                                   .filter(seed_hash_model.name == seed_name)
+                                   )
+    return result.scalar_one_or_none()
@@ -0,0 +1,302 @@
+import contextvars
+import importlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from fastapi import FastAPI
+
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+TRACEPARENT_PATTERN = re.compile('^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+@dataclass
+class SpanContext:
+    """
+    Контекст трассировки, передаваемый между сервисами в заголовке traceparent (W3C Trace Context)
+    """
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+    @property
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-{"01" if self.sampled else "00"}'
+
+
+def parse_traceparent(value: str | None) -> SpanContext | None:
+    if not value:
+        return None
+    match = TRACEPARENT_PATTERN.match(value.strip().lower())
+    if match is None or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return SpanContext(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+def new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+@dataclass
+class SpanBatch:
+    """
+    Завершенные span одной трассы в пределах сервиса. Отправляются в экспортер
+    одним пакетом после завершения корневого span сервиса
+    """
+    spans: list[dict] = field(default_factory=list)
+    exported: bool = False
+
+
+@dataclass
+class Span:
+    name: str
+    context: SpanContext
+    parent_id: str | None
+    kind: str
+    batch: SpanBatch
+    is_local_root: bool
+    attributes: dict = field(default_factory=dict)
+    status: str = 'ok'
+    start: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    duration: float | None = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, exc: BaseException) -> None:
+        self.status = 'error'
+        self.attributes['error.type'] = type(exc).__name__
+        self.attributes['error.message'] = str(exc)
+
+    def to_dict(self, service_name: str) -> dict:
+        return {
+            'service': service_name,
+            'name': self.name,
+            'kind': self.kind,
+            'trace_id': self.context.trace_id,
+            'span_id': self.context.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+
+class Exporter:
+    def export(self, spans: list[dict]) -> None:
+        raise NotImplementedError
+
+
+class NoneExporter(Exporter):
+    def export(self, spans: list[dict]) -> None:
+        pass
+
+
+class ConsoleExporter(Exporter):
+    """
+    Выводит span в консоль, по одной строке JSON на span
+    """
+
+    def export(self, spans: list[dict]) -> None:
+        for span in spans:
+            print(json.dumps(span, ensure_ascii=False, default=str), flush=True)
+
+
+class FileExporter(Exporter):
+    """
+    Дописывает span в файл в формате JSON Lines
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.__lock = threading.Lock()
+
+    def export(self, spans: list[dict]) -> None:
+        lines = ''.join(json.dumps(span, ensure_ascii=False, default=str) + '\n' for span in spans)
+        with self.__lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.write(lines)
+
+
+def make_exporter(cfg) -> Exporter:
+    """
+    Создает экспортер по имени из конфигурации: none, console, file
+    или путь к классу экспортера в виде package.module:ClassName
+    """
+    name = cfg.tracing_exporter
+    if name == 'none':
+        return NoneExporter()
+    if name == 'console':
+        return ConsoleExporter()
+    if name == 'file':
+        return FileExporter(cfg.tracing_file_path)
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f'Неизвестный экспортер трассировки: {name}')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.service_name = 'unknown'
+        self.exporter: Exporter = NoneExporter()
+        self.sample_ratio = 1.0
+        self.__current: contextvars.ContextVar[Span | None] = contextvars.ContextVar('current_span', default=None)
+
+    def configure(self, service_name: str, exporter: Exporter, sample_ratio: float) -> None:
+        self.service_name = service_name
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+    @property
+    def enabled(self) -> bool:
+        return not isinstance(self.exporter, NoneExporter)
+
+    def current_span(self) -> Span | None:
+        return self.__current.get()
+
+    def start_span(
+            self, name: str, kind: str = 'internal', parent: SpanContext | None = None,
+            attributes: dict | None = None
+        ) -> Span:
+        """
+        Начинает span. Родителем становится переданный контекст другого сервиса
+        или текущий span, без них начинается новая трасса
+        """
+        current = self.current_span()
+        if parent is not None:
+            trace_id, parent_id, sampled, batch = parent.trace_id, parent.span_id, parent.sampled, None
+        elif current is not None:
+            trace_id, parent_id = current.context.trace_id, current.context.span_id
+            sampled, batch = current.context.sampled, current.batch
+        else:
+            trace_id, parent_id = new_id(16), None
+            sampled, batch = self.enabled and random.random() < self.sample_ratio, None
+        return Span(
+            name=name,
+            context=SpanContext(trace_id, new_id(8), sampled),
+            parent_id=parent_id,
+            kind=kind,
+            batch=batch if batch is not None else SpanBatch(),
+            is_local_root=batch is None,
+            attributes=attributes or {}
+        )
+
+    def end_span(self, span: Span) -> None:
+        span.duration = time.perf_counter() - span.started
+        if not span.context.sampled:
+            return
+        span.batch.spans.append(span.to_dict(self.service_name))
+        # Span, завершившийся после корневого, отправляется отдельно
+        if span.is_local_root or span.batch.exported:
+            spans, span.batch.spans = span.batch.spans, []
+            span.batch.exported = True
+            try:
+                self.exporter.export(spans)
+            except Exception:
+                logger.exception('Не удалось экспортировать трассировку')
+
+    @contextmanager
+    def span(
+            self, name: str, kind: str = 'internal', parent: SpanContext | None = None,
+            attributes: dict | None = None
+        ) -> Iterator[Span]:
+        span = self.start_span(name, kind, parent, attributes)
+        token = self.__current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.set_error(exc)
+            raise
+        finally:
+            self.__current.reset(token)
+            self.end_span(span)
+
+    @contextmanager
+    def child_span(self, name: str, attributes: dict | None = None) -> Iterator[Span | None]:
+        """
+        Создает вложенный span, только если текущая трасса попала в выборку.
+        Используется для частых операций, чтобы не тратить время на span вне трассировки
+        """
+        if not self.is_recording():
+            yield None
+            return
+        with self.span(name, attributes=attributes) as span:
+            yield span
+
+    def is_recording(self) -> bool:
+        current = self.current_span()
+        return current is not None and current.context.sampled
+
+    def inject_headers(self, headers: list[tuple[bytes, bytes]]) -> list[tuple[bytes, bytes]]:
+        """
+        Возвращает заголовки запроса к другому сервису с контекстом текущего span
+        """
+        result = [(key, value) for key, value in headers if key.lower() != TRACEPARENT_HEADER.encode()]
+        current = self.current_span()
+        if current is not None:
+            result.append((TRACEPARENT_HEADER.encode(), current.context.traceparent.encode()))
+        return result
+
+
+class TracingMiddleware:
+    """
+    ASGI-middleware, которое создает span обработки запроса. Если trust_incoming включен,
+    span продолжает трассу из заголовка traceparent входящего запроса
+    """
+
+    def __init__(self, app, trust_incoming: bool = True) -> None:
+        self.app = app
+        self.trust_incoming = trust_incoming
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] not in ('http', 'websocket') or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        if self.trust_incoming:
+            for key, value in scope['headers']:
+                if key == TRACEPARENT_HEADER.encode():
+                    parent = parse_traceparent(value.decode('latin-1'))
+                    break
+
+        method = scope.get('method', 'WEBSOCKET')
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                span.set_attribute('http.status_code', message['status'])
+            await send(message)
+
+        with tracer.span(method, kind='server', parent=parent,
+                         attributes={'http.method': method, 'http.target': scope['path']}) as span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get('route')
+                span.name = f'{method} {route.path if route is not None else "unmatched"}'
+
+
+def setup_tracing(app: FastAPI, cfg, service_name: str, trust_incoming: bool = True) -> None:
+    """
+    Настраивает трассировку сервиса: span запросов и экспортер из конфигурации.
+    Span SQL-запросов создают обработчики SQLAlchemy из common.instrumentation
+    """
+    tracer.configure(service_name, make_exporter(cfg), cfg.tracing_sample_ratio)
+    if not tracer.enabled:
+        return
+    app.add_middleware(TracingMiddleware, trust_incoming=trust_incoming)
+
+
+tracer: Tracer = Tracer()
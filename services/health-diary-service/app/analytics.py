@@ -0,0 +1,262 @@
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from .database import models
+
+
+cfg: config.Config = config.load_config()
+
+# Показатели, по которым ищутся отклонения
+ANALYTICS_METRICS = ('pulse', 'temperature', 'upper_pressure', 'lower_pressure', 'oxygen_level', 'sugar_level')
+
+# Границы нормы для среднего значения последних показаний
+NORMAL_RANGES = {
+    'pulse': (50, 110),
+    'temperature': (35.5, 37.5),
+    'upper_pressure': (90, 140),
+    'lower_pressure': (60, 90),
+    'oxygen_level': (94, 100),
+    'sugar_level': (3.9, 7.8)
+}
+
+# Минимальное стандартное отклонение показателя, чтобы стабильный ряд
+# не давал огромный z-score при небольшом изменении
+MIN_STD = {
+    'pulse': 3.0,
+    'temperature': 0.2,
+    'upper_pressure': 5.0,
+    'lower_pressure': 4.0,
+    'oxygen_level': 1.0,
+    'sugar_level': 0.3
+}
+
+
+@dataclass
+class ReadingsBatch:
+    """
+    Показания нескольких пациентов в виде массивов. Показания упорядочены
+    по пациенту и времени, user_index содержит номер пациента для каждого показания
+    """
+    user_ids: list[uuid.UUID]
+    user_index: np.ndarray
+    values: dict[str, np.ndarray]
+
+
+def detect_anomalies(
+        batch: ReadingsBatch, recent: int, min_baseline: int, z_threshold: float
+    ) -> list[list[dict]]:
+    """
+    Для каждого пациента сравнивает среднее последних recent показаний с базовой линией,
+    построенной по остальным показаниям окна, и с границами нормы.
+    Все пациенты обрабатываются одновременно, возвращается список отклонений по каждому пациенту
+    """
+    users = len(batch.user_ids)
+    anomalies = [[] for _ in range(users)]
+    size = len(batch.user_index)
+    if not size:
+        return anomalies
+
+    counts = np.bincount(batch.user_index, minlength=users)
+    ends = np.cumsum(counts)
+    position_from_end = ends[batch.user_index] - 1 - np.arange(size)
+    is_recent = position_from_end < recent
+
+    for metric in ANALYTICS_METRICS:
+        values = batch.values[metric]
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        baseline = valid & ~is_recent
+        current = valid & is_recent
+
+        baseline_count = np.bincount(batch.user_index, weights=baseline, minlength=users)
+        baseline_sum = np.bincount(batch.user_index, weights=filled * baseline, minlength=users)
+        baseline_squares = np.bincount(batch.user_index, weights=filled * filled * baseline, minlength=users)
+        current_count = np.bincount(batch.user_index, weights=current, minlength=users)
+        current_sum = np.bincount(batch.user_index, weights=filled * current, minlength=users)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            baseline_mean = baseline_sum / baseline_count
+            baseline_var = np.maximum(baseline_squares / baseline_count - baseline_mean ** 2, 0.0)
+            baseline_std = np.maximum(np.sqrt(baseline_var), MIN_STD[metric])
+            current_mean = current_sum / current_count
+            z = (current_mean - baseline_mean) / baseline_std
+
+        has_current = current_count > 0
+        is_drift = has_current & (baseline_count >= min_baseline) & (np.abs(z) >= z_threshold)
+        low, high = NORMAL_RANGES[metric]
+        is_out_of_range = has_current & ((current_mean < low) | (current_mean > high))
+
+        for user in np.flatnonzero(is_drift | is_out_of_range):
+            has_baseline = baseline_count[user] >= min_baseline
+            anomalies[user].append({
+                'metric': metric,
+                'kind': 'drift' if is_drift[user] else 'out_of_range',
+                'value': round(float(current_mean[user]), 2),
+                'baseline_mean': round(float(baseline_mean[user]), 2) if has_baseline else None,
+                'z_score': round(float(z[user]), 2) if has_baseline else None
+            })
+    return anomalies
+
+
+async def load_readings(
+        db: AsyncSession, user_ids: list[uuid.UUID], since: datetime
+    ) -> ReadingsBatch:
+    """
+    Загружает показания пациентов за окно анализа одним запросом
+    """
+    page = models.PageDiary
+    result = await db.execute(select(page.id_user, page.create_date,
+                                     *(getattr(page, metric) for metric in ANALYTICS_METRICS)) \
+                              .where(page.id_user.in_(user_ids), page.create_date >= since) \
+                              .order_by(page.id_user, page.create_date)
+                              )
+    rows = result.all()
+    positions = {user_id: index for index, user_id in enumerate(user_ids)}
+    batch = ReadingsBatch(
+        user_ids=user_ids,
+        user_index=np.fromiter((positions[row[0]] for row in rows), dtype=np.intp, count=len(rows)),
+        values={
+            metric: np.array([row[column] for row in rows], dtype=np.float64)
+            for column, metric in enumerate(ANALYTICS_METRICS, start=2)
+        }
+    )
+    # Пациенты упорядочены так же, как показания, чтобы номера пациентов шли подряд
+    order = np.argsort(batch.user_index, kind='stable')
+    batch.user_index = batch.user_index[order]
+    batch.values = {metric: values[order] for metric, values in batch.values.items()}
+    return batch
+
+
+@dataclass
+class AttentionEntry:
+    last_reading: datetime | None
+    anomalies: list[dict]
+    expire_at: float
+
+
+class AttentionCache:
+    """
+    Кэш результатов анализа по пациентам. Запись пересчитывается, если у пациента
+    появились новые показания, истекло время жизни записи или страница была изменена
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+        self.__entries: dict[uuid.UUID, AttentionEntry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_stale(self, last_readings: dict[uuid.UUID, datetime | None]) -> list[uuid.UUID]:
+        """
+        Возвращает пациентов, для которых нужно пересчитать результат
+        """
+        now = time.monotonic()
+        stale = []
+        with self.__lock:
+            for user_id, last_reading in last_readings.items():
+                entry = self.__entries.get(user_id)
+                if entry is None or entry.expire_at < now or entry.last_reading != last_reading:
+                    stale.append(user_id)
+            self.misses += len(stale)
+            self.hits += len(last_readings) - len(stale)
+        return stale
+
+    def get(self, user_id: uuid.UUID) -> AttentionEntry | None:
+        with self.__lock:
+            return self.__entries.get(user_id)
+
+    def set(self, user_id: uuid.UUID, last_reading: datetime | None, anomalies: list[dict]) -> None:
+        with self.__lock:
+            if len(self.__entries) >= self.max_size and user_id not in self.__entries:
+                self.__entries.clear()
+            self.__entries[user_id] = AttentionEntry(
+                last_reading=last_reading,
+                anomalies=anomalies,
+                expire_at=time.monotonic() + self.ttl
+            )
+
+    def invalidate(self, user_id: uuid.UUID) -> None:
+        with self.__lock:
+            self.__entries.pop(user_id, None)
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.__entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+async def get_doctor_patients(db: AsyncSession, doctor_id: uuid.UUID) -> list[uuid.UUID]:
+    """
+    Возвращает пациентов, записанных к врачу, по таблице записей сервиса записей
+    """
+    result = await db.execute(
+        text("SELECT DISTINCT id_user FROM public.record WHERE id_doctor = :doctor_id"),
+        {"doctor_id": doctor_id}
+    )
+    return [row.id_user for row in result]
+
+
+async def get_patients_needing_attention(
+        db: AsyncSession, user_ids: list[uuid.UUID]
+    ) -> list[dict]:
+    """
+    Возвращает пациентов с отклонениями показателей, сначала пациенты с наибольшим числом отклонений.
+    Пересчитываются только пациенты с новыми показаниями
+    """
+    if not user_ids:
+        return []
+    since = datetime.now(timezone.utc) - timedelta(days=cfg.analytics_window_days)
+    page = models.PageDiary
+    result = await db.execute(select(page.id_user, func.max(page.create_date)) \
+                              .where(page.id_user.in_(user_ids), page.create_date >= since) \
+                              .group_by(page.id_user)
+                              )
+    last_readings = {user_id: None for user_id in user_ids}
+    last_readings.update({row[0]: row[1] for row in result})
+
+    stale = attention_cache.get_stale(last_readings)
+    if stale:
+        batch = await load_readings(db, stale, since)
+        anomalies = detect_anomalies(
+            batch,
+            recent=cfg.analytics_recent_readings,
+            min_baseline=cfg.analytics_min_baseline,
+            z_threshold=cfg.analytics_z_threshold
+        )
+        for user_id, user_anomalies in zip(stale, anomalies):
+            attention_cache.set(user_id, last_readings[user_id], user_anomalies)
+
+    patients = []
+    for user_id in user_ids:
+        entry = attention_cache.get(user_id)
+        if entry is not None and entry.anomalies:
+            patients.append({
+                'id_user': user_id,
+                'last_reading': entry.last_reading,
+                'anomalies': entry.anomalies
+            })
+    patients.sort(key=lambda patient: (
+        -len(patient['anomalies']),
+        -max(abs(anomaly['z_score'] or 0) for anomaly in patient['anomalies'])
+    ))
+    return patients
+
+
+attention_cache: AttentionCache = AttentionCache(
+    ttl=cfg.analytics_cache_ttl, max_size=cfg.analytics_cache_max_size
+)
@@ -1,11 +1,15 @@
 import uuid
+from datetime import datetime, timedelta, timezone
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from .schemas import PageDiary, PageDiaryIn, PageDiaryOptional
-from .database import DB_INITIALIZER, get_async_session
-from . import crud, config
+from common.instrumentation import register_cache_metrics, setup_metrics
+from common.tracing import setup_tracing
+from .schemas import PageDiary, PageDiaryIn, PageDiaryOptional, SeriesBucket, DiarySeriesPoint, \
+    PageDiaryBatchItem, BatchResult, PatientAttention
+from .database import DB_INITIALIZER, get_async_session, make_engine_options, pool_monitor
+from . import crud, config, series, batch, analytics
 
 description = """
 
@@ -33,6 +37,10 @@ tags_metadata = [
     {
         "name": "diaries",
         "description": "Операции с дневниками здоровья",
+    },
+    {
+        "name": "analytics",
+        "description": "Анализ показателей дневников здоровья",
     }
 ]
 
@@ -42,6 +50,10 @@ app = FastAPI(title='Health Diary Service',
               description=description,
               openapi_tags=tags_metadata)
 
+setup_metrics(app, pool_monitor)
+register_cache_metrics('attention_cache', 'результаты анализа показателей', analytics.attention_cache)
+setup_tracing(app, cfg, 'health-diary-service')
+
 
 @app.post(
     '/diaries/user/{user_id}',
@@ -53,6 +65,47 @@ async def add_diary(user_id: uuid.UUID, page_diary_in: PageDiaryIn, db: AsyncSes
     return await crud.create_page_diary(db, user_id, page_diary_in)
 
 
+@app.post(
+    '/diaries/user/{user_id}/batch',
+    response_model=BatchResult,
+    summary='Добавляет пакет показаний устройства в дневник здоровья',
+    tags=["diaries"],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": PageDiaryBatchItem.model_json_schema()}
+                },
+                "application/x-ndjson": {
+                    "schema": PageDiaryBatchItem.model_json_schema()
+                }
+            }
+        }
+    }
+)
+async def add_diary_batch(user_id: uuid.UUID, request: Request, db: AsyncSession = Depends(get_async_session)):
+    errors = {}
+    content_type = request.headers.get('content-type', 'application/json').split(';')[0].strip()
+    try:
+        batch.check_content_length(request.headers.get('content-length'), cfg.diary_batch_max_bytes)
+        chunks = batch.read_limited(request.stream(), cfg.diary_batch_max_bytes)
+        if content_type in batch.NDJSON_CONTENT_TYPES:
+            items = await batch.parse_ndjson(chunks, cfg.diary_batch_max_size, errors)
+        else:
+            items = await batch.parse_json_array(chunks, cfg.diary_batch_max_size)
+    except batch.BatchFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except batch.BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    results = await batch.create_page_diary_batch(db, user_id, items, errors)
+    counts = {status: 0 for status in ('created', 'duplicate', 'invalid')}
+    for item in results:
+        counts[item['status']] += 1
+    return {**counts, 'items': results}
+
+
 @app.get(
     '/diaries/user/{user_id}',
     response_model=list[PageDiary],
@@ -61,9 +114,52 @@ async def add_diary(user_id: uuid.UUID, page_diary_in: PageDiaryIn, db: AsyncSes
 )
 async def get_diary_list(
     user_id: uuid.UUID,
+    start: datetime | None = None,
+    end: datetime | None = None,
     db: AsyncSession = Depends(get_async_session)
     ):
-    return await crud.get_page_diary_list(db, user_id)
+    return await crud.get_page_diary_list(db, user_id, start, end)
+
+
+@app.get(
+    '/diaries/user/{user_id}/series',
+    response_model=list[DiarySeriesPoint],
+    summary='Возвращает показатели дневника пользователя, агрегированные по интервалам',
+    tags=["diaries"]
+)
+async def get_diary_series(
+    user_id: uuid.UUID,
+    bucket: SeriesBucket = SeriesBucket.day,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: AsyncSession = Depends(get_async_session)
+    ):
+    end = series.as_utc(end) if end is not None else datetime.now(timezone.utc)
+    start = series.as_utc(start) if start is not None else end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="Начало периода должно быть раньше его окончания")
+    if series.count_buckets(start, end, bucket.value) > cfg.series_max_points:
+        raise HTTPException(status_code=422, detail="Слишком много точек, уменьшите период или увеличьте интервал")
+    return await series.get_page_diary_series(db, user_id, start, end, bucket.value)
+
+
+@app.get(
+    '/diaries/doctor/{doctor_id}/attention',
+    response_model=list[PatientAttention],
+    summary='Возвращает пациентов врача, показатели которых требуют внимания',
+    tags=["analytics"]
+)
+async def get_patients_needing_attention(
+    doctor_id: uuid.UUID,
+    db: AsyncSession = Depends(get_async_session)
+    ):
+    patients = await analytics.get_doctor_patients(db, doctor_id)
+    return await analytics.get_patients_needing_attention(db, patients)
+
+
+@app.get('/metrics/db-pool', summary='Возвращает статистику пула соединений с базой данных', tags=["metrics"])
+async def get_db_pool_metrics():
+    return pool_monitor.stats
 
 
 @app.patch(
@@ -99,5 +195,11 @@ async def delete_diary(page_diary_id: uuid.UUID, db: AsyncSession = Depends(get_
 @app.on_event("startup")
 async def on_startup():
     await DB_INITIALIZER.init_database(
-        cfg.postgres_dsn_async.unicode_string()
+        cfg.postgres_dsn_async.unicode_string(),
+        **make_engine_options(cfg)
     )
+    async with DB_INITIALIZER.async_session_maker() as session:
+        if cfg.diary_daily_rollup:
+            await series.fill_daily_rollup(session)
+        else:
+            await series.invalidate_daily_rollup(session)
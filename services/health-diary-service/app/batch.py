@@ -0,0 +1,234 @@
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import series, analytics
+from .database import models
+from .schemas.page_diary import is_empty, to_int, to_sugar_level, to_temperature
+
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-lines')
+
+# Допустимое расхождение часов устройства и сервера
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+class BatchFormatError(Exception):
+    pass
+
+
+class BatchTooLargeError(Exception):
+    pass
+
+
+def to_comment(value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError('Поле должно быть строкой')
+    return value
+
+
+def to_idempotency_key(value: Any) -> str:
+    if not isinstance(value, (str, int)) or isinstance(value, bool) or len(str(value)) > 128:
+        raise ValueError('Ключ должен быть строкой длиной не более 128 символов')
+    return str(value)
+
+
+def to_create_date(value: Any) -> datetime:
+    if not isinstance(value, str):
+        raise ValueError('Поле должно содержать дату в формате ISO 8601')
+    try:
+        value = series.as_utc(datetime.fromisoformat(value))
+    except ValueError:
+        raise ValueError('Поле должно содержать дату в формате ISO 8601')
+    if value > datetime.now(timezone.utc) + CLOCK_SKEW:
+        raise ValueError('Время измерения не может быть в будущем')
+    return value
+
+
+@dataclass
+class BatchField:
+    name: str
+    convert: Callable[[Any], Any]
+    required: bool = False
+
+
+# Показатели проверяются теми же функциями, что и в схеме PageDiaryIn
+BATCH_FIELDS = (
+    BatchField('pulse', to_int, required=True),
+    BatchField('temperature', to_temperature, required=True),
+    BatchField('upper_pressure', to_int, required=True),
+    BatchField('lower_pressure', to_int, required=True),
+    BatchField('oxygen_level', to_int),
+    BatchField('sugar_level', to_sugar_level),
+    BatchField('comment', to_comment),
+    BatchField('idempotency_key', to_idempotency_key),
+    BatchField('create_date', to_create_date)
+)
+
+
+def validate_readings(
+        items: list[Any], errors: dict[int, list[str]]
+    ) -> dict[str, list[Any]]:
+    """
+    Проверяет показания по столбцам: каждое поле проверяется сразу для всех показаний.
+    Ошибки добавляются в errors по номеру показания, возвращаются преобразованные столбцы
+    """
+    is_object = [isinstance(item, dict) for item in items]
+    for index, item_is_object in enumerate(is_object):
+        if not item_is_object and index not in errors:
+            errors[index] = ['Показание должно быть объектом']
+
+    columns = {}
+    for field in BATCH_FIELDS:
+        column = [item.get(field.name) if item_is_object else None
+                  for item, item_is_object in zip(items, is_object)]
+        converted = [None] * len(column)
+        for index, value in enumerate(column):
+            if not is_object[index]:
+                continue
+            if field.required and is_empty(value):
+                errors.setdefault(index, []).append(f'{field.name}: Поле не должно быть пустым')
+                continue
+            if value is None:
+                continue
+            try:
+                converted[index] = field.convert(value)
+            except ValueError as e:
+                errors.setdefault(index, []).append(f'{field.name}: {e}')
+        columns[field.name] = converted
+    return columns
+
+
+def check_content_length(content_length: str | None, max_bytes: int) -> None:
+    """
+    Отклоняет пакет по заголовку Content-Length, не читая тело запроса
+    """
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        raise BatchTooLargeError(f'Размер пакета не должен превышать {max_bytes} байт')
+
+
+async def read_limited(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """
+    Передает фрагменты тела запроса, пока их общий размер не превышает max_bytes.
+    Нужно для запросов без Content-Length (chunked) и с заниженным Content-Length
+    """
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise BatchTooLargeError(f'Размер пакета не должен превышать {max_bytes} байт')
+        yield chunk
+
+
+async def parse_json_array(chunks: AsyncIterator[bytes], max_size: int) -> list[Any]:
+    body = b''.join([chunk async for chunk in chunks])
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise BatchFormatError('Тело запроса должно быть JSON-массивом')
+    if not isinstance(items, list):
+        raise BatchFormatError('Тело запроса должно быть JSON-массивом')
+    if len(items) > max_size:
+        raise BatchTooLargeError(f'Пакет не должен содержать больше {max_size} показаний')
+    return items
+
+
+async def parse_ndjson(
+        chunks: AsyncIterator[bytes], max_size: int, errors: dict[int, list[str]]
+    ) -> list[Any]:
+    """
+    Разбирает поток NDJSON по мере получения. Строки, которые не удалось разобрать,
+    попадают в результат как некорректные показания
+    """
+    items = []
+
+    def add_line(line: bytes) -> None:
+        if not line.strip():
+            return
+        if len(items) >= max_size:
+            raise BatchTooLargeError(f'Пакет не должен содержать больше {max_size} показаний')
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            errors[len(items)] = ['Строка не является JSON-объектом']
+            items.append(None)
+
+    tail = b''
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            add_line(line)
+    add_line(tail)
+    return items
+
+
+async def create_page_diary_batch(
+        db: AsyncSession, user_id: uuid.UUID, items: list[Any], errors: dict[int, list[str]]
+    ) -> list[dict]:
+    """
+    Добавляет корректные показания одной многострочной вставкой. Показания с уже
+    загруженным ключом идемпотентности не добавляются. Возвращает результат по каждому показанию
+    """
+    columns = validate_readings(items, errors)
+    now = datetime.now(timezone.utc)
+    results = []
+    rows = []
+    batch_keys = {}
+    for index in range(len(items)):
+        if index in errors:
+            results.append({'index': index, 'status': 'invalid', 'errors': errors[index]})
+            continue
+        key = columns['idempotency_key'][index]
+        if key is not None and key in batch_keys:
+            results.append({'index': index, 'status': 'duplicate', 'key': key})
+            continue
+        row = {field.name: columns[field.name][index] for field in BATCH_FIELDS}
+        row['id'] = uuid.uuid4()
+        row['id_user'] = user_id
+        row['create_date'] = row['create_date'] or now
+        if key is not None:
+            batch_keys[key] = row['id']
+        rows.append(row)
+        results.append({'index': index, 'status': 'created', 'id': row['id'], 'key': key})
+
+    if rows:
+        page = models.PageDiary
+        result = await db.execute(insert(page) \
+                                  .values(rows) \
+                                  .on_conflict_do_nothing(index_elements=[page.id_user, page.idempotency_key]) \
+                                  .returning(page.id)
+                                  )
+        inserted = set(result.scalars().all())
+
+        # Для показаний, загруженных ранее, возвращаются идентификаторы существующих страниц
+        conflicts = [key for key, page_id in batch_keys.items() if page_id not in inserted]
+        if conflicts:
+            existing = await db.execute(select(page.idempotency_key, page.id) \
+                                        .where(page.id_user == user_id,
+                                               page.idempotency_key.in_(conflicts))
+                                        )
+            for key, page_id in existing:
+                batch_keys[key] = page_id
+
+        await series.add_to_daily_rollup(db, [row for row in rows if row['id'] in inserted])
+        await db.commit()
+        # Показания с временем измерения в прошлом могут не изменить время последнего показания
+        analytics.attention_cache.invalidate(user_id)
+
+        for item in results:
+            if item['status'] == 'invalid' or item['key'] is None:
+                continue
+            if item['status'] == 'created' and item['id'] not in inserted:
+                item['status'] = 'duplicate'
+            item['id'] = batch_keys.get(item['key'])
+
+    for item in results:
+        item.pop('key', None)
+    return results
@@ -10,6 +10,126 @@ class Config(BaseSettings):
         alias='POSTGRES_DSN_ASYNC'
     )
 
+    db_pool_size: int = Field(
+        default=5,
+        env='DB_POOL_SIZE',
+        alias='DB_POOL_SIZE'
+    )
+
+    db_max_overflow: int = Field(
+        default=10,
+        env='DB_MAX_OVERFLOW',
+        alias='DB_MAX_OVERFLOW'
+    )
+
+    db_pool_timeout: float = Field(
+        default=30,
+        env='DB_POOL_TIMEOUT',
+        alias='DB_POOL_TIMEOUT'
+    )
+
+    db_pool_recycle: int = Field(
+        default=1800,
+        env='DB_POOL_RECYCLE',
+        alias='DB_POOL_RECYCLE'
+    )
+
+    db_pool_pre_ping: bool = Field(
+        default=True,
+        env='DB_POOL_PRE_PING',
+        alias='DB_POOL_PRE_PING'
+    )
+
+    db_statement_timeout: int = Field(
+        default=0,
+        env='DB_STATEMENT_TIMEOUT',
+        alias='DB_STATEMENT_TIMEOUT'
+    )
+
+    db_session_warn_seconds: float = Field(
+        default=5,
+        env='DB_SESSION_WARN_SECONDS',
+        alias='DB_SESSION_WARN_SECONDS'
+    )
+
+    tracing_exporter: str = Field(
+        default='none',
+        env='TRACING_EXPORTER',
+        alias='TRACING_EXPORTER'
+    )
+
+    tracing_file_path: str = Field(
+        default='traces.jsonl',
+        env='TRACING_FILE_PATH',
+        alias='TRACING_FILE_PATH'
+    )
+
+    tracing_sample_ratio: float = Field(
+        default=1.0,
+        env='TRACING_SAMPLE_RATIO',
+        alias='TRACING_SAMPLE_RATIO'
+    )
+
+    diary_daily_rollup: bool = Field(
+        default=True,
+        env='DIARY_DAILY_ROLLUP',
+        alias='DIARY_DAILY_ROLLUP'
+    )
+
+    series_max_points: int = Field(
+        default=5000,
+        env='SERIES_MAX_POINTS',
+        alias='SERIES_MAX_POINTS'
+    )
+
+    diary_batch_max_size: int = Field(
+        default=1000,
+        env='DIARY_BATCH_MAX_SIZE',
+        alias='DIARY_BATCH_MAX_SIZE'
+    )
+
+    diary_batch_max_bytes: int = Field(
+        default=2097152,
+        env='DIARY_BATCH_MAX_BYTES',
+        alias='DIARY_BATCH_MAX_BYTES'
+    )
+
+    analytics_window_days: int = Field(
+        default=30,
+        env='ANALYTICS_WINDOW_DAYS',
+        alias='ANALYTICS_WINDOW_DAYS'
+    )
+
+    analytics_recent_readings: int = Field(
+        default=3,
+        env='ANALYTICS_RECENT_READINGS',
+        alias='ANALYTICS_RECENT_READINGS'
+    )
+
+    analytics_min_baseline: int = Field(
+        default=5,
+        env='ANALYTICS_MIN_BASELINE',
+        alias='ANALYTICS_MIN_BASELINE'
+    )
+
+    analytics_z_threshold: float = Field(
+        default=3.0,
+        env='ANALYTICS_Z_THRESHOLD',
+        alias='ANALYTICS_Z_THRESHOLD'
+    )
+
+    analytics_cache_ttl: float = Field(
+        default=900,
+        env='ANALYTICS_CACHE_TTL',
+        alias='ANALYTICS_CACHE_TTL'
+    )
+
+    analytics_cache_max_size: int = Field(
+        default=10000,
+        env='ANALYTICS_CACHE_MAX_SIZE',
+        alias='ANALYTICS_CACHE_MAX_SIZE'
+    )
+
     model_config = SettingsConfigDict(env_file=".env")
 
     @classmethod
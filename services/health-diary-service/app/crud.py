@@ -5,6 +5,7 @@ from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from .database import models
 from .schemas import PageDiaryIn, PageDiaryOptional
+from . import series, analytics
 
 
 async def create_page_diary(
@@ -13,7 +14,7 @@ async def create_page_diary(
     """
     Создает новую страницу дневника здоровья в БД
     """
-    db_page_diary = models.PageDiary(
+    values = dict(
         id_user=user_id,
         pulse=page_diary_in.pulse,
         temperature=page_diary_in.temperature,
@@ -24,8 +25,10 @@ async def create_page_diary(
         comment=page_diary_in.comment,
         create_date=datetime.now(timezone.utc)
     )
+    db_page_diary = models.PageDiary(**values)
 
     db.add(db_page_diary)
+    await series.add_to_daily_rollup(db, [values])
     await db.commit()
     await db.refresh(db_page_diary)
     return db_page_diary
@@ -45,14 +48,19 @@ async def get_page_diary(
 
 
 async def get_page_diary_list(
-        db: AsyncSession, user_id: uuid.UUID
+        db: AsyncSession, user_id: uuid.UUID,
+        start: datetime | None = None, end: datetime | None = None
     ) -> list[models.PageDiary] | None:
     """
-    Возвращает список страниц дневника пользователя
+    Возвращает список страниц дневника пользователя, при необходимости за период [start, end)
     """
-    result = await db.execute(select(models.PageDiary) \
-                              .filter(models.PageDiary.id_user == user_id) \
-                              .order_by(models.PageDiary.create_date.desc()))
+    query = select(models.PageDiary) \
+        .filter(models.PageDiary.id_user == user_id)
+    if start is not None:
+        query = query.filter(models.PageDiary.create_date >= start)
+    if end is not None:
+        query = query.filter(models.PageDiary.create_date < end)
+    result = await db.execute(query.order_by(models.PageDiary.create_date.desc()))
     return result.scalars().all()
 
 
@@ -65,10 +73,16 @@ async def update_page_diary(
     result = await db.execute(update(models.PageDiary) \
                               .where(models.PageDiary.id == page_diary_id) \
                               .values(page_diary_optional.model_dump(exclude_unset=True))
+                              .returning(models.PageDiary.id_user, models.PageDiary.create_date)
                               )
+    updated = result.one_or_none()
+    if updated is not None:
+        await series.refresh_daily_rollup(db, updated.id_user, updated.create_date)
     await db.commit()
+    if updated is not None:
+        analytics.attention_cache.invalidate(updated.id_user)
 
-    if result:
+    if updated is not None:
         return await get_page_diary(db, page_diary_id)
     return None
 
@@ -83,7 +97,13 @@ async def delete_page_diary(
     await db.execute(delete(models.PageDiary) \
                      .filter(models.PageDiary.id == page_diary_id)
                      )
+    if deleted_page_diary is not None:
+        await series.refresh_daily_rollup(
+            db, deleted_page_diary.id_user, deleted_page_diary.create_date
+        )
 
     await db.commit()
+    if deleted_page_diary is not None:
+        analytics.attention_cache.invalidate(deleted_page_diary.id_user)
 
     return deleted_page_diary
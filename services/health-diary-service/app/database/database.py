@@ -1,21 +1,41 @@
 from typing import AsyncGenerator
 
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
+from common.pool import pool_monitor
+
 
 class DatabaseInitializer:
     def __init__(self, base) -> None:
         self.__base = base
         self.__async_session_maker = None
 
-    async def init_database(self, postgres_dsn):
-        engine = create_async_engine(postgres_dsn)
+    async def init_database(self, postgres_dsn, **engine_options):
+        engine = create_async_engine(postgres_dsn, **engine_options)
+        pool_monitor.attach(engine)
         self.__async_session_maker = async_sessionmaker(
             engine, expire_on_commit=False
         )
         async with engine.begin() as conn:
             await conn.run_sync(self.__base.metadata.create_all)
+            await conn.execute(self.__add_missing_columns())
+            await conn.run_sync(self.__create_missing_indexes)
+
+    def __add_missing_columns(self):
+        # create_all не изменяет уже существующие таблицы,
+        # поэтому колонки, добавленные позже, создаются отдельно
+        return text(
+            "ALTER TABLE pages_diary ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(128)"
+        )
+
+    def __create_missing_indexes(self, conn):
+        # create_all создает индексы только вместе с новыми таблицами,
+        # поэтому индексы, добавленные к уже существующим таблицам, создаются отдельно
+        for table in self.__base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
     @property
     def async_session_maker(self):
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Integer, Text, DateTime, UUID, REAL
+from sqlalchemy import Column, Integer, Float, String, Text, Date, DateTime, UUID, REAL, Index
 
 from .database import Base
 
@@ -17,3 +17,43 @@ class PageDiary(Base):
     sugar_level = Column(REAL)
     comment = Column(Text)
     create_date = Column(DateTime(timezone=True))
+    idempotency_key = Column(String(128))
+
+
+# Индекс для выборки страниц пользователя за период
+Index('ix_pages_diary_user_date', PageDiary.id_user, PageDiary.create_date)
+
+# Ключ идемпотентности уникален в пределах дневника пользователя
+Index(
+    'ix_pages_diary_user_idempotency_key',
+    PageDiary.id_user, PageDiary.idempotency_key,
+    unique=True
+)
+
+
+class PageDiaryDaily(Base):
+    """
+    Агрегаты показателей дневника пользователя за сутки (UTC).
+    Хранится по строке на каждый показатель, заполненный хотя бы в одной странице за день,
+    и строка pages с количеством страниц за день
+    """
+    __tablename__ = "pages_diary_daily"
+
+    id_user = Column(UUID(as_uuid=True), primary_key=True)
+    day = Column(Date, primary_key=True)
+    metric = Column(String(32), primary_key=True)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+
+
+class PageDiaryRollupState(Base):
+    """
+    Отметка о том, что таблица суточных агрегатов соответствует страницам дневника.
+    Удаляется, если сервис работал без агрегирования, и тогда таблица строится заново
+    """
+    __tablename__ = "pages_diary_rollup_state"
+
+    name = Column(String(64), primary_key=True)
+    built_at = Column(DateTime(timezone=True), nullable=False)
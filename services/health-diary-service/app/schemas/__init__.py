@@ -1,8 +1,21 @@
 from .page_diary import PageDiaryBase, PageDiaryIn, PageDiary, PageDiaryOptional
+from .series import SeriesBucket, MetricAggregate, DiarySeriesPoint
+from .batch import PageDiaryBatchItem, BatchItemStatus, BatchItemResult, BatchResult
+from .analytics import AnomalyKind, Anomaly, PatientAttention
 
 __all__ = [
     PageDiaryBase,
     PageDiaryIn,
     PageDiary,
-    PageDiaryOptional
+    PageDiaryOptional,
+    SeriesBucket,
+    MetricAggregate,
+    DiarySeriesPoint,
+    PageDiaryBatchItem,
+    BatchItemStatus,
+    BatchItemResult,
+    BatchResult,
+    AnomalyKind,
+    Anomaly,
+    PatientAttention
 ]
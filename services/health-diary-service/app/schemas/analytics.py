@@ -0,0 +1,31 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+import uuid
+
+from pydantic import BaseModel, Field
+
+
+class AnomalyKind(str, Enum):
+    drift = 'drift'
+    out_of_range = 'out_of_range'
+
+
+class Anomaly(BaseModel):
+    """
+    Отклонение показателя пациента
+    """
+    metric: str = Field(title='Показатель')
+    kind: AnomalyKind = Field(title='Тип отклонения: изменение относительно базовой линии или выход за границы нормы')
+    value: float = Field(title='Среднее значение последних показаний')
+    baseline_mean: Optional[float] = Field(None, title='Среднее значение за окно анализа')
+    z_score: Optional[float] = Field(None, title='Отклонение от базовой линии в стандартных отклонениях')
+
+
+class PatientAttention(BaseModel):
+    """
+    Пациент, показатели которого требуют внимания врача
+    """
+    id_user: uuid.UUID
+    last_reading: datetime = Field(title='Время последнего показания')
+    anomalies: list[Anomaly]
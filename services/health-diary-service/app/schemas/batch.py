@@ -0,0 +1,44 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+import uuid
+
+from pydantic import BaseModel, Field
+
+from .page_diary import PageDiaryIn
+
+
+class PageDiaryBatchItem(PageDiaryIn):
+    """
+    Показание устройства для пакетной загрузки
+    """
+    idempotency_key: Optional[str] = Field(
+        None, max_length=128, title='Ключ идемпотентности, повторное показание с тем же ключом не добавляется'
+    )
+    create_date: Optional[datetime] = Field(None, title='Время измерения, по умолчанию время загрузки')
+
+
+class BatchItemStatus(str, Enum):
+    created = 'created'
+    duplicate = 'duplicate'
+    invalid = 'invalid'
+
+
+class BatchItemResult(BaseModel):
+    """
+    Результат загрузки одного показания
+    """
+    index: int = Field(title='Порядковый номер показания в запросе')
+    status: BatchItemStatus
+    id: Optional[uuid.UUID] = Field(None, title='Идентификатор страницы дневника')
+    errors: Optional[list[str]] = None
+
+
+class BatchResult(BaseModel):
+    """
+    Результат пакетной загрузки показаний
+    """
+    created: int
+    duplicate: int
+    invalid: int
+    items: list[BatchItemResult]
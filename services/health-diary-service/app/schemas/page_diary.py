@@ -1,11 +1,57 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 import uuid
 import re
 
 from pydantic import BaseModel, Field, field_validator
 
 
+SUGAR_LEVEL_PATTERN = re.compile('^[0-9]{1,2}\\.[0-9]{1,2}$')
+
+
+# Правила проверки показателей используются схемами страницы дневника и пакетной загрузкой показаний
+def is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def to_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValueError('Поле должно иметь целочисленный тип')
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise ValueError('Поле должно иметь целочисленный тип')
+
+
+def to_float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError('Поле должно иметь вещественный тип')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError('Поле должно иметь вещественный тип')
+
+
+def to_temperature(value: Any) -> float:
+    value = to_float(value)
+    if value < 34.0 or value > 43.0:
+        raise ValueError('Некорректное значение')
+    return value
+
+
+def to_sugar_level(value: Any) -> float:
+    value = to_float(value)
+    if not SUGAR_LEVEL_PATTERN.match(str(value)):
+        raise ValueError('Некорректное значение')
+    return value
+
+
 class PageDiaryBase(BaseModel):
     """
     Базовая модель страницы дневника здоровья
@@ -34,53 +80,26 @@ class PageDiaryIn(PageDiaryBase):
     @field_validator('pulse', 'upper_pressure', 'lower_pressure', mode='before')
     @classmethod
     def validate_required_integer_fields(cls, v):
-        if v is None or not v.strip():
+        if is_empty(v):
             raise ValueError('Поле не должно быть пустым')
-        if not isinstance(v, int):
-            try:
-                int(v)
-            except ValueError:
-                raise ValueError('Поле должно иметь целочисленный тип')
-        return int(v)
+        return to_int(v)
     
     @field_validator('temperature', mode='before')
     @classmethod
     def validate_temperature(cls, v):
-        if v is None or not v.strip():
+        if is_empty(v):
             raise ValueError('Поле не должно быть пустым')
-        if not isinstance(v, float):
-            try:
-                float(v)
-            except ValueError:
-                raise ValueError('Поле должно иметь вещественный тип')
-        if float(v) < 34.0 or float(v) > 43.0:
-            raise ValueError('Некорректное значение')
-        return float(v)
+        return to_temperature(v)
     
     @field_validator('oxygen_level', mode='before')
     @classmethod
     def validate_oxygen_level(cls, v):
-        if v is not None and not isinstance(v, int):
-            try:
-                int(v)
-            except ValueError:
-                raise ValueError('Поле должно иметь целочисленный тип')
-            return int(v)
-        return v
+        return to_int(v) if v is not None else v
 
     @field_validator('sugar_level', mode='before')
     @classmethod
     def validate_sugar_level(cls, v):
-        if v is not None:
-            if not isinstance(v, float):
-                try:
-                    float(v)
-                except ValueError:
-                    raise ValueError('Поле должно иметь вещественный тип')
-            if not re.match('^[0-9]{1,2}\.[0-9]{1,2}$', str(v)):
-                raise ValueError('Некорректное значение')
-            return float(v)
-        return v
+        return to_sugar_level(v) if v is not None else v
 
 
 class PageDiary(PageDiaryBase):
@@ -110,48 +129,21 @@ class PageDiaryOptional(PageDiaryBase):
     def validate_required_integer_fields(cls, v):
         if v is None:
             raise ValueError('Поле не должно быть пустым')
-        if not isinstance(v, int):
-            try:
-                int(v)
-            except ValueError:
-                raise ValueError('Поле должно иметь целочисленный тип')
-        return int(v)
+        return to_int(v)
     
     @field_validator('temperature', mode='before')
     @classmethod
     def validate_temperature(cls, v):
         if v is None:
             raise ValueError('Поле не должно быть пустым')
-        if not isinstance(v, float):
-            try:
-                float(v)
-            except ValueError:
-                raise ValueError('Поле должно иметь вещественный тип')
-        if float(v) < 34.0 or float(v) > 43.0:
-            raise ValueError('Некорректное значение')
-        return float(v)
+        return to_temperature(v)
     
     @field_validator('oxygen_level', mode='before')
     @classmethod
     def validate_oxygen_level(cls, v):
-        if v is not None and not isinstance(v, int):
-            try:
-                int(v)
-            except ValueError:
-                raise ValueError('Поле должно иметь целочисленный тип')
-            return int(v)
-        return v
+        return to_int(v) if v is not None else v
 
     @field_validator('sugar_level', mode='before')
     @classmethod
     def validate_sugar_level(cls, v):
-        if v is not None:
-            if not isinstance(v, float):
-                try:
-                    float(v)
-                except ValueError:
-                    raise ValueError('Поле должно иметь вещественный тип')
-            if not re.match('^[0-9]{1,2}\.[0-9]{1,2}$', str(v)):
-                raise ValueError('Некорректное значение')
-            return float(v)
-        return v
+        return to_sugar_level(v) if v is not None else v
@@ -0,0 +1,38 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class SeriesBucket(str, Enum):
+    """
+    Размер интервала агрегации показателей
+    """
+    hour = 'hour'
+    day = 'day'
+    week = 'week'
+
+
+class MetricAggregate(BaseModel):
+    """
+    Агрегаты показателя за интервал
+    """
+    count: int = Field(title='Количество измерений')
+    min: float = Field(title='Минимальное значение')
+    max: float = Field(title='Максимальное значение')
+    avg: float = Field(title='Среднее значение')
+
+
+class DiarySeriesPoint(BaseModel):
+    """
+    Точка временного ряда показателей дневника
+    """
+    start: datetime = Field(title='Начало интервала (UTC)')
+    count: int = Field(title='Количество страниц дневника за интервал')
+    pulse: Optional[MetricAggregate] = None
+    temperature: Optional[MetricAggregate] = None
+    upper_pressure: Optional[MetricAggregate] = None
+    lower_pressure: Optional[MetricAggregate] = None
+    oxygen_level: Optional[MetricAggregate] = None
+    sugar_level: Optional[MetricAggregate] = None
@@ -0,0 +1,361 @@
+import math
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import Date, DateTime, cast, delete, func, literal, literal_column, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from .database import models
+
+
+cfg: config.Config = config.load_config()
+
+# Показатели дневника, по которым строятся временные ряды
+METRICS = ('pulse', 'temperature', 'upper_pressure', 'lower_pressure', 'oxygen_level', 'sugar_level')
+
+BUCKET_SIZES = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1)
+}
+
+ROLLUP_LOCK_KEY = 'health-diary-service:daily-rollup'
+ROLLUP_STATE = 'daily'
+
+# Строка суточных агрегатов с количеством страниц за день, в том числе страниц без показателей
+PAGES_METRIC = 'pages'
+
+
+def as_utc(value: datetime) -> datetime:
+    """
+    Приводит дату к UTC, дата без часового пояса считается датой в UTC
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def utc_day(value: datetime) -> date:
+    return as_utc(value).date()
+
+
+def is_day_start(value: datetime) -> bool:
+    return as_utc(value).time() == time()
+
+
+def day_start(value: date) -> datetime:
+    return datetime.combine(value, time(), timezone.utc)
+
+
+def count_buckets(start: datetime, end: datetime, bucket: str) -> int:
+    """
+    Оценивает количество точек временного ряда за период
+    """
+    return math.ceil((end - start) / BUCKET_SIZES[bucket]) + 1
+
+
+def utc_trunc(unit: str, column):
+    # Единица и часовой пояс подставляются литералами, а не параметрами запроса,
+    # иначе PostgreSQL не сопоставит выражение в SELECT с выражением в GROUP BY
+    return func.date_trunc(
+        literal_column(f"'{unit}'"), func.timezone(literal_column("'UTC'"), column)
+    )
+
+
+def make_point(start: datetime | date, aggregates: dict[str, dict], count: int) -> dict:
+    """
+    Формирует точку ряда; count - количество страниц в интервале
+    """
+    if not isinstance(start, datetime):
+        start = datetime.combine(start, time())
+    point = {'start': as_utc(start), 'count': count}
+    point.update(aggregates)
+    return point
+
+
+def merge_points(points: list[dict]) -> list[dict]:
+    """
+    Объединяет точки с одинаковым началом интервала, полученные по страницам и по суточным агрегатам
+    """
+    merged: dict[datetime, dict] = {}
+    for point in points:
+        target = merged.get(point['start'])
+        if target is None:
+            merged[point['start']] = dict(point)
+            continue
+        target['count'] += point['count']
+        for metric in METRICS:
+            aggregate = point.get(metric)
+            if aggregate is None:
+                continue
+            current = target.get(metric)
+            if current is None:
+                target[metric] = aggregate
+                continue
+            count = current['count'] + aggregate['count']
+            target[metric] = {
+                'count': count,
+                'min': min(current['min'], aggregate['min']),
+                'max': max(current['max'], aggregate['max']),
+                'avg': (current['avg'] * current['count'] + aggregate['avg'] * aggregate['count']) / count
+            }
+    return [merged[start] for start in sorted(merged)]
+
+
+async def get_series_from_pages(
+        db: AsyncSession, user_id: uuid.UUID, start: datetime, end: datetime, bucket: str
+    ) -> list[dict]:
+    """
+    Агрегирует показатели по страницам дневника
+    """
+    page = models.PageDiary
+    bucket_start = utc_trunc(bucket, page.create_date).label('bucket_start')
+    columns = [bucket_start, func.count().label('count')]
+    for metric in METRICS:
+        column = getattr(page, metric)
+        columns += [
+            func.count(column).label(f'{metric}_count'),
+            func.min(column).label(f'{metric}_min'),
+            func.max(column).label(f'{metric}_max'),
+            func.avg(column).label(f'{metric}_avg')
+        ]
+
+    result = await db.execute(select(*columns) \
+                              .where(page.id_user == user_id,
+                                     page.create_date >= start,
+                                     page.create_date < end) \
+                              .group_by(bucket_start) \
+                              .order_by(bucket_start)
+                              )
+    points = []
+    for row in result.mappings():
+        aggregates = {
+            metric: {
+                'count': row[f'{metric}_count'],
+                'min': row[f'{metric}_min'],
+                'max': row[f'{metric}_max'],
+                'avg': float(row[f'{metric}_avg'])
+            }
+            for metric in METRICS
+            if row[f'{metric}_count']
+        }
+        points.append(make_point(row['bucket_start'], aggregates, row['count']))
+    return points
+
+
+async def get_series_from_rollup(
+        db: AsyncSession, user_id: uuid.UUID, start: datetime, end: datetime, bucket: str
+    ) -> list[dict]:
+    """
+    Агрегирует показатели по суточным агрегатам. Период должен начинаться
+    и заканчиваться на границе суток UTC
+    """
+    daily = models.PageDiaryDaily
+    if bucket == 'day':
+        bucket_start = daily.day
+    else:
+        bucket_start = func.date_trunc(literal_column(f"'{bucket}'"), cast(daily.day, DateTime))
+
+    result = await db.execute(select(bucket_start.label('bucket_start'),
+                                     daily.metric,
+                                     func.sum(daily.count).label('count'),
+                                     func.sum(daily.sum).label('sum'),
+                                     func.min(daily.min).label('min'),
+                                     func.max(daily.max).label('max')) \
+                              .where(daily.id_user == user_id,
+                                     daily.day >= utc_day(start),
+                                     daily.day < utc_day(end)) \
+                              .group_by(bucket_start, daily.metric) \
+                              .order_by(bucket_start)
+                              )
+    buckets: dict[datetime | date, dict[str, dict]] = {}
+    pages: dict[datetime | date, int] = {}
+    for row in result.mappings():
+        if row['metric'] == PAGES_METRIC:
+            pages[row['bucket_start']] = row['count']
+            continue
+        buckets.setdefault(row['bucket_start'], {})[row['metric']] = {
+            'count': row['count'],
+            'min': row['min'],
+            'max': row['max'],
+            'avg': row['sum'] / row['count']
+        }
+    return [
+        make_point(bucket_start, buckets.get(bucket_start, {}), count) for bucket_start, count in pages.items()
+    ]
+
+
+async def get_page_diary_series(
+        db: AsyncSession, user_id: uuid.UUID, start: datetime, end: datetime, bucket: str
+    ) -> list[dict]:
+    """
+    Возвращает показатели дневника пользователя за период [start, end),
+    агрегированные по часам, суткам или неделям (UTC). Целые сутки периода считаются
+    по суточным агрегатам, а неполные первые и последние сутки - по страницам
+    """
+    if not cfg.diary_daily_rollup or bucket == 'hour':
+        return await get_series_from_pages(db, user_id, start, end, bucket)
+    first_day = day_start(utc_day(start))
+    if first_day < start:
+        first_day += timedelta(days=1)
+    last_day = day_start(utc_day(end))
+    if first_day >= last_day:
+        return await get_series_from_pages(db, user_id, start, end, bucket)
+
+    points = []
+    if start < first_day:
+        points += await get_series_from_pages(db, user_id, start, first_day, bucket)
+    points += await get_series_from_rollup(db, user_id, first_day, last_day, bucket)
+    if last_day < end:
+        points += await get_series_from_pages(db, user_id, last_day, end, bucket)
+    return merge_points(points)
+
+
+async def lock_daily_rollup(db: AsyncSession, key: str) -> None:
+    await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(key))))
+
+
+async def add_to_daily_rollup(db: AsyncSession, pages: list[dict]) -> None:
+    """
+    Добавляет показатели новых страниц в суточные агрегаты.
+    Вызывается в транзакции, создающей страницы
+    """
+    if not cfg.diary_daily_rollup or not pages:
+        return
+    # Агрегаты складываются заранее, чтобы одна вставка не обновляла строку дважды
+    aggregates: dict[tuple, dict] = {}
+    for page in pages:
+        day = utc_day(page['create_date'])
+        for metric in (PAGES_METRIC,) + METRICS:
+            value = 0 if metric == PAGES_METRIC else page.get(metric)
+            if value is None:
+                continue
+            key = (page['id_user'], day, metric)
+            row = aggregates.get(key)
+            if row is None:
+                aggregates[key] = {
+                    'id_user': page['id_user'],
+                    'day': day,
+                    'metric': metric,
+                    'count': 1,
+                    'sum': value,
+                    'min': value,
+                    'max': value
+                }
+            else:
+                row['count'] += 1
+                row['sum'] += value
+                row['min'] = min(row['min'], value)
+                row['max'] = max(row['max'], value)
+
+    daily = models.PageDiaryDaily
+    stmt = insert(daily).values(list(aggregates.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[daily.id_user, daily.day, daily.metric],
+        set_={
+            'count': daily.count + stmt.excluded.count,
+            'sum': daily.sum + stmt.excluded.sum,
+            'min': func.least(daily.min, stmt.excluded.min),
+            'max': func.greatest(daily.max, stmt.excluded.max)
+        }
+    )
+    for user_id in sorted({str(page['id_user']) for page in pages}):
+        await lock_daily_rollup(db, f'{ROLLUP_LOCK_KEY}:{user_id}')
+    await db.execute(stmt)
+
+
+async def refresh_daily_rollup(db: AsyncSession, user_id: uuid.UUID, create_date: datetime) -> None:
+    """
+    Пересчитывает суточные агрегаты пользователя за день после изменения
+    или удаления страницы. Вызывается в транзакции, изменяющей страницу
+    """
+    if not cfg.diary_daily_rollup:
+        return
+    day = utc_day(create_date)
+    start = datetime.combine(day, time(), timezone.utc)
+    page = models.PageDiary
+    columns = [func.count().label(f'{PAGES_METRIC}_count')]
+    for metric in METRICS:
+        column = getattr(page, metric)
+        columns += [
+            func.count(column).label(f'{metric}_count'),
+            func.sum(column).label(f'{metric}_sum'),
+            func.min(column).label(f'{metric}_min'),
+            func.max(column).label(f'{metric}_max')
+        ]
+
+    daily = models.PageDiaryDaily
+    await lock_daily_rollup(db, f'{ROLLUP_LOCK_KEY}:{user_id}')
+    await db.execute(delete(daily).where(daily.id_user == user_id, daily.day == day))
+    row = (await db.execute(select(*columns) \
+                            .where(page.id_user == user_id,
+                                   page.create_date >= start,
+                                   page.create_date < start + timedelta(days=1))
+                            )).mappings().one()
+    rows = [
+        {
+            'id_user': user_id,
+            'day': day,
+            'metric': metric,
+            'count': row[f'{metric}_count'],
+            'sum': row[f'{metric}_sum'] if metric != PAGES_METRIC else 0,
+            'min': row[f'{metric}_min'] if metric != PAGES_METRIC else 0,
+            'max': row[f'{metric}_max'] if metric != PAGES_METRIC else 0
+        }
+        for metric in (PAGES_METRIC,) + METRICS
+        if row[f'{metric}_count']
+    ]
+    if rows:
+        await db.execute(insert(daily).values(rows))
+
+
+async def invalidate_daily_rollup(db: AsyncSession) -> None:
+    """
+    Снимает отметку о соответствии суточных агрегатов страницам. Вызывается при запуске
+    без агрегирования: изменения страниц не попадут в таблицу, и при следующем включении
+    она будет построена заново
+    """
+    state = models.PageDiaryRollupState
+    async with db.begin():
+        await db.execute(delete(state).where(state.name == ROLLUP_STATE))
+
+
+async def fill_daily_rollup(db: AsyncSession) -> bool:
+    """
+    Строит таблицу суточных агрегатов по страницам, если она не отмечена как актуальная:
+    при первом включении агрегирования и после работы сервиса без него.
+    Возвращает True, если таблица была построена
+    """
+    page = models.PageDiary
+    daily = models.PageDiaryDaily
+    state = models.PageDiaryRollupState
+    day = cast(func.timezone(literal_column("'UTC'"), page.create_date), Date)
+    async with db.begin():
+        await lock_daily_rollup(db, ROLLUP_LOCK_KEY)
+        if await db.scalar(select(state.name).where(state.name == ROLLUP_STATE)) is not None:
+            return False
+        await db.execute(delete(daily))
+        selects = [
+            select(page.id_user, day, literal(PAGES_METRIC), func.count(), literal(0), literal(0), literal(0)) \
+            .where(page.create_date.is_not(None)) \
+            .group_by(page.id_user, day)
+        ]
+        selects += [
+            select(page.id_user,
+                   day,
+                   literal(metric),
+                   func.count(getattr(page, metric)),
+                   func.sum(getattr(page, metric)),
+                   func.min(getattr(page, metric)),
+                   func.max(getattr(page, metric))) \
+            .where(getattr(page, metric).is_not(None), page.create_date.is_not(None)) \
+            .group_by(page.id_user, day)
+            for metric in METRICS
+        ]
+        await db.execute(insert(daily).from_select(
+            ['id_user', 'day', 'metric', 'count', 'sum', 'min', 'max'], union_all(*selects)
+        ))
+        await db.execute(insert(state).values(name=ROLLUP_STATE, built_at=func.now()))
+    return True
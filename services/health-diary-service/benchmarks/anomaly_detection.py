@@ -0,0 +1,76 @@
+"""
+Измеряет время поиска отклонений показателей для пакета пациентов.
+
+    python benchmarks/anomaly_detection.py [--patients 1000] [--readings 60]
+"""
+import argparse
+import os
+import sys
+import timeit
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.analytics import ANALYTICS_METRICS, ReadingsBatch, detect_anomalies  # noqa: E402
+
+
+MEANS = {
+    'pulse': 72,
+    'temperature': 36.6,
+    'upper_pressure': 120,
+    'lower_pressure': 80,
+    'oxygen_level': 97,
+    'sugar_level': 5.5
+}
+
+STDS = {
+    'pulse': 5,
+    'temperature': 0.2,
+    'upper_pressure': 6,
+    'lower_pressure': 4,
+    'oxygen_level': 1,
+    'sugar_level': 0.4
+}
+
+
+def make_batch(patients: int, readings: int, seed: int = 0) -> ReadingsBatch:
+    rng = np.random.default_rng(seed)
+    size = patients * readings
+    values = {
+        metric: rng.normal(MEANS[metric], STDS[metric], size)
+        for metric in ANALYTICS_METRICS
+    }
+    # Необязательные показатели заполнены не во всех страницах
+    values['sugar_level'][rng.random(size) < 0.5] = np.nan
+    # У каждого десятого пациента пульс растет в последних показаниях
+    last = np.arange(readings - 3, size, readings)
+    for offset in range(3):
+        values['pulse'][(last + offset)[::10]] += 40
+    return ReadingsBatch(
+        user_ids=[uuid.uuid4() for _ in range(patients)],
+        user_index=np.repeat(np.arange(patients), readings),
+        values=values
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--readings', type=int, default=60)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    batch = make_batch(args.patients, args.readings)
+    run = lambda: detect_anomalies(batch, recent=3, min_baseline=5, z_threshold=3.0)  # noqa: E731
+    anomalies = run()
+    elapsed = timeit.timeit(run, number=args.iterations) / args.iterations
+
+    print(f"Пациентов: {args.patients}, показаний у пациента: {args.readings}")
+    print(f"Пациентов с отклонениями: {sum(1 for items in anomalies if items)}")
+    print(f"Анализ пакета: {elapsed * 1e3:.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
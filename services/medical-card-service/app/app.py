@@ -5,12 +5,17 @@ import pathlib
 import uuid
 from cryptography.fernet import Fernet
 
-from fastapi import FastAPI, Depends, HTTPException, Body, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, Body, UploadFile, File, Request
 from fastapi.staticfiles import StaticFiles
 
+from pydantic import TypeAdapter
 from pydicom import dcmread
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from common import seeder
+from common.httpcache import make_response
+from common.instrumentation import InstrumentedFernet, register_cache_metrics, setup_metrics
+from common.tracing import setup_tracing
 from .schemas import (Card,
                       CardIn,
                       CardOptional,
@@ -24,8 +29,9 @@ from .schemas import (Card,
                       DocumentIn,
                       DocumentOptional,
                       Document)
-from .database import DB_INITIALIZER
-from . import crud, config, crud_config, crud_document
+from .database import DB_INITIALIZER, get_async_session, make_engine_options, pool_monitor
+from .database import models
+from . import crud, config, crud_document, pagevalidator, referencecache, templatecache
 from .decrypt import decrypt
 
 
@@ -62,27 +68,35 @@ tags_metadata = [
 ]
 
 cfg: config.Config = config.load_config()
-SessionLocal = DB_INITIALIZER.init_database(str(cfg.postgres_dsn))
-CIPHER_SUITE: Fernet = Fernet(
+CIPHER_SUITE: Fernet = InstrumentedFernet(
     base64.b64decode(cfg.encrypt_key.get_secret_value())
 )
 
+FAMILY_STATUS_LIST_ADAPTER = TypeAdapter(list[FamilyStatus])
+EDUCATION_LIST_ADAPTER = TypeAdapter(list[Education])
+BUSYNESS_LIST_ADAPTER = TypeAdapter(list[Busyness])
+
+# Ключ в файле начальных данных -> (модель, схема строки, имя справочника в кэше)
+REFERENCE_TABLES = {
+    'family-status': (models.FamilyStatus, FamilyStatus, 'family_status'),
+    'education': (models.Education, Education, 'education'),
+    'busyness': (models.Busyness, Busyness, 'busyness')
+}
+
 app = FastAPI(title='Medical Card Service',
               description=description,
               openapi_tags=tags_metadata)            
 
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+setup_metrics(app, pool_monitor)
+register_cache_metrics('reference_cache', 'справочники', referencecache.reference_cache)
+register_cache_metrics('template_version_cache', 'версии шаблонов', templatecache.template_versions)
+register_cache_metrics('page_validator_cache', 'функции проверки страниц', templatecache.page_validators)
+setup_tracing(app, cfg, 'medical-card-service')
 
 
 @app.post('/cards', response_model=Card, summary='Добавляет медкарту в базу', tags=["cards"])
-def add_card(card_in: CardIn, db: Session = Depends(get_db)):
-    created_card = crud.create_card(db, card_in)
+async def add_card(card_in: CardIn, db: AsyncSession = Depends(get_async_session)):
+    created_card = await crud.create_card(db, card_in)
     return decrypt.decrypt_card(created_card, CIPHER_SUITE)
 
 
@@ -90,16 +104,16 @@ def add_card(card_in: CardIn, db: Session = Depends(get_db)):
          response_model=list[CardIdsSelfAndPatient],
          summary='Возвращает список идентификаторов карты и пациента',
          tags=["cards"])
-def get_cards_list(db: Session = Depends(get_db)):
-    return crud.get_cards_list(db)
+async def get_cards_list(db: AsyncSession = Depends(get_async_session)):
+    return await crud.get_cards_list(db)
 
 
 @app.get('/cards/{card_id}',
          response_model=Card,
          summary='Возвращает медкарту',
          tags=["cards"])
-def get_card(card_id: int, db: Session = Depends(get_db)):
-    card = crud.get_card(db, card_id=card_id)
+async def get_card(card_id: int, db: AsyncSession = Depends(get_async_session)):
+    card = await crud.get_card(db, card_id=card_id)
     if card is None:
         raise HTTPException(status_code=404, detail="Медкарта не найдена")
     return decrypt.decrypt_card(card, CIPHER_SUITE)
@@ -110,20 +124,20 @@ def get_card(card_id: int, db: Session = Depends(get_db)):
         response_model=Card,
         summary='Возвращает медкарту для пациента',
         tags=["cards"])
-def get_card_by_user_id(user_id: uuid.UUID, db: Session = Depends(get_db)):
-    card = crud.get_card(db, user_id=user_id)
+async def get_card_by_user_id(user_id: uuid.UUID, db: AsyncSession = Depends(get_async_session)):
+    card = await crud.get_card(db, user_id=user_id)
     if card is None:
         raise HTTPException(status_code=404, detail="Медкарта не найдена")
     return decrypt.decrypt_card(card, CIPHER_SUITE)
 
 
 @app.patch('/cards/{card_id}', response_model=Card, summary='Обновляет медкарту', tags=["cards"])
-def update_card(
+async def update_card(
         card_id: int,
         card_optional: CardOptional,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_session)
     ):
-    card = crud.update_card(db, card_id, card_optional)
+    card = await crud.update_card(db, card_id, card_optional)
     if card is not None:
         return decrypt.decrypt_card(card, CIPHER_SUITE)
     raise HTTPException(status_code=404, detail="Медкарта не найдена")
@@ -135,8 +149,8 @@ def update_card(
     summary='Удаляет медкарту из базы',
     tags=["cards"]
     )
-def delete_card(card_id: int, db: Session = Depends(get_db)):
-    card_has_deleted = crud.delete_card(db, card_id)
+async def delete_card(card_id: int, db: AsyncSession = Depends(get_async_session)):
+    card_has_deleted = await crud.delete_card(db, card_id)
     if card_has_deleted:
         return card_has_deleted
     raise HTTPException(status_code=404, detail="Медкарта не найден")
@@ -146,21 +160,26 @@ def delete_card(card_id: int, db: Session = Depends(get_db)):
     '/family_status',
     response_model=list[FamilyStatus],
     summary='Возвращает список доступных семейных статусов')
-def get_list_family_status(db: Session = Depends(get_db)):
-    return crud.get_list_family_status(db)
+async def get_list_family_status(request: Request, db: AsyncSession = Depends(get_async_session)):
+    return await make_reference_response('family_status', crud.get_list_family_status, FAMILY_STATUS_LIST_ADAPTER, request, db)
 
 
 @app.get(
     '/education',
     response_model=list[Education],
     summary='Возвращает список доступных типов образования')
-def get_list_education(db: Session = Depends(get_db)):
-    return crud.get_list_education(db)
+async def get_list_education(request: Request, db: AsyncSession = Depends(get_async_session)):
+    return await make_reference_response('education', crud.get_list_education, EDUCATION_LIST_ADAPTER, request, db)
 
 
 @app.get('/busyness', response_model=list[Busyness], summary='Возвращает список доступных типов занятости')
-def get_list_busyness(db: Session = Depends(get_db)):
-    return crud.get_list_busyness(db)
+async def get_list_busyness(request: Request, db: AsyncSession = Depends(get_async_session)):
+    return await make_reference_response('busyness', crud.get_list_busyness, BUSYNESS_LIST_ADAPTER, request, db)
+
+
+@app.get('/metrics/db-pool', summary='Возвращает статистику пула соединений с базой данных', tags=["metrics"])
+async def get_db_pool_metrics():
+    return pool_monitor.stats
 
 
 @app.post(
@@ -169,29 +188,34 @@ def get_list_busyness(db: Session = Depends(get_db)):
     summary='Добавляет страницу в базу',
     tags=["pages"]
     )
-def add_page(card_id: int, template_id: int, page_in: PageIn, db: Session = Depends(get_db)):
-    card = crud.get_card(db, card_id, None)
-    if not check_template(db, template_id):
+async def add_page(card_id: int, template_id: int, page_in: PageIn, db: AsyncSession = Depends(get_async_session)):
+    card = await crud.get_card(db, card_id, None)
+    if not await check_template(db, template_id):
         raise HTTPException(status_code=404, detail="Шаблон не найден")
+    await check_page_data(db, template_id, page_in.data)
     if card:
-        created_page = crud.create_page(db, card_id, template_id, page_in)
+        created_page = await crud.create_page(db, card_id, template_id, page_in)
         return decrypt.decrypt_page(created_page, CIPHER_SUITE)
     raise HTTPException(status_code=404, detail="Медкарта не найдена")
 
 
 @app.get('/pages/card/{card_id}', response_model=list[Page], summary='Возвращает список страниц', tags=["pages"])
-def get_list_pages(card_id: int, db: Session = Depends(get_db)):
-    pages = crud.get_pages(db, card_id)
+async def get_list_pages(card_id: int, db: AsyncSession = Depends(get_async_session)):
+    pages = await crud.get_pages(db, card_id)
     return [decrypt.decrypt_page(page, CIPHER_SUITE) for page in pages]
 
 
 @app.put('/pages/{page_id}', response_model=Page, summary='Обновляет страницу', tags=["pages"])
-def update_page(
+async def update_page(
         page_id: uuid.UUID,
         page_update: PageUpdate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_session)
     ):
-    page = crud.update_page(db, page_id, page_update)
+    page = await crud.get_page(db, page_id)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Страница не найдена")
+    await check_page_data(db, page.id_template, page_update.data)
+    page = await crud.update_page(db, page_id, page_update)
     if page is not None:
         return decrypt.decrypt_page(page, CIPHER_SUITE)
     raise HTTPException(status_code=404, detail="Страница не найдена")
@@ -203,8 +227,8 @@ def update_page(
     summary='Удаляет страницу из базы',
     tags=["pages"]
     )
-def delete_page(page_id: uuid.UUID, db: Session = Depends(get_db)):
-    page_has_deleted, documents = crud.delete_page(db, page_id)
+async def delete_page(page_id: uuid.UUID, db: AsyncSession = Depends(get_async_session)):
+    page_has_deleted, documents = await crud.delete_page(db, page_id)
     if page_has_deleted is False:
         raise HTTPException(status_code=404, detail="Страница не найден")
     remove_documents_of_page_from_storage(documents)
@@ -217,53 +241,54 @@ def delete_page(page_id: uuid.UUID, db: Session = Depends(get_db)):
     summary='Добавляет документы в базу в формате pdf/dicom',
     tags=["documents"]
 )
-def add_documents(
+async def add_documents(
         document_in: DocumentIn = Body(...),
         files: list[UploadFile] = File(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_session)
     ):
-    page = crud.get_page(db, document_in.id_page)
+    page = await crud.get_page(db, document_in.id_page)
     if page is None:
         raise HTTPException(status_code=404, detail="Страница не найдена")
     for file in files:
         path_to_file = create_path_to_file(cfg.path_to_storage, file.filename)
         if file.content_type == 'application/pdf':
-            create_pdf_file(file, path_to_file)
+            await run_in_threadpool(create_pdf_file, file, path_to_file)
         elif file.content_type == 'application/dicom':
-            create_dcm_file(file, path_to_file)
+            await run_in_threadpool(create_dcm_file, file, path_to_file)
         else:
             raise HTTPException(status_code=400, detail="Недопустимый тип файла")
-        crud_document.create_document(db, document_in, path_to_file)
+        await crud_document.create_document(db, document_in, path_to_file)
+    await db.refresh(page, ["documents"])
     return page.documents
 
 
 @app.get('/documents/{document_id}', response_model=Document, summary='Возвращает документ', tags=["documents"])
-def get_document(document_id: int, db: Session = Depends(get_db)):
-    document = crud_document.get_document(db, document_id)
+async def get_document(document_id: int, db: AsyncSession = Depends(get_async_session)):
+    document = await crud_document.get_document(db, document_id)
     if document is None:
         raise HTTPException(status_code=404, detail="Документ не найден")
     return document
 
 
 @app.patch('/documents/{document_id}', response_model=Document, summary='Обновляет документ', tags=["documents"])
-def update_document(
+async def update_document(
         document_id: int,
         document_optional: DocumentOptional,
         file: UploadFile = File(None),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_session)
     ):
-    document = crud_document.get_document(db, document_id)
+    document = await crud_document.get_document(db, document_id)
     if document is not None:
         path_to_file = document.path_to_file
         extension_existing_file = pathlib.Path(path_to_file).suffix
         if file:
             if file.content_type == 'application/pdf':
-                path_to_file = update_pdf_file(file, extension_existing_file, cfg.path_to_storage, path_to_file)
+                path_to_file = await run_in_threadpool(update_pdf_file, file, extension_existing_file, cfg.path_to_storage, path_to_file)
             elif file.content_type == 'application/dicom':
-                path_to_file = update_dcm_file(file, extension_existing_file, cfg.path_to_storage, path_to_file)
+                path_to_file = await run_in_threadpool(update_dcm_file, file, extension_existing_file, cfg.path_to_storage, path_to_file)
             else:
                 raise HTTPException(status_code=400, detail="Недопустимый тип файла")
-        return crud_document.update_document(db, document_id, document_optional, path_to_file)
+        return await crud_document.update_document(db, document_id, document_optional, path_to_file)
     raise HTTPException(status_code=404, detail="Документ не найден")
 
 
@@ -273,8 +298,8 @@ def update_document(
     summary='Удаляет документ из базы',
     tags=["documents"]
     )
-def delete_documents(document_id: int, db: Session = Depends(get_db)):
-    deleted_document = crud_document.delete_document(db, document_id)
+async def delete_documents(document_id: int, db: AsyncSession = Depends(get_async_session)):
+    deleted_document = await crud_document.delete_document(db, document_id)
     if deleted_document is None:
         raise HTTPException(status_code=404, detail="Документ не найден")
     delete_file_from_storage(deleted_document.path_to_file)
@@ -282,44 +307,46 @@ def delete_documents(document_id: int, db: Session = Depends(get_db)):
 
 
 @app.on_event("startup")
-def on_startup():
-
-    data = []
-    with open(cfg.default_data_config_path, encoding="utf-8") as f:
-        data = json.load(f)
+async def on_startup():
+    await DB_INITIALIZER.init_database(
+        cfg.postgres_dsn_async.unicode_string(),
+        **make_engine_options(cfg)
+    )
 
-    for item in data:
-        for key, value in item.items():
-            if key == 'family-status':
-                make_family_status_table(value)
-            elif key == 'education':
-                make_education_table(value)
-            elif key == 'busyness':
-                make_busyness_table(value)
+    with open(cfg.default_data_config_path, "rb") as f:
+        content = f.read()
 
+    async for session in get_async_session():
+        changed = await seeder.seed(
+            session, models.SeedHash, "medical-card-service:default-data", content, load_reference_tables
+        )
+    if changed:
+        for _, _, cache_name in REFERENCE_TABLES.values():
+            referencecache.reference_cache.invalidate(cache_name)
 
-def make_family_status_table(data):
-    for session in get_db():
-        for item in data:
-            crud_config.upsert_family_status(
-                session, FamilyStatus(**item)
-            )
 
+def load_reference_tables(content: bytes) -> list[seeder.SeedTable]:
+    rows = {name: [] for name in REFERENCE_TABLES}
+    for item in json.loads(content):
+        for key, value in item.items():
+            if key in REFERENCE_TABLES:
+                schema = REFERENCE_TABLES[key][1]
+                rows[key].extend(schema(**row).model_dump() for row in value)
 
-def make_education_table(data):
-    for session in get_db():
-        for item in data:
-            crud_config.upsert_education(
-                session, Education(**item)
-            )
+    return [
+        seeder.SeedTable(model=model, rows=rows[key], update_columns=["name"])
+        for key, (model, _, _) in REFERENCE_TABLES.items()
+    ]
 
 
-def make_busyness_table(data):
-    for session in get_db():
-        for item in data:
-            crud_config.upsert_busyness(
-                session, Busyness(**item)
-            )
+async def make_reference_response(name: str, get_list, adapter: TypeAdapter, request: Request, db: AsyncSession):
+    cache = referencecache.reference_cache
+    entry = cache.get(name)
+    if entry is None:
+        version = cache.version(name)
+        items = adapter.validate_python(await get_list(db), from_attributes=True)
+        entry = cache.set(name, None, version, adapter.dump_json(items))
+    return make_response(entry, request)
 
 
 def create_dcm_file(file: UploadFile, path_to_file: str):
@@ -370,12 +397,16 @@ def delete_file_from_storage(path_to_file: str):
     os.remove(path_to_file)
 
 
-def check_template(
-        db: Session, template_id: uuid.UUID
+async def check_template(
+        db: AsyncSession, template_id: int
     ) -> bool:
+    return await templatecache.get_template_version(db, template_id) is not None
 
-    result = db.execute(
-        text("SELECT id FROM public.templates WHERE id = :template_id"),
-        {"template_id": str(template_id)}
-    ).fetchone()
-    return bool(result)
+
+async def check_page_data(
+        db: AsyncSession, template_id: int, data: dict
+    ):
+    try:
+        await templatecache.validate_page_data(db, template_id, data)
+    except pagevalidator.PageDataError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors)
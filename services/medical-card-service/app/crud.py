@@ -4,8 +4,10 @@ import base64
 from datetime import datetime, timezone
 from cryptography.fernet import Fernet
 
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import select, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from common.instrumentation import InstrumentedFernet
 
 from .database import models
 from .schemas import PageIn, PageUpdate, CardIn, CardOptional, DisabilityIn
@@ -17,23 +19,23 @@ from . import config
 
 
 cfg: config.Config = config.load_config()
-CIPHER_SUITE: Fernet = Fernet(
+CIPHER_SUITE: Fernet = InstrumentedFernet(
     base64.b64decode(cfg.encrypt_key.get_secret_value())
 )
 
 
-def create_card(
-        db: Session, card_in: CardIn
+async def create_card(
+        db: AsyncSession, card_in: CardIn
     ) -> models.Card:
     """
     Создает новую медкарту в БД
     """
-    address = crud_address.create_address(db, card_in.address)
-    passport = crud_passport.create_passport(db, card_in.passport)
+    address = await crud_address.create_address(db, card_in.address)
+    passport = await crud_passport.create_passport(db, card_in.passport)
 
     id_disability = None
     if card_in.disability and card_in.disability.name and card_in.disability.group and card_in.disability.create_date:
-        disability = crud_disability.create_disability(db, card_in.disability)
+        disability = await crud_disability.create_disability(db, card_in.disability)
         id_disability = disability.id
 
     optional_encrypt_fields_list = {
@@ -79,39 +81,41 @@ def create_card(
     )
 
     db.add(db_card)
-    db.commit()
-    db.refresh(db_card)
+    await db.commit()
+    await db.refresh(db_card)
     return db_card
 
 
-def get_card(
-        db: Session, card_id: int | None = None, user_id: uuid.UUID | None = None
+async def get_card(
+        db: AsyncSession, card_id: int | None = None, user_id: uuid.UUID | None = None
     ) -> models.Card | None:
     """
     Возвращает медкарту
     """
-    return db.query(models.Card)\
-        .filter(
-            or_(
-                models.Card.id == card_id, 
-                models.Card.id_user == user_id)
-            ) \
-        .filter(models.Card.is_deleted == False) \
-        .first()
-
-
-def get_cards_list(
-        db: Session
+    result = await db.execute(select(models.Card) \
+                              .filter(
+                                  or_(
+                                      models.Card.id == card_id,
+                                      models.Card.id_user == user_id)
+                                  ) \
+                              .filter(models.Card.is_deleted == False) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
+
+
+async def get_cards_list(
+        db: AsyncSession
     ) -> list[models.Card]:
     """
     Возвращает список медкарт
     """
-    result = db.query(models.Card.id, models.Card.id_user).filter(models.Card.is_deleted == False).all()
-    return [{'id': item[0], 'id_user': item[1]} for item in result]
+    result = await db.execute(select(models.Card.id, models.Card.id_user).filter(models.Card.is_deleted == False))
+    return [{'id': item[0], 'id_user': item[1]} for item in result.all()]
 
 
-def update_card(
-        db: Session, card_id: int, card_optional: CardOptional
+async def update_card(
+        db: AsyncSession, card_id: int, card_optional: CardOptional
     ) -> models.Card | None:
     """
     Обновляет информацию о медкарте
@@ -122,20 +126,20 @@ def update_card(
         'disability'
     }
 
-    before_update_card = get_card(db, card_id)
+    before_update_card = await get_card(db, card_id)
     id_address = before_update_card.id_address
     id_passport = before_update_card.id_passport
     id_disability = before_update_card.id_disability
 
     if card_optional.address:
-        crud_address.update_address(db, id_address, card_optional.address)
+        await crud_address.update_address(db, id_address, card_optional.address)
     if card_optional.passport:
-        crud_passport.update_passport(db, id_passport, card_optional.passport)
+        await crud_passport.update_passport(db, id_passport, card_optional.passport)
     if card_optional.disability:
         if id_disability:
-            disability = crud_disability.update_disability(db, id_disability, card_optional.disability)
+            disability = await crud_disability.update_disability(db, id_disability, card_optional.disability)
         else:
-            disability = crud_disability.create_disability(db, DisabilityIn(
+            disability = await crud_disability.create_disability(db, DisabilityIn(
                 name=card_optional.disability.name, 
                 group=card_optional.disability.group, 
                 create_date=card_optional.disability.create_date
@@ -149,37 +153,40 @@ def update_card(
         ] and value:
             encoded_card_data[key] = CIPHER_SUITE.encrypt(value.encode())
 
-    result = db.query(models.Card) \
-        .filter(models.Card.id == card_id) \
-        .update(encoded_card_data | {'id_disability': id_disability})
-    db.commit()
+    result = await db.execute(update(models.Card) \
+                              .where(models.Card.id == card_id) \
+                              .values(encoded_card_data | {'id_disability': id_disability})
+                              )
+    await db.commit()
 
-    if result == 1:
-        return get_card(db, card_id)
+    if result.rowcount == 1:
+        # Связанные объекты карты изменены отдельными запросами, поэтому карта загружается заново
+        db.expunge_all()
+        return await get_card(db, card_id)
     return None
 
 
-def delete_card(
-        db: Session, card_id: int
+async def delete_card(
+        db: AsyncSession, card_id: int
     ) -> bool:
     """
     Удаляет информацию о медкарте
     """
-    deleted_card = get_card(db, card_id)
+    deleted_card = await get_card(db, card_id)
     if deleted_card is None:
         return False
 
     deleted_card.is_deleted = True
 
-    db.query(models.Page).filter(models.Page.id_card == card_id).update({"is_deleted": True})
+    await db.execute(update(models.Page).where(models.Page.id_card == card_id).values(is_deleted=True))
 
-    db.commit()
+    await db.commit()
 
     return deleted_card.is_deleted
 
 
-def create_page(
-        db: Session, card_id: int, template_id: int, page_in: PageIn
+async def create_page(
+        db: AsyncSession, card_id: int, template_id: int, page_in: PageIn
     ) -> models.Page:
     """
     Создает новую страницу для медкарты в БД
@@ -193,92 +200,99 @@ def create_page(
     )
 
     db.add(db_page)
-    db.commit()
-    db.refresh(db_page)
+    await db.commit()
+    await db.refresh(db_page)
 
     return db_page
 
 
-def get_page(
-        db: Session, page_id: uuid.UUID
+async def get_page(
+        db: AsyncSession, page_id: uuid.UUID
     ) -> models.Page | None:
     """
     Возвращает конкретную старницу медкарты
     """
-    return db.query(models.Page) \
-            .filter(models.Page.id == page_id) \
-            .filter(models.Page.is_deleted == False) \
-            .first()
+    result = await db.execute(select(models.Page) \
+                              .filter(models.Page.id == page_id) \
+                              .filter(models.Page.is_deleted == False) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def get_pages(
-        db: Session, card_id: int
+async def get_pages(
+        db: AsyncSession, card_id: int
     ) -> list[models.Page] | None:
     """
     Возвращает медкарту
     """
-    return db.query(models.Page) \
-        .filter(models.Page.id_card == card_id) \
-        .filter(models.Page.is_deleted == False) \
-        .order_by(models.Page.create_date.asc()) \
-        .all()
+    result = await db.execute(select(models.Page) \
+                              .filter(models.Page.id_card == card_id) \
+                              .filter(models.Page.is_deleted == False) \
+                              .order_by(models.Page.create_date.asc())
+                              )
+    return result.scalars().all()
 
 
-def update_page(
-        db: Session, page_id: uuid.UUID, page_update: PageUpdate
+async def update_page(
+        db: AsyncSession, page_id: uuid.UUID, page_update: PageUpdate
     ) -> models.Page | None:
     """
     Обновляет информацию о старнице
     """
     page_update.data = CIPHER_SUITE.encrypt(json.dumps(page_update.data).encode())
 
-    result = db.query(models.Page) \
-        .filter(models.Page.id == page_id) \
-        .update(page_update.model_dump())
-    db.commit()
+    result = await db.execute(update(models.Page) \
+                              .where(models.Page.id == page_id) \
+                              .values(page_update.model_dump())
+                              )
+    await db.commit()
 
-    if result == 1:
-        return get_page(db, page_id)
+    if result.rowcount == 1:
+        return await get_page(db, page_id)
     return None
 
 
-def delete_page(
-        db: Session, page_id: uuid.UUID
+async def delete_page(
+        db: AsyncSession, page_id: uuid.UUID
     ) -> tuple[bool, models.Document] | tuple[False, None]:
     """
     Удаляет информацию о странице
     """
-    deleted_page = get_page(db, page_id)
+    deleted_page = await get_page(db, page_id)
     if deleted_page:
         documents = deleted_page.documents
         deleted_page.is_deleted = True
-        db.commit()
+        await db.commit()
         return deleted_page.is_deleted, documents
     return False, None
 
 
-def get_list_family_status(
-        db: Session
+async def get_list_family_status(
+        db: AsyncSession
     ) -> list[models.FamilyStatus]:
     """
     Возвращает список доступных семейных статусов
     """
-    return db.query(models.FamilyStatus).all()
+    result = await db.execute(select(models.FamilyStatus))
+    return result.scalars().all()
 
 
-def get_list_education(
-        db: Session
+async def get_list_education(
+        db: AsyncSession
     ) -> list[models.Education]:
     """
     Возвращает список доступных типов образования
     """
-    return db.query(models.Education).all()
+    result = await db.execute(select(models.Education))
+    return result.scalars().all()
 
 
-def get_list_busyness(
-        db: Session
+async def get_list_busyness(
+        db: AsyncSession
     ) -> list[models.Busyness]:
     """
     Возвращает информацию о типе занятости
     """
-    return db.query(models.Busyness).all()
+    result = await db.execute(select(models.Busyness))
+    return result.scalars().all()
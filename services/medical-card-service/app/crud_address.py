@@ -1,21 +1,24 @@
 import base64
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from cryptography.fernet import Fernet
 
+from common.instrumentation import InstrumentedFernet
+
 from .database import models
 from .schemas import AddressIn, AddressOptional
 from . import config
 
 
 cfg: config.Config = config.load_config()
-CIPHER_SUITE: Fernet = Fernet(
+CIPHER_SUITE: Fernet = InstrumentedFernet(
     base64.b64decode(cfg.encrypt_key.get_secret_value())
 )
 
 
-def create_address(db: Session, address_in: AddressIn) -> models.Address:
+async def create_address(db: AsyncSession, address_in: AddressIn) -> models.Address:
     """
     Создает новую запись адреса в БД
     """
@@ -39,53 +42,56 @@ def create_address(db: Session, address_in: AddressIn) -> models.Address:
     )
 
     db.add(db_address)
-    db.commit()
-    db.refresh(db_address)
+    await db.commit()
+    await db.refresh(db_address)
     return db_address
 
 
-def get_address(
-        db: Session, address_id: int
+async def get_address(
+        db: AsyncSession, address_id: int
     ) -> models.Address | None:
     """
     Возвращает адрес пациента
     """
-    return db.query(models.Address) \
-            .filter(models.Address.id == address_id) \
-            .first()
+    result = await db.execute(select(models.Address) \
+                              .filter(models.Address.id == address_id) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def update_address(
-        db: Session, address_id: int, address_optional: AddressOptional
+async def update_address(
+        db: AsyncSession, address_id: int, address_optional: AddressOptional
     ) -> models.Address | None:
     """
     Обновляет информацию об адресе
     """
     encoded_address_data = {key: CIPHER_SUITE.encrypt(str(value).encode()) for key, value in address_optional.model_dump(exclude_unset=True).items() if value}
 
-    result = db.query(models.Address) \
-        .filter(models.Address.id == address_id) \
-        .update(encoded_address_data)
-    db.commit()
+    result = await db.execute(update(models.Address) \
+                              .where(models.Address.id == address_id) \
+                              .values(encoded_address_data)
+                              )
+    await db.commit()
 
-    if result == 1:
-        return get_address(db, address_id)
+    if result.rowcount == 1:
+        return await get_address(db, address_id)
     return None
 
 
-def delete_address(
-        db: Session, address_id: int
+async def delete_address(
+        db: AsyncSession, address_id: int
     ) -> models.Address | None:
     """
     Удаляет информацию об адресе
     """
-    deleted_address = get_address(db, address_id)
+    deleted_address = await get_address(db, address_id)
 
-    result = db.query(models.Address) \
-        .filter(models.Address.id == address_id) \
-        .delete()
-    db.commit()
+    result = await db.execute(delete(models.Address) \
+                              .where(models.Address.id == address_id)
+                              )
+    await db.commit()
 
-    if result == 1:
+    if result.rowcount == 1:
         return deleted_address
     return None
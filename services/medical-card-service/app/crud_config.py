@@ -1,26 +1,30 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert
 
 from .database import models
+from .referencecache import reference_cache
 from .schemas import (FamilyStatus,
                       Education,
                       Busyness)
 
 
-def get_family_status(
-        db: Session, family_status_id: int
+async def get_family_status(
+        db: AsyncSession, family_status_id: int
     ) -> models.FamilyStatus | None:
     """
     Возвращает информацию о семейном положении
     """
 
-    return db.query(models.FamilyStatus) \
-        .filter(models.FamilyStatus.id == family_status_id) \
-        .first()
+    result = await db.execute(select(models.FamilyStatus) \
+                              .filter(models.FamilyStatus.id == family_status_id) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def upsert_family_status(
-        db: Session, family_status: FamilyStatus
+async def upsert_family_status(
+        db: AsyncSession, family_status: FamilyStatus
     ) -> models.FamilyStatus | None:
     """
     Обновляет или добавляет статус семейного положения в базу
@@ -31,28 +35,31 @@ def upsert_family_status(
         constraint='family_status_pkey',
         set_={"name": family_status.name}
     )
-    result = db.execute(stm)
+    result = await db.execute(stm)
 
-    db.commit()
+    await db.commit()
+    reference_cache.invalidate('family_status')
     if result:
-        return get_family_status(db, family_status.id)
+        return await get_family_status(db, family_status.id)
     return None
 
 
-def get_education(
-        db: Session, education_id: int
+async def get_education(
+        db: AsyncSession, education_id: int
     ) -> models.Education | None:
     """
     Возвращает информацию об образовании
     """
 
-    return db.query(models.Education) \
-        .filter(models.Education.id == education_id) \
-        .first()
+    result = await db.execute(select(models.Education) \
+                              .filter(models.Education.id == education_id) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def upsert_education(
-        db: Session, education: Education
+async def upsert_education(
+        db: AsyncSession, education: Education
     ) -> models.Education | None:
     """
     Обновляет или добавляет тип образования в базу
@@ -63,28 +70,31 @@ def upsert_education(
         constraint='education_pkey',
         set_={"name": education.name}
     )
-    result = db.execute(stm)
+    result = await db.execute(stm)
 
-    db.commit()
+    await db.commit()
+    reference_cache.invalidate('education')
     if result:
-        return get_education(db, education.id)
+        return await get_education(db, education.id)
     return None
 
 
-def get_busyness(
-        db: Session, busyness_id: int
+async def get_busyness(
+        db: AsyncSession, busyness_id: int
     ) -> models.Busyness | None:
     """
     Возвращает информацию о занятости
     """
 
-    return db.query(models.Busyness) \
-        .filter(models.Busyness.id == busyness_id) \
-        .first()
+    result = await db.execute(select(models.Busyness) \
+                              .filter(models.Busyness.id == busyness_id) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def upsert_busyness(
-        db: Session, busyness: Busyness
+async def upsert_busyness(
+        db: AsyncSession, busyness: Busyness
     ) -> models.Busyness | None:
     """
     Обновляет или добавляет тип занятости в базу
@@ -95,9 +105,10 @@ def upsert_busyness(
         constraint='busyness_pkey',
         set_={"name": busyness.name}
     )
-    result = db.execute(stm)
+    result = await db.execute(stm)
 
-    db.commit()
+    await db.commit()
+    reference_cache.invalidate('busyness')
     if result:
-        return get_education(db, busyness.id)
+        return await get_education(db, busyness.id)
     return None
@@ -1,21 +1,24 @@
 import base64
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from cryptography.fernet import Fernet
 
+from common.instrumentation import InstrumentedFernet
+
 from .database import models
 from .schemas import DisabilityIn, DisabilityOptional
 from . import config
 
 
 cfg: config.Config = config.load_config()
-CIPHER_SUITE: Fernet = Fernet(
+CIPHER_SUITE: Fernet = InstrumentedFernet(
     base64.b64decode(cfg.encrypt_key.get_secret_value())
 )
 
 
-def create_disability(db: Session, disability_in: DisabilityIn) -> models.Disability:
+async def create_disability(db: AsyncSession, disability_in: DisabilityIn) -> models.Disability:
     """
     Создает новую запись инвалидности в БД
     """
@@ -26,53 +29,56 @@ def create_disability(db: Session, disability_in: DisabilityIn) -> models.Disabi
     )
 
     db.add(db_disability)
-    db.commit()
-    db.refresh(db_disability)
+    await db.commit()
+    await db.refresh(db_disability)
     return db_disability
 
 
-def get_disability(
-        db: Session, disability_id: int
+async def get_disability(
+        db: AsyncSession, disability_id: int
     ) -> models.Disability | None:
     """
     Возвращает информацию о инвалидности
     """
-    return db.query(models.Disability) \
-            .filter(models.Disability.id == disability_id) \
-            .first()
+    result = await db.execute(select(models.Disability) \
+                              .filter(models.Disability.id == disability_id) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def update_disability(
-        db: Session, disability_id: int, disability_optional: DisabilityOptional
+async def update_disability(
+        db: AsyncSession, disability_id: int, disability_optional: DisabilityOptional
     ) -> models.Disability | None:
     """
     Обновляет информацию о инвалидности
     """
     encoded_disability_data = {key: CIPHER_SUITE.encrypt(str(value).encode()) for key, value in disability_optional.model_dump(exclude_unset=True).items()}
 
-    result = db.query(models.Disability) \
-        .filter(models.Disability.id == disability_id) \
-        .update(encoded_disability_data)
-    db.commit()
+    result = await db.execute(update(models.Disability) \
+                              .where(models.Disability.id == disability_id) \
+                              .values(encoded_disability_data)
+                              )
+    await db.commit()
 
-    if result == 1:
-        return get_disability(db, disability_id)
+    if result.rowcount == 1:
+        return await get_disability(db, disability_id)
     return None
 
 
-def delete_disability(
-        db: Session, disability_id: int
+async def delete_disability(
+        db: AsyncSession, disability_id: int
     ) -> models.Disability | None:
     """
     Удаляет информацию о инвалидности
     """
-    deleted_disability = get_disability(db, disability_id)
+    deleted_disability = await get_disability(db, disability_id)
 
-    result = db.query(models.Disability) \
-        .filter(models.Disability.id == disability_id) \
-        .delete()
-    db.commit()
+    result = await db.execute(delete(models.Disability) \
+                              .where(models.Disability.id == disability_id)
+                              )
+    await db.commit()
 
-    if result == 1:
+    if result.rowcount == 1:
         return deleted_disability
     return None
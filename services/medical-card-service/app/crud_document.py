@@ -1,12 +1,13 @@
 from datetime import datetime, timezone
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from .database import models
 from .schemas import DocumentIn, DocumentOptional
 
 
-def create_document(
-        db: Session, document_in: DocumentIn, path_to_file: str
+async def create_document(
+        db: AsyncSession, document_in: DocumentIn, path_to_file: str
 ) -> models.Document:
     """
     Создает новый документ в БД
@@ -21,51 +22,54 @@ def create_document(
     )
 
     db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
+    await db.commit()
+    await db.refresh(db_document)
     return db_document
 
 
-def get_document(
-        db: Session, document_id: int
+async def get_document(
+        db: AsyncSession, document_id: int
 ) -> models.Document | None:
     """
     Возвращает конкретный документ
     """
-    return db.query(models.Document) \
-        .filter(models.Document.id == document_id) \
-        .first()
+    result = await db.execute(select(models.Document) \
+                              .filter(models.Document.id == document_id) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def update_document(
-        db: Session, document_id: int, document_optional: DocumentOptional, path_to_file: str
+async def update_document(
+        db: AsyncSession, document_id: int, document_optional: DocumentOptional, path_to_file: str
 ) -> models.Document | None:
     """
     Обновляет информацию о документе
     """
-    result = db.query(models.Document) \
-        .filter(models.Document.id == document_id) \
-        .update(document_optional.model_dump(exclude_unset=True) | {"path_to_file": path_to_file})
-    db.commit()
+    result = await db.execute(update(models.Document) \
+                              .where(models.Document.id == document_id) \
+                              .values(document_optional.model_dump(exclude_unset=True) | {"path_to_file": path_to_file})
+                              )
+    await db.commit()
 
-    if result == 1:
-        return get_document(db, document_id)
+    if result.rowcount == 1:
+        return await get_document(db, document_id)
     return None
 
 
-def delete_document(
-        db: Session, document_id: int
+async def delete_document(
+        db: AsyncSession, document_id: int
 ) -> models.Document | None:
     """
     Удаляет информацию о документе
     """
-    deleted_document = get_document(db, document_id)
+    deleted_document = await get_document(db, document_id)
 
-    result = db.query(models.Document) \
-        .filter(models.Document.id == document_id) \
-        .delete()
-    db.commit()
+    result = await db.execute(delete(models.Document) \
+                              .where(models.Document.id == document_id)
+                              )
+    await db.commit()
 
-    if result == 1:
+    if result.rowcount == 1:
         return deleted_document
     return None
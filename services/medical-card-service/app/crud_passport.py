@@ -1,21 +1,24 @@
 import base64
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from cryptography.fernet import Fernet
 
+from common.instrumentation import InstrumentedFernet
+
 from .database import models
 from .schemas import PassportIn, PassportOptional
 from . import config
 
 
 cfg: config.Config = config.load_config()
-CIPHER_SUITE: Fernet = Fernet(
+CIPHER_SUITE: Fernet = InstrumentedFernet(
     base64.b64decode(cfg.encrypt_key.get_secret_value())
 )
 
 
-def create_passport(db: Session, passport: PassportIn) -> models.Passport:
+async def create_passport(db: AsyncSession, passport: PassportIn) -> models.Passport:
     """
     Создает новую запись паспорта в БД
     """
@@ -25,53 +28,56 @@ def create_passport(db: Session, passport: PassportIn) -> models.Passport:
     )
 
     db.add(db_passport)
-    db.commit()
-    db.refresh(db_passport)
+    await db.commit()
+    await db.refresh(db_passport)
     return db_passport
 
 
-def get_passport(
-        db: Session, passport_id: int
+async def get_passport(
+        db: AsyncSession, passport_id: int
     ) -> models.Passport | None:
     """
     Возвращает информацию о паспорте
     """
-    return db.query(models.Passport) \
-            .filter(models.Passport.id == passport_id) \
-            .first()
+    result = await db.execute(select(models.Passport) \
+                              .filter(models.Passport.id == passport_id) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def update_passport(
-        db: Session, passport_id: int, passport_optional: PassportOptional
+async def update_passport(
+        db: AsyncSession, passport_id: int, passport_optional: PassportOptional
     ) -> models.Passport | None:
     """
     Обновляет информацию о паспорте
     """
     encoded_passport_data = {key: CIPHER_SUITE.encrypt(value.encode()) for key, value in passport_optional.model_dump(exclude_unset=True).items()}
 
-    result = db.query(models.Passport) \
-        .filter(models.Passport.id == passport_id) \
-        .update(encoded_passport_data)
-    db.commit()
+    result = await db.execute(update(models.Passport) \
+                              .where(models.Passport.id == passport_id) \
+                              .values(encoded_passport_data)
+                              )
+    await db.commit()
 
-    if result == 1:
-        return get_passport(db, passport_id)
+    if result.rowcount == 1:
+        return await get_passport(db, passport_id)
     return None
 
 
-def delete_passport(
-        db: Session, passport_id: int
+async def delete_passport(
+        db: AsyncSession, passport_id: int
     ) -> models.Passport | None:
     """
     Удаляет информацию о паспорте
     """
-    deleted_passport = get_passport(db, passport_id)
+    deleted_passport = await get_passport(db, passport_id)
 
-    result = db.query(models.Passport) \
-        .filter(models.Passport.id == passport_id) \
-        .delete()
-    db.commit()
+    result = await db.execute(delete(models.Passport) \
+                              .where(models.Passport.id == passport_id)
+                              )
+    await db.commit()
 
-    if result == 1:
+    if result.rowcount == 1:
         return deleted_passport
     return None
@@ -1,16 +1,29 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from typing import AsyncGenerator
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy.orm import DeclarativeBase
+
+from common.pool import pool_monitor
 
 
 class DatabaseInitializer:
     def __init__(self, base) -> None:
-        self.base = base
+        self.__base = base
+        self.__async_session_maker = None
 
-    def init_database(self, postgres_dsn):
-        engine = create_engine(postgres_dsn)
-        session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        self.base.metadata.create_all(bind=engine)
-        return session_local
+    async def init_database(self, postgres_dsn, **engine_options):
+        engine = create_async_engine(postgres_dsn, **engine_options)
+        pool_monitor.attach(engine)
+        # Расшифровка изменяет загруженные объекты, поэтому они не должны попасть в базу при autoflush
+        self.__async_session_maker = async_sessionmaker(
+            engine, expire_on_commit=False, autoflush=False
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(self.__base.metadata.create_all)
+
+    @property
+    def async_session_maker(self):
+        return self.__async_session_maker
 
 
 class Base(DeclarativeBase):
@@ -19,3 +32,7 @@ class Base(DeclarativeBase):
 
 DB_INITIALIZER = DatabaseInitializer(Base())
 
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with DB_INITIALIZER.async_session_maker() as session:
+        yield session
@@ -17,7 +17,7 @@ class Page(Base):
     create_date = Column(DateTime(timezone=True), nullable=False)
     is_deleted = Column(Boolean, default=False)
     card = relationship("Card", back_populates='pages')
-    documents = relationship("Document", backref='page', cascade='all, delete-orphan')
+    documents = relationship("Document", backref='page', cascade='all, delete-orphan', lazy="selectin")
 
 
 class Card(Base):
@@ -50,12 +50,12 @@ class Card(Base):
     create_date = Column(Date, nullable=False)
     is_deleted = Column(Boolean, default=False)
     pages = relationship("Page", back_populates='card')
-    address = relationship("Address", back_populates='card', uselist=False)
-    passport = relationship("Passport", back_populates="card", uselist=False)
-    family_status = relationship("FamilyStatus", backref="cards")
-    education = relationship("Education", backref="cards")
-    busyness = relationship("Busyness", backref="cards")
-    disability = relationship("Disability", back_populates="card", uselist=False)
+    address = relationship("Address", back_populates='card', uselist=False, lazy="selectin")
+    passport = relationship("Passport", back_populates="card", uselist=False, lazy="selectin")
+    family_status = relationship("FamilyStatus", backref="cards", lazy="selectin")
+    education = relationship("Education", backref="cards", lazy="selectin")
+    busyness = relationship("Busyness", backref="cards", lazy="selectin")
+    disability = relationship("Disability", back_populates="card", uselist=False, lazy="selectin")
 
 
 class Document(Base):
@@ -120,3 +120,10 @@ class Disability(Base):
     group = Column(LargeBinary, nullable=False)
     create_date = Column(LargeBinary, nullable=False)
     card = relationship("Card", back_populates="disability", uselist=False)
+
+
+class SeedHash(Base):
+    __tablename__ = 'seed_hash'
+
+    name = Column(String, primary_key=True)
+    hash = Column(String(length=64), nullable=False)
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Hashable
+
+
+PageValidator = Callable[[dict], list[str]]
+
+
+class PageDataError(Exception):
+    def __init__(self, errors: list[str]) -> None:
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def is_empty(value: Any) -> bool:
+    return value is None or value == ''
+
+
+def check_scalar(value: Any) -> bool:
+    return isinstance(value, (str, int, float, bool))
+
+
+def check_number(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def check_date(value: Any) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        date.fromisoformat(value[:10])
+    except ValueError:
+        return False
+    return True
+
+
+def check_checkbox(value: Any) -> bool:
+    return isinstance(value, bool) or value in ('true', 'false')
+
+
+# Проверки значений полей по типу поля шаблона.
+# Для неизвестных типов значение должно быть скаляром
+FIELD_CHECKS: dict[str, Callable[[Any], bool]] = {
+    'number': check_number,
+    'date': check_date,
+    'checkbox': check_checkbox
+}
+
+
+def compile_field(field: dict) -> Callable[[Any], bool]:
+    if field.get('type') == 'select':
+        # Значение поля выбора может быть как идентификатором, так и названием варианта
+        allowed = frozenset(
+            str(option[key])
+            for option in field.get('options') or []
+            for key in ('id', 'name')
+            if option.get(key) is not None
+        )
+        return lambda value: check_scalar(value) and str(value) in allowed
+    return FIELD_CHECKS.get(field.get('type'), check_scalar)
+
+
+def compile_validator(structure: list[dict]) -> PageValidator:
+    """
+    Строит по структуре шаблона функцию проверки данных страницы. Функция возвращает
+    список ошибок: неизвестные поля и значения, не соответствующие типу поля
+    """
+    checks = {
+        field['name']: compile_field(field)
+        for item in structure
+        for field in item.get('fields') or []
+    }
+
+    def validate(data: dict) -> list[str]:
+        errors = []
+        for name, value in data.items():
+            check = checks.get(name)
+            if check is None:
+                errors.append(f'Поле <{name}> отсутствует в шаблоне')
+            elif not is_empty(value) and not check(value):
+                errors.append(f'Недопустимое значение поля <{name}>')
+        return errors
+
+    return validate
+
+
+class ValidatorCache:
+    """
+    LRU-кэш скомпилированных функций проверки, ключ - идентификатор и версия шаблона.
+    Изменение шаблона увеличивает его версию, поэтому записи не нужно сбрасывать
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+        self.__validators: OrderedDict[Hashable, PageValidator] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> PageValidator | None:
+        with self.__lock:
+            validator = self.__validators.get(key)
+            if validator is None:
+                self.misses += 1
+                return None
+            self.__validators.move_to_end(key)
+            self.hits += 1
+            return validator
+
+    def set(self, key: Hashable, validator: PageValidator) -> None:
+        with self.__lock:
+            self.__validators[key] = validator
+            self.__validators.move_to_end(key)
+            while len(self.__validators) > self.max_size:
+                self.__validators.popitem(last=False)
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.__validators),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,11 @@
+from common.httpcache import ReferenceCache
+
+from . import config
+
+
+app_config: config.Config = config.load_config()
+
+# Кэш справочников семейного положения, образования и занятости
+reference_cache: ReferenceCache = ReferenceCache(
+    ttl=app_config.reference_cache_ttl, max_entries=app_config.reference_cache_max_entries
+)
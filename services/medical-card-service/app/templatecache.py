@@ -0,0 +1,107 @@
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from .pagevalidator import PageDataError, ValidatorCache, compile_validator
+
+
+cfg: config.Config = config.load_config()
+
+
+class TemplateVersionCache:
+    """
+    Кэш версий шаблонов из сервиса шаблонов. Шаблоны не удаляются из базы физически,
+    поэтому найденный шаблон можно не перепроверять до истечения времени жизни записи,
+    после чего будет прочитана его актуальная версия.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+        self.__versions: dict[int, tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template_id: int) -> int | None:
+        with self.__lock:
+            item = self.__versions.get(template_id)
+            if item is None or item[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[0]
+
+    def set(self, template_id: int, version: int) -> None:
+        with self.__lock:
+            if len(self.__versions) >= self.max_size:
+                self.__versions.clear()
+            self.__versions[template_id] = (version, time.monotonic() + self.ttl)
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.__versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+async def get_template_version(
+        db: AsyncSession, template_id: int
+    ) -> int | None:
+    """
+    Возвращает версию шаблона или None, если шаблон не найден
+    """
+    version = template_versions.get(template_id)
+    if version is not None:
+        return version
+
+    result = (await db.execute(
+        text("SELECT version FROM public.templates WHERE id = :template_id"),
+        {"template_id": template_id}
+    )).fetchone()
+    if result is None:
+        return None
+    template_versions.set(template_id, result.version)
+    return result.version
+
+
+async def validate_page_data(
+        db: AsyncSession, template_id: int, data: dict
+    ) -> None:
+    """
+    Проверяет данные страницы по структуре шаблона. Функция проверки компилируется
+    один раз для каждой версии шаблона
+    """
+    if not cfg.validate_page_data:
+        return
+    version = await get_template_version(db, template_id)
+    if version is None:
+        return
+    validator = page_validators.get((template_id, version))
+    if validator is None:
+        result = (await db.execute(
+            text("SELECT version, structure FROM public.templates WHERE id = :template_id"),
+            {"template_id": template_id}
+        )).fetchone()
+        if result is None:
+            return
+        template_versions.set(template_id, result.version)
+        validator = compile_validator(result.structure)
+        page_validators.set((template_id, result.version), validator)
+
+    errors = validator(data)
+    if errors:
+        raise PageDataError(errors)
+
+
+template_versions: TemplateVersionCache = TemplateVersionCache(
+    ttl=cfg.template_cache_ttl, max_size=cfg.template_cache_max_size
+)
+page_validators: ValidatorCache = ValidatorCache(max_size=cfg.template_cache_max_size)
@@ -0,0 +1,74 @@
+"""
+Нагрузочный тест GET-запросов: измеряет число запросов в секунду и задержки
+при заданном числе одновременных клиентов. Используется для сравнения сервисов
+до и после перехода на асинхронную работу с базой данных.
+
+    pip install httpx
+    python benchmarks/load_test.py http://127.0.0.1:5002/cards/1 http://127.0.0.1:5001/templates \\
+        --concurrency 50 --duration 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def worker(client: httpx.AsyncClient, urls: list[str], deadline: float, offset: int,
+                 latencies: list[float], errors: list[int]):
+    i = offset
+    while time.perf_counter() < deadline:
+        url = urls[i % len(urls)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(url)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(urls: list[str], concurrency: int, duration: float, headers: dict):
+    latencies: list[float] = []
+    errors: list[int] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30) as client:
+        # Прогрев: соединения и кэши сервисов
+        await asyncio.gather(*(client.get(url) for url in urls), return_exceptions=True)
+
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            worker(client, urls, deadline, i, latencies, errors) for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    print(f"Клиентов: {concurrency}, длительность: {elapsed:.1f} с")
+    print(f"Успешных запросов: {len(latencies)}, ошибок: {len(errors)}")
+    print(f"Запросов в секунду: {len(latencies) / elapsed:.1f}")
+    if latencies:
+        latencies.sort()
+        print(f"Задержка, мс: медиана {statistics.median(latencies) * 1000:.1f}, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--header', action='append', default=[], help='Заголовок в формате "Имя: значение"')
+    args = parser.parse_args()
+
+    headers = dict(header.split(': ', 1) for header in args.header)
+    asyncio.run(run(args.urls, args.concurrency, args.duration, headers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Измеряет время проверки данных одной страницы скомпилированной функцией.
+
+    python benchmarks/page_validator.py [--fields 60] [--iterations 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from pagevalidator import compile_validator  # noqa: E402
+
+
+FIELD_TYPES = ['text', 'number', 'date', 'checkbox', 'select']
+
+
+def make_template(fields_count: int) -> list[dict]:
+    fields = []
+    for i in range(fields_count):
+        field_type = FIELD_TYPES[i % len(FIELD_TYPES)]
+        field = {"title": f"Поле {i}", "type": field_type, "name": f"field_{i}", "value": None}
+        if field_type == 'select':
+            field["options"] = [{"id": j, "name": f"Вариант {j}"} for j in range(10)]
+        fields.append(field)
+    return [
+        {"title": f"Раздел {i}", "divider": None, "body": None, "fields": fields[i:i + 10]}
+        for i in range(0, fields_count, 10)
+    ]
+
+
+def make_data(fields_count: int) -> dict:
+    values = {
+        'text': 'жалоб нет',
+        'number': '36.6',
+        'date': '2023-11-20',
+        'checkbox': True,
+        'select': 'Вариант 3'
+    }
+    return {f"field_{i}": values[FIELD_TYPES[i % len(FIELD_TYPES)]] for i in range(fields_count)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fields', type=int, default=60)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    structure = make_template(args.fields)
+    data = make_data(args.fields)
+
+    compile_time = timeit.timeit(lambda: compile_validator(structure), number=1000) / 1000
+    validator = compile_validator(structure)
+    assert validator(data) == []
+    validate_time = timeit.timeit(lambda: validator(data), number=args.iterations) / args.iterations
+
+    print(f"Полей в шаблоне: {args.fields}")
+    print(f"Компиляция шаблона: {compile_time * 1e6:.1f} мкс")
+    print(f"Проверка страницы: {validate_time * 1e6:.1f} мкс")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,33 @@
 import logging
-from typing import Any, Dict
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict
 import websockets
 import asyncio
 
 import httpx
 from fastapi import FastAPI, Request, HTTPException, Depends, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 
 from sqlalchemy.orm import Session
+from common.instrumentation import REGISTRY, Counter, Histogram, setup_metrics
+from common.pool import make_engine_options, pool_monitor
+from common.tracing import TRACEPARENT_HEADER, setup_tracing, tracer
 
 from . import config, schemes
+from .policies.ratelimit import RateLimitExceeded, create_rate_limiter
+from .policies.policyset import PolicySet
 from .policies.requestenforcer import EnforceResult, RequestEnforcer
+from .coalescing import HOP_BY_HOP_HEADERS, SAFE_METHODS, ResponseCoalescer, SharedResponse, is_cache_bypassed
+from .compression import CompressionMiddleware
 from .database.database import DB_INITIALIZER
+from .metricsserver import MetricsServer
+from .policywatcher import PolicyWatcher
+from .proxy import get_request_content
+from .resilience import ServiceGuard, ServiceUnavailable, create_service_guards
+from .upstreams import FAILURE_STATUS_CODES, UpstreamRegistry
 
 
 def get_db():
@@ -32,13 +47,97 @@ def get_db():
 
 app_config: config.Config = config.load_config()
 
-SessionLocal = DB_INITIALIZER.init_database(app_config.postgres_dsn.unicode_string())
+SessionLocal = DB_INITIALIZER.init_database(
+    app_config.postgres_dsn.unicode_string(), **make_engine_options(app_config, is_async=False)
+)
 
 policy_checker: RequestEnforcer = RequestEnforcer(
-    app_config.policies_config_path, app_config.jwt_secret.get_secret_value()
+    app_config.policies_config_path,
+    app_config.jwt_secret.get_secret_value(),
+    app_config.policy_engine,
+    app_config.policy_decision_cache_size,
+    app_config.jwt_cache_size,
+    app_config.jwt_cache_ttl,
+    create_rate_limiter(app_config)
+)
+
+upstreams: UpstreamRegistry = UpstreamRegistry(
+    policy_checker.services,
+    app_config.upstream_balancing,
+    app_config.upstream_failure_threshold,
+    app_config.upstream_eject_seconds
+)
+
+# Медленный или недоступный сервис не должен занимать шлюз: запросы к нему ограничены по числу
+# и времени, а при серии ошибок отклоняются сразу
+service_guards: dict[str, ServiceGuard] = create_service_guards(policy_checker.services, app_config)
+
+coalescer: ResponseCoalescer = ResponseCoalescer(
+    app_config.response_cache_max_entries,
+    app_config.response_cache_max_body_size
 )
 
 
+def apply_policies(policies: PolicySet) -> None:
+    """
+    Обновляет реплики и ограничители сервисов после перезагрузки политик
+    """
+    services = list(policies.services.values())
+    changed = upstreams.update(services)
+    service_guards.update(create_service_guards([s for s in services if s.name in changed], app_config))
+    for name in service_guards.keys() - policies.services.keys():
+        del service_guards[name]
+    # Общими могли перестать быть ресурсы, ответы которых хранятся в микрокэше
+    coalescer.clear()
+
+
+policy_watcher: PolicyWatcher = PolicyWatcher(policy_checker, apply_policies)
+
+# Время проверки политик учитывается отдельно от времени ответа сервисов,
+# чтобы задержку шлюза можно было отличить от задержки сервиса
+POLICY_DURATION: Histogram = REGISTRY.register(Histogram(
+    'gateway_policy_duration_seconds', 'Длительность проверки запроса по политикам', ('result',)
+))
+UPSTREAM_DURATION: Histogram = REGISTRY.register(Histogram(
+    'gateway_upstream_duration_seconds', 'Время до получения заголовков ответа сервиса', ('upstream', 'status')
+))
+RATE_LIMITED: Counter = REGISTRY.register(Counter(
+    'gateway_rate_limited_total', 'Количество запросов, отклоненных ограничением частоты', ('group',)
+))
+
+
+def collect_decision_cache_metrics():
+    if policy_checker.decision_cache is None:
+        return
+    stats = policy_checker.decision_cache.stats
+    for name, key, description in (
+        ('gateway_decision_cache_hits_total', 'hits', 'Количество решений, взятых из кэша'),
+        ('gateway_decision_cache_misses_total', 'misses', 'Количество решений, вычисленных и добавленных в кэш'),
+        ('gateway_decision_cache_bypasses_total', 'bypasses', 'Количество проверок, зависящих от параметров запроса'),
+    ):
+        yield f'# HELP {name} {description}'
+        yield f'# TYPE {name} counter'
+        yield f'{name} {stats[key]}'
+
+
+def collect_token_cache_metrics():
+    if policy_checker.token_cache is None:
+        return
+    stats = policy_checker.token_cache.stats
+    for name, key, description in (
+        ('gateway_token_cache_hits_total', 'hits', 'Количество токенов, данные которых взяты из кэша'),
+        ('gateway_token_cache_misses_total', 'misses', 'Количество проверок подписи токенов'),
+        ('gateway_token_cache_rejections_total', 'rejections', 'Количество отказов по запомненной ошибке проверки'),
+    ):
+        yield f'# HELP {name} {description}'
+        yield f'# TYPE {name} counter'
+        yield f'{name} {stats[key]}'
+
+
+REGISTRY.add_collector(collect_decision_cache_metrics)
+REGISTRY.add_collector(collect_token_cache_metrics)
+
+
 class App(FastAPI):
     def openapi(self) -> Dict[str, Any]:
         scheme_builder = schemes.SchemeBuilder(super().openapi())
@@ -50,6 +149,23 @@ class App(FastAPI):
 
 
 app = App()
+# Метрики и состояние шлюза отдаются отдельным сервером на внутреннем порту, а не через публичный порт шлюза
+metrics_app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
+metrics_server = MetricsServer(metrics_app, app_config.metrics_host, app_config.metrics_port)
+
+setup_metrics(app, pool_monitor, metrics_app)
+# Трасса начинается на шлюзе, заголовок traceparent от клиента не используется
+setup_tracing(app, app_config, 'policy-enforcement-service', trust_incoming=False)
+
+# Сжатие ответов сервисов и схемы OpenAPI по заголовку Accept-Encoding клиента
+if app_config.compression_min_size >= 0:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=app_config.compression_min_size,
+        content_types=tuple(t.strip().lower() for t in app_config.compression_content_types.split(',') if t.strip()),
+        gzip_level=app_config.compression_gzip_level,
+        brotli_quality=app_config.compression_brotli_quality
+    )
 
 app.add_middleware(
     CORSMiddleware,
@@ -57,15 +173,122 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
+@app.on_event("startup")
+async def start_metrics_server():
+    metrics_server.start()
+
+
+@app.on_event("shutdown")
+async def stop_metrics_server():
+    await metrics_server.stop()
+
+
+@app.on_event("startup")
+async def start_upstream_health_checks():
+    upstreams.start(app_config.upstream_health_check_interval, app_config.upstream_health_check_timeout)
+
+
+@app.on_event("shutdown")
+async def stop_upstream_health_checks():
+    await upstreams.stop()
+
+
+@app.on_event("startup")
+async def start_policy_watcher():
+    policy_watcher.start(app_config.policies_reload_interval)
+
+
+@app.on_event("shutdown")
+async def stop_policy_watcher():
+    await policy_watcher.stop()
+
+
+@metrics_app.get("/metrics/db-pool")
+async def get_db_pool_metrics():
+    return pool_monitor.stats
+
+
+@metrics_app.get("/metrics/policy-decisions")
+async def get_policy_decision_metrics():
+    if policy_checker.decision_cache is None:
+        return {}
+    return policy_checker.decision_cache.stats
+
+
+@metrics_app.get("/metrics/token-cache")
+async def get_token_cache_metrics():
+    if policy_checker.token_cache is None:
+        return {}
+    return policy_checker.token_cache.stats
+
+
+@metrics_app.get("/metrics/upstreams")
+async def get_upstream_metrics():
+    return upstreams.stats
+
+
+@metrics_app.get("/metrics/shared-requests")
+async def get_shared_request_metrics():
+    return coalescer.stats
+
+
+@metrics_app.get("/metrics/circuit-breakers")
+async def get_circuit_breaker_metrics():
+    return {name: guard.stats for name, guard in service_guards.items()}
+
+
+@metrics_app.get("/metrics/policies")
+async def get_policy_metrics():
+    return policy_watcher.stats
+
+
+@app.post("/authorize", response_model=schemes.AuthorizeBatchResponse)
+async def authorize_batch(
+        request: Request, batch: schemes.AuthorizeBatchRequest, db: Session = Depends(get_db)
+    ):
+    """
+    Возвращает ресурсы из списка, доступные пользователю токена, за одну проверку вместо проверки каждого ресурса
+    """
+    if len(batch.resources) > app_config.authorize_batch_max_size:
+        raise HTTPException(
+            detail=f'Можно проверить не больше {app_config.authorize_batch_max_size} ресурсов', status_code=413
+        )
+    started = time.perf_counter()
+    with tracer.span('policy.enforce_batch', attributes={'policy.resources': len(batch.resources)}) as span:
+        allowed = await policy_checker.enforce_batch(request, batch.resources, batch.method.upper(), db)
+        span.set_attribute('policy.allowed_resources', len(allowed))
+    POLICY_DURATION.observe(('batch',), time.perf_counter() - started)
+    return schemes.AuthorizeBatchResponse(allowed=allowed)
+
+
 @app.api_route(
     "/{path_name:path}",
     methods=["GET", "DELETE", "PATCH", "POST", "PUT", "HEAD", "OPTIONS", "CONNECT", "TRACE"]
 )
 async def catch_all(request: Request, path_name: str, db: Session = Depends(get_db)):
-    enforce_result: EnforceResult = await policy_checker.enforce(request, db)
+    started = time.perf_counter()
+    with tracer.span('policy.enforce') as span:
+        try:
+            enforce_result: EnforceResult = await policy_checker.enforce(request, db)
+        except RateLimitExceeded as e:
+            POLICY_DURATION.observe(('rate_limited',), time.perf_counter() - started)
+            RATE_LIMITED.inc((e.group,))
+            raise HTTPException(
+                detail='Слишком много запросов', status_code=429,
+                headers={'Retry-After': str(math.ceil(e.retry_after))}
+            )
+        finally:
+            # Сессия нужна только для проверки полномочий: соединение возвращается в пул
+            # до обращения к сервису, а не удерживается до конца передачи ответа клиенту
+            db.close()
+        span.set_attribute('policy.allowed', enforce_result.access_allowed)
+    POLICY_DURATION.observe(
+        ('allowed' if enforce_result.access_allowed else 'denied',), time.perf_counter() - started
+    )
     if not enforce_result.access_allowed:
         # logger.info('The user does not have enough permissions. A blocked route: %s', path_name)
         raise HTTPException(detail='Метод не доступен', status_code=404)
@@ -77,55 +300,174 @@ async def catch_all(request: Request, path_name: str, db: Session = Depends(get_
     "/{path_name:path}",
 )
 async def catch_websocket(websocket: WebSocket, db: Session = Depends(get_db)):
-    enforce_result, chat_id, client_id = await policy_checker.enforce_websocket(websocket, db)
+    try:
+        enforce_result, chat_id, client_id = await policy_checker.enforce_websocket(websocket, db)
+    finally:
+        # Соединение с БД не удерживается, пока открыто соединение с сервисом чатов
+        db.close()
     if not enforce_result.access_allowed:
         await websocket.close(code=1008)
         raise HTTPException(detail='Метод не доступен', status_code=404)
 
-    location = enforce_result.redirect_service.split('/')[2]
-    target_url = f"ws://{location}/ws/{chat_id}/{client_id}"
-    await redirect_websocket(websocket, target_url)
+    pool = upstreams.get(enforce_result.service_name)
+    endpoint = pool.acquire()
+    try:
+        location = endpoint.url.split('/')[2]
+        target_url = f"ws://{location}/ws/{chat_id}/{client_id}"
+        await redirect_websocket(websocket, target_url)
+    finally:
+        pool.release(endpoint)
 
 
-async def redirect_user_request(request: Request, enforce_result: EnforceResult):
-    client = httpx.AsyncClient(base_url=enforce_result.redirect_service)
+async def send_upstream_request(
+        request: Request, enforce_result: EnforceResult
+    ) -> tuple[httpx.Response, Callable[[], Awaitable[None]]]:
+    """
+    Отправляет запрос сервису и возвращает ответ с непрочитанным телом и функцию его закрытия
+    """
+    guard = service_guards[enforce_result.service_name]
+    try:
+        await guard.acquire()
+    except ServiceUnavailable:
+        raise HTTPException(detail='Сервис временно недоступен', status_code=503)
+
+    pool = upstreams.get(enforce_result.service_name)
+    endpoint = pool.acquire()
+    timeout = enforce_result.timeout if enforce_result.timeout is not None else app_config.upstream_timeout
+    client = httpx.AsyncClient(base_url=endpoint.url, timeout=timeout)
     url = httpx.URL(path=request.url.path,
                     query=request.url.query.encode("utf-8"))
-    rp_req = client.build_request(request.method, url,
-                                  headers=request.headers.raw,
-                                  content=await request.body())
-    rp_resp = await client.send(rp_req, stream=True)
+
+    released = False
+
+    # Запрос к сервису считается незавершенным, пока ответ не передан клиенту
+    async def release_upstream():
+        nonlocal released
+        if released:
+            return
+        released = True
+        pool.release(endpoint)
+        guard.release()
+        await client.aclose()
+
+    started = time.perf_counter()
+    try:
+        with tracer.span('upstream', kind='client', attributes={'upstream': endpoint.url}) as span:
+            rp_req = client.build_request(request.method, url,
+                                          headers=tracer.inject_headers(request.headers.raw),
+                                          content=get_request_content(request))
+            rp_resp = await client.send(rp_req, stream=True)
+            span.set_attribute('http.status_code', rp_resp.status_code)
+    except httpx.TransportError as e:
+        pool.record(endpoint, time.perf_counter() - started, failed=True)
+        guard.record(failed=True)
+        await release_upstream()
+        if isinstance(e, httpx.TimeoutException):
+            raise HTTPException(detail='Сервис не ответил вовремя', status_code=504)
+        raise HTTPException(detail='Сервис недоступен', status_code=502)
+    except BaseException:
+        await release_upstream()
+        raise
+    duration = time.perf_counter() - started
+    failed = rp_resp.status_code in FAILURE_STATUS_CODES
+    pool.record(endpoint, duration, failed=failed)
+    guard.record(failed=failed)
+    UPSTREAM_DURATION.observe((enforce_result.redirect_service, str(rp_resp.status_code)), duration)
+
+    async def close_upstream_response():
+        await rp_resp.aclose()
+        await release_upstream()
+
+    return rp_resp, close_upstream_response
+
+
+async def redirect_user_request(request: Request, enforce_result: EnforceResult):
+    if enforce_result.shareable and request.method == 'GET' and get_request_content(request) is None:
+        return await redirect_shared_request(request, enforce_result)
+
+    rp_resp, close_upstream_response = await send_upstream_request(request, enforce_result)
+    if request.method not in SAFE_METHODS:
+        coalescer.invalidate(enforce_result.service_name)
+
+    # Фоновая задача не выполняется, если передача ответа прервалась ошибкой,
+    # поэтому место в лимите освобождается и при завершении чтения ответа
+    async def stream_upstream_response():
+        try:
+            async for chunk in rp_resp.aiter_raw():
+                yield chunk
+        finally:
+            await close_upstream_response()
+
     return StreamingResponse(
-        rp_resp.aiter_raw(),
+        stream_upstream_response(),
         status_code=rp_resp.status_code,
-        headers=rp_resp.headers
+        headers=rp_resp.headers,
+        background=BackgroundTask(close_upstream_response)
     )
 
 
+async def redirect_shared_request(request: Request, enforce_result: EnforceResult):
+    """
+    Одинаковые одновременные запросы к общему ресурсу получают один ответ сервиса
+    """
+    # Условные запросы входят в ключ, чтобы ответ 304 получали только клиенты с той же версией ресурса
+    key = (
+        enforce_result.service_name, request.url.path, request.url.query,
+        request.headers.get('accept'), request.headers.get('accept-encoding'),
+        request.headers.get('if-none-match'), request.headers.get('if-modified-since')
+    )
+
+    async def load_shared_response() -> SharedResponse:
+        rp_resp, close_upstream_response = await send_upstream_request(request, enforce_result)
+        try:
+            body = b''.join([chunk async for chunk in rp_resp.aiter_raw()])
+        finally:
+            await close_upstream_response()
+        headers = [
+            (name, value) for name, value in rp_resp.headers.multi_items()
+            if name not in HOP_BY_HOP_HEADERS and name != 'content-length'
+        ]
+        return SharedResponse(rp_resp.status_code, headers, body)
+
+    shared_response, is_shared = await coalescer.fetch(
+        key, enforce_result.cache_ttl, load_shared_response,
+        use_cache=not is_cache_bypassed(request.headers.get('cache-control'))
+    )
+    response = Response(content=shared_response.body, status_code=shared_response.status_code)
+    for name, value in shared_response.headers:
+        # Cookie ответа предназначены только клиенту, для которого выполнялся запрос
+        if is_shared and name == 'set-cookie':
+            continue
+        response.raw_headers.append((name.encode('latin-1'), value.encode('latin-1')))
+    return response
+
+
 async def redirect_websocket(client_ws: WebSocket, target_url: str):
     await client_ws.accept()
 
-    async with websockets.connect(target_url) as server_ws:
-        async def forward_client_to_server(client_ws, server_ws):
-            try:
-                while True:
-                    data = await client_ws.receive_text()
-                    await server_ws.send(data)
-            except WebSocketDisconnect:
-                await server_ws.close()
+    with tracer.span('upstream', kind='client', attributes={'upstream': target_url}) as span:
+        extra_headers = {TRACEPARENT_HEADER: span.context.traceparent}
+        async with websockets.connect(target_url, extra_headers=extra_headers) as server_ws:
+            async def forward_client_to_server(client_ws, server_ws):
+                try:
+                    while True:
+                        data = await client_ws.receive_text()
+                        await server_ws.send(data)
+                except WebSocketDisconnect:
+                    await server_ws.close()
 
-        async def forward_server_to_client(client_ws, server_ws):
-            try:
-                while True:
-                    data = await server_ws.recv()
-                    await client_ws.send_text(data)
-            except websockets.ConnectionClosed:
-                await client_ws.close()
+            async def forward_server_to_client(client_ws, server_ws):
+                try:
+                    while True:
+                        data = await server_ws.recv()
+                        await client_ws.send_text(data)
+                except websockets.ConnectionClosed:
+                    await client_ws.close()
 
-        try:
-            await asyncio.gather(
-                forward_client_to_server(client_ws, server_ws),
-                forward_server_to_client(client_ws, server_ws),
-            )
-        except Exception as e:
-            print(f"Error in redirect_websocket: {e}")
\ No newline at end of file
+            try:
+                await asyncio.gather(
+                    forward_client_to_server(client_ws, server_ws),
+                    forward_server_to_client(client_ws, server_ws),
+                )
+            except Exception as e:
+                print(f"Error in redirect_websocket: {e}")
\ No newline at end of file
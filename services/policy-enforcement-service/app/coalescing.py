@@ -0,0 +1,142 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from common.instrumentation import REGISTRY, Counter
+
+
+# Заголовки соединения, которые не передаются в сохраненном ответе
+HOP_BY_HOP_HEADERS = frozenset({
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'transfer-encoding', 'upgrade'
+})
+
+# Методы, не изменяющие ресурсы: остальные запросы к сервису удаляют его ответы из микрокэша
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+# Директивы Cache-Control ответа, запрещающие повторно отдавать его другим клиентам
+NO_SHARED_CACHE_DIRECTIVES = frozenset({'no-store', 'no-cache', 'private'})
+
+# Директивы Cache-Control запроса, требующие ответа непосредственно от сервиса
+NO_CACHE_REQUEST_DIRECTIVES = frozenset({'no-store', 'no-cache'})
+
+CACHE_CONTROL_DIRECTIVE = re.compile(r'\s*([a-z-]+)\s*(?:=\s*"?(\d+)"?)?\s*', re.IGNORECASE)
+
+SHARED_REQUESTS: Counter = REGISTRY.register(Counter(
+    'gateway_shared_requests_total',
+    'Запросы к общим ресурсам: miss - запрос к сервису, coalesced - ожидание одинакового запроса, hit - микрокэш',
+    ('result',)
+))
+
+
+@dataclass
+class SharedResponse:
+    status_code: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+    def header(self, name: str) -> str | None:
+        for key, value in self.headers:
+            if key == name:
+                return value
+        return None
+
+
+def parse_cache_control(value: str | None) -> dict[str, int | None]:
+    directives = {}
+    for part in (value or '').split(','):
+        match = CACHE_CONTROL_DIRECTIVE.fullmatch(part)
+        if match is not None:
+            directives[match.group(1).lower()] = int(match.group(2)) if match.group(2) else None
+    return directives
+
+
+def get_response_ttl(response: SharedResponse, ttl: float) -> float:
+    """
+    Возвращает время хранения ответа в микрокэше с учетом Cache-Control ответа
+    """
+    if response.status_code != 200 or response.header('set-cookie') is not None:
+        return 0
+    directives = parse_cache_control(response.header('cache-control'))
+    if NO_SHARED_CACHE_DIRECTIVES & directives.keys():
+        return 0
+    max_age = directives.get('s-maxage', directives.get('max-age'))
+    if max_age is not None:
+        return min(ttl, max_age)
+    return ttl
+
+
+def is_cache_bypassed(cache_control: str | None) -> bool:
+    return bool(NO_CACHE_REQUEST_DIRECTIVES & parse_cache_control(cache_control).keys())
+
+
+class ResponseCoalescer:
+    """
+    Объединяет одновременные одинаковые запросы к общим ресурсам: к сервису отправляется один запрос,
+    а его ответ получают все ожидающие. Ответ может храниться в микрокэше несколько секунд
+    """
+
+    def __init__(self, max_entries: int = 1000, max_body_size: int = 1048576) -> None:
+        self.max_entries = max_entries
+        self.max_body_size = max_body_size
+        self.__inflight: dict[tuple, asyncio.Task] = {}
+        self.__cache: OrderedDict[tuple, tuple[SharedResponse, float]] = OrderedDict()
+
+    async def fetch(
+            self, key: tuple, ttl: float, load: Callable[[], Awaitable[SharedResponse]], use_cache: bool = True
+        ) -> tuple[SharedResponse, bool]:
+        """
+        Возвращает ответ и признак того, что он получен для другого запроса или взят из микрокэша
+        """
+        if use_cache and ttl > 0:
+            entry = self.__cache.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self.__cache.move_to_end(key)
+                    SHARED_REQUESTS.inc(('hit',))
+                    return entry[0], True
+                del self.__cache[key]
+
+        task = self.__inflight.get(key)
+        if task is not None:
+            SHARED_REQUESTS.inc(('coalesced',))
+            # Отмена одного из ожидающих запросов не отменяет общий запрос к сервису
+            return await asyncio.shield(task), True
+
+        SHARED_REQUESTS.inc(('miss',))
+        task = asyncio.ensure_future(self.__load(key, ttl, load))
+        self.__inflight[key] = task
+        return await asyncio.shield(task), False
+
+    async def __load(self, key: tuple, ttl: float, load: Callable[[], Awaitable[SharedResponse]]) -> SharedResponse:
+        try:
+            response = await load()
+        finally:
+            del self.__inflight[key]
+        ttl = get_response_ttl(response, ttl)
+        if ttl > 0 and len(response.body) <= self.max_body_size:
+            self.__cache[key] = (response, time.monotonic() + ttl)
+            self.__cache.move_to_end(key)
+            while len(self.__cache) > self.max_entries:
+                self.__cache.popitem(last=False)
+        return response
+
+    def invalidate(self, service_name: str) -> None:
+        """
+        Удаляет из микрокэша ответы сервиса. Первый элемент ключа - имя сервиса
+        """
+        for key in [key for key in self.__cache if key[0] == service_name]:
+            del self.__cache[key]
+
+    def clear(self) -> None:
+        self.__cache.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self.__inflight),
+            "cached": len(self.__cache)
+        }
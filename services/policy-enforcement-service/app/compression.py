@@ -0,0 +1,182 @@
+import logging
+import zlib
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CONTENT_TYPES = (
+    'application/json', 'application/problem+json', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/'
+)
+
+# Фрагменты не меньше этого размера сжимаются в пуле потоков, чтобы не блокировать цикл событий
+THREAD_THRESHOLD = 65536
+
+
+class GzipCompressor:
+    encoding = 'gzip'
+
+    def __init__(self, level: int) -> None:
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # Каждый фрагмент сбрасывается сразу, чтобы клиент получал ответ по мере его получения от сервиса
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliCompressor:
+    encoding = 'br'
+
+    def __init__(self, quality: int) -> None:
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self.compressor.process(data) + (self.compressor.finish() if final else self.compressor.flush())
+
+
+def get_supported_encodings() -> tuple[str, ...]:
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding: str | None, supported: tuple[str, ...]) -> str | None:
+    """
+    Выбирает сжатие по заголовку Accept-Encoding: с наибольшим q, а при равных - в порядке supported
+    """
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы gzip или brotli по мере их передачи клиенту. Не сжимаются ответы, уже сжатые сервисом,
+    ответы с типом содержимого не из content_types и ответы меньше minimum_size
+    """
+
+    def __init__(
+            self, app: ASGIApp, minimum_size: int = 1024, content_types: tuple[str, ...] = DEFAULT_CONTENT_TYPES,
+            gzip_level: int = 6, brotli_quality: int = 4
+        ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = tuple(content_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.supported = get_supported_encodings()
+        if 'br' not in self.supported:
+            logger.warning('Пакет brotli не установлен, ответы сжимаются только gzip')
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['method'] == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding'), self.supported)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, CompressionResponder(self, encoding, send).send)
+
+    def make_compressor(self, encoding: str) -> GzipCompressor | BrotliCompressor:
+        if encoding == 'br':
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+    def is_compressible(self, status_code: int, headers: Headers) -> bool:
+        if status_code < 200 or status_code in (204, 304) or 'content-encoding' in headers:
+            return False
+        content_type = headers.get('content-type', '').lower()
+        if not content_type.startswith(self.content_types):
+            return False
+        content_length = headers.get('content-length')
+        return content_length is None or not content_length.isdigit() or int(content_length) >= self.minimum_size
+
+
+class CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Message | None = None
+        self.compressor: GzipCompressor | BrotliCompressor | None = None
+        self.pending = b''
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self.downstream(message)
+            return
+
+        if message['type'] == 'http.response.start':
+            headers = Headers(raw=message['headers'])
+            if not self.middleware.is_compressible(message['status'], headers):
+                self.passthrough = True
+                await self.downstream(message)
+                return
+            # Начало ответа отправляется после первого фрагмента тела, когда известно, нужно ли сжатие
+            self.start_message = message
+            return
+
+        if message['type'] != 'http.response.body':
+            await self.downstream(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        if self.compressor is None:
+            # Пока не набрано minimum_size байт, фрагменты накапливаются: короткий ответ отправляется без сжатия
+            self.pending += body
+            if more_body and len(self.pending) < self.middleware.minimum_size:
+                return
+            body, self.pending = self.pending, b''
+            headers = MutableHeaders(raw=self.start_message['headers'])
+            headers.add_vary_header('Accept-Encoding')
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self.downstream(self.start_message)
+                await self.downstream({'type': 'http.response.body', 'body': body, 'more_body': False})
+                return
+            self.compressor = self.middleware.make_compressor(self.encoding)
+            headers['Content-Encoding'] = self.encoding
+            if 'content-length' in headers:
+                del headers['Content-Length']
+            # Сжатое представление отличается от исходного, поэтому ETag становится слабым
+            etag = headers.get('etag')
+            if etag is not None and not etag.startswith('W/'):
+                headers['ETag'] = 'W/' + etag
+            await self.downstream(self.start_message)
+
+        if len(body) >= THREAD_THRESHOLD:
+            data = await anyio.to_thread.run_sync(self.compressor.compress, body, not more_body)
+        else:
+            data = self.compressor.compress(body, not more_body)
+        if data or not more_body:
+            await self.downstream({'type': 'http.response.body', 'body': data, 'more_body': more_body})
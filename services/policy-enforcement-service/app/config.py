@@ -11,18 +11,252 @@ class Config(BaseSettings):
         alias='POSTGRES_DSN'
     )
 
+    db_pool_size: int = Field(
+        default=5,
+        env='DB_POOL_SIZE',
+        alias='DB_POOL_SIZE'
+    )
+
+    db_max_overflow: int = Field(
+        default=10,
+        env='DB_MAX_OVERFLOW',
+        alias='DB_MAX_OVERFLOW'
+    )
+
+    db_pool_timeout: float = Field(
+        default=30,
+        env='DB_POOL_TIMEOUT',
+        alias='DB_POOL_TIMEOUT'
+    )
+
+    db_pool_recycle: int = Field(
+        default=1800,
+        env='DB_POOL_RECYCLE',
+        alias='DB_POOL_RECYCLE'
+    )
+
+    db_pool_pre_ping: bool = Field(
+        default=True,
+        env='DB_POOL_PRE_PING',
+        alias='DB_POOL_PRE_PING'
+    )
+
+    db_statement_timeout: int = Field(
+        default=0,
+        env='DB_STATEMENT_TIMEOUT',
+        alias='DB_STATEMENT_TIMEOUT'
+    )
+
+    db_session_warn_seconds: float = Field(
+        default=5,
+        env='DB_SESSION_WARN_SECONDS',
+        alias='DB_SESSION_WARN_SECONDS'
+    )
+
+    tracing_exporter: str = Field(
+        default='none',
+        env='TRACING_EXPORTER',
+        alias='TRACING_EXPORTER'
+    )
+
+    tracing_file_path: str = Field(
+        default='traces.jsonl',
+        env='TRACING_FILE_PATH',
+        alias='TRACING_FILE_PATH'
+    )
+
+    tracing_sample_ratio: float = Field(
+        default=1.0,
+        env='TRACING_SAMPLE_RATIO',
+        alias='TRACING_SAMPLE_RATIO'
+    )
+
+    metrics_host: str = Field(
+        default='0.0.0.0',
+        env='METRICS_HOST',
+        alias='METRICS_HOST'
+    )
+
+    metrics_port: int = Field(
+        default=9000,
+        env='METRICS_PORT',
+        alias='METRICS_PORT'
+    )
+
     jwt_secret: SecretStr = Field(
         default='jwt_secret',
         env='JWT_SECRET',
         alias='JWT_SECRET'
     )
 
+    jwt_cache_size: int = Field(
+        default=10000,
+        env='JWT_CACHE_SIZE',
+        alias='JWT_CACHE_SIZE'
+    )
+
+    jwt_cache_ttl: float = Field(
+        default=300,
+        env='JWT_CACHE_TTL',
+        alias='JWT_CACHE_TTL'
+    )
+
     policies_config_path: FilePath = Field(
         default='policies.yaml',
         env='POLICIES_CONFIG_PATH',
         alias='POLICIES_CONFIG_PATH'
     )
 
+    policy_engine: str = Field(
+        default='compiled',
+        env='POLICY_ENGINE',
+        alias='POLICY_ENGINE'
+    )
+
+    policies_reload_interval: float = Field(
+        default=5,
+        env='POLICIES_RELOAD_INTERVAL',
+        alias='POLICIES_RELOAD_INTERVAL'
+    )
+
+    authorize_batch_max_size: int = Field(
+        default=1000,
+        env='AUTHORIZE_BATCH_MAX_SIZE',
+        alias='AUTHORIZE_BATCH_MAX_SIZE'
+    )
+
+    policy_decision_cache_size: int = Field(
+        default=10000,
+        env='POLICY_DECISION_CACHE_SIZE',
+        alias='POLICY_DECISION_CACHE_SIZE'
+    )
+
+    upstream_balancing: str = Field(
+        default='least-outstanding',
+        env='UPSTREAM_BALANCING',
+        alias='UPSTREAM_BALANCING'
+    )
+
+    upstream_health_check_interval: float = Field(
+        default=5,
+        env='UPSTREAM_HEALTH_CHECK_INTERVAL',
+        alias='UPSTREAM_HEALTH_CHECK_INTERVAL'
+    )
+
+    upstream_health_check_timeout: float = Field(
+        default=2,
+        env='UPSTREAM_HEALTH_CHECK_TIMEOUT',
+        alias='UPSTREAM_HEALTH_CHECK_TIMEOUT'
+    )
+
+    upstream_failure_threshold: int = Field(
+        default=3,
+        env='UPSTREAM_FAILURE_THRESHOLD',
+        alias='UPSTREAM_FAILURE_THRESHOLD'
+    )
+
+    upstream_eject_seconds: float = Field(
+        default=30,
+        env='UPSTREAM_EJECT_SECONDS',
+        alias='UPSTREAM_EJECT_SECONDS'
+    )
+
+    upstream_timeout: float = Field(
+        default=5,
+        env='UPSTREAM_TIMEOUT',
+        alias='UPSTREAM_TIMEOUT'
+    )
+
+    upstream_max_concurrent_requests: int = Field(
+        default=100,
+        env='UPSTREAM_MAX_CONCURRENT_REQUESTS',
+        alias='UPSTREAM_MAX_CONCURRENT_REQUESTS'
+    )
+
+    upstream_max_queue: int = Field(
+        default=100,
+        env='UPSTREAM_MAX_QUEUE',
+        alias='UPSTREAM_MAX_QUEUE'
+    )
+
+    upstream_queue_timeout: float = Field(
+        default=1,
+        env='UPSTREAM_QUEUE_TIMEOUT',
+        alias='UPSTREAM_QUEUE_TIMEOUT'
+    )
+
+    circuit_failure_threshold: int = Field(
+        default=5,
+        env='CIRCUIT_FAILURE_THRESHOLD',
+        alias='CIRCUIT_FAILURE_THRESHOLD'
+    )
+
+    circuit_recovery_seconds: float = Field(
+        default=10,
+        env='CIRCUIT_RECOVERY_SECONDS',
+        alias='CIRCUIT_RECOVERY_SECONDS'
+    )
+
+    circuit_half_open_requests: int = Field(
+        default=1,
+        env='CIRCUIT_HALF_OPEN_REQUESTS',
+        alias='CIRCUIT_HALF_OPEN_REQUESTS'
+    )
+
+    rate_limit_backend: str = Field(
+        default='memory',
+        env='RATE_LIMIT_BACKEND',
+        alias='RATE_LIMIT_BACKEND'
+    )
+
+    rate_limit_redis_url: str = Field(
+        default='redis://localhost:6379/0',
+        env='RATE_LIMIT_REDIS_URL',
+        alias='RATE_LIMIT_REDIS_URL'
+    )
+
+    rate_limit_max_keys: int = Field(
+        default=100000,
+        env='RATE_LIMIT_MAX_KEYS',
+        alias='RATE_LIMIT_MAX_KEYS'
+    )
+
+    response_cache_max_entries: int = Field(
+        default=1000,
+        env='RESPONSE_CACHE_MAX_ENTRIES',
+        alias='RESPONSE_CACHE_MAX_ENTRIES'
+    )
+
+    response_cache_max_body_size: int = Field(
+        default=1048576,
+        env='RESPONSE_CACHE_MAX_BODY_SIZE',
+        alias='RESPONSE_CACHE_MAX_BODY_SIZE'
+    )
+
+    compression_min_size: int = Field(
+        default=1024,
+        env='COMPRESSION_MIN_SIZE',
+        alias='COMPRESSION_MIN_SIZE'
+    )
+
+    compression_content_types: str = Field(
+        default='application/json,application/problem+json,application/javascript,application/xml,image/svg+xml,text/',
+        env='COMPRESSION_CONTENT_TYPES',
+        alias='COMPRESSION_CONTENT_TYPES'
+    )
+
+    compression_gzip_level: int = Field(
+        default=6,
+        env='COMPRESSION_GZIP_LEVEL',
+        alias='COMPRESSION_GZIP_LEVEL'
+    )
+
+    compression_brotli_quality: int = Field(
+        default=4,
+        env='COMPRESSION_BROTLI_QUALITY',
+        alias='COMPRESSION_BROTLI_QUALITY'
+    )
+
     model_config = SettingsConfigDict(env_file=".env", extra='allow')
 
     @classmethod
@@ -31,3 +31,12 @@ def get_card(db: Session, card_id: int):
     return (db.query(models.Cards)
             .filter(models.Cards.id == card_id)
             .first())
+
+
+def get_cards(db: Session, card_ids: list[int]):
+    """
+    Возвращает информацию о нескольких медкартах одним запросом
+    """
+    return (db.query(models.Cards)
+            .filter(models.Cards.id.in_(card_ids))
+            .all())
@@ -9,3 +9,12 @@ def get_meeting(db: Session, meeting_id: int):
     return (db.query(models.Meetings)
             .filter(models.Meetings.meeting_id == meeting_id)
             .first())
+
+
+def get_meetings(db: Session, meeting_ids: list[int]):
+    """
+    Возвращает информацию о нескольких встречах одним запросом
+    """
+    return (db.query(models.Meetings)
+            .filter(models.Meetings.meeting_id.in_(meeting_ids))
+            .all())
@@ -1,3 +1,4 @@
 from .database import DatabaseInitializer, DB_INITIALIZER
+from common.pool import make_engine_options, pool_monitor
 
-__all__ = [DatabaseInitializer, DB_INITIALIZER]
\ No newline at end of file
+__all__ = [DatabaseInitializer, DB_INITIALIZER, make_engine_options, pool_monitor]
\ No newline at end of file
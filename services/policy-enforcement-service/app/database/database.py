@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from sqlalchemy.ext.automap import automap_base
+from common.pool import pool_monitor
 from .basemodel import Base
 from .models import init_existing_models
 
@@ -9,8 +10,9 @@ class DatabaseInitializer:
     def __init__(self, base: DeclarativeBase) -> None:
         self.base: DeclarativeBase = base
 
-    def init_database(self, postgres_dsn):
-        engine = create_engine(postgres_dsn)
+    def init_database(self, postgres_dsn, **engine_options):
+        engine = create_engine(postgres_dsn, **engine_options)
+        pool_monitor.attach(engine)
         session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
         self.base.metadata.create_all(bind=engine)
 
@@ -0,0 +1,29 @@
+import asyncio
+
+import uvicorn
+from fastapi import FastAPI
+
+
+class MetricsServer(uvicorn.Server):
+    """
+    Отдельный HTTP-сервер для метрик шлюза. Работает в том же цикле событий, что и основной сервер,
+    и слушает внутренний порт, который не публикуется наружу вместе с портом шлюза
+    """
+
+    def __init__(self, app: FastAPI, host: str, port: int) -> None:
+        super().__init__(uvicorn.Config(app, host=host, port=port, lifespan='off', log_config=None))
+        self.__task: asyncio.Task | None = None
+
+    def install_signal_handlers(self) -> None:
+        # Сигналы остановки обрабатывает основной сервер, внутренний останавливается вместе с приложением
+        pass
+
+    def start(self) -> None:
+        if self.config.port > 0 and self.__task is None:
+            self.__task = asyncio.create_task(self.serve())
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.should_exit = True
+            await self.__task
+            self.__task = None
@@ -0,0 +1,71 @@
+import threading
+
+from .policiesconfig import Policy
+from .policyengine import CasbinPolicyEngine, CompiledPolicyEngine, get_policy_index
+
+
+# Параметры запроса, от которых может зависеть запоминаемое решение
+CACHEABLE_ATTRIBUTES = frozenset({'sub.group_id'})
+
+
+class DecisionCache:
+    """
+    Запоминает решения для запросов, все подходящие политики которых зависят только
+    от группы пользователя. Ключ решения - группа, набор подходящих политик и метод,
+    поэтому для таких запросов не нужны тело запроса и дополнение данных токена
+    """
+
+    def __init__(
+            self, engine: CompiledPolicyEngine | CasbinPolicyEngine, policies: list[Policy], max_size: int
+        ) -> None:
+        self.engine = engine
+        # Отбор подходящих политик и их классификация выполняются по скомпилированным правилам
+        self.index = get_policy_index(engine, policies)
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+        self.__decisions: dict[tuple, bool] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def get(self, group_id: int, resource: str, method: str) -> bool | None:
+        """
+        Возвращает решение или None, если решение зависит от других параметров запроса
+        """
+        matching = self.index.matching(resource, method)
+        if any(not p.attributes <= CACHEABLE_ATTRIBUTES for p in matching):
+            with self.__lock:
+                self.bypasses += 1
+            return None
+
+        key = (group_id, tuple(p.order for p in matching), method)
+        with self.__lock:
+            decision = self.__decisions.get(key)
+            if decision is not None:
+                self.hits += 1
+                return decision
+            self.misses += 1
+
+        decision = self.engine.enforce(
+            {'group_id': group_id}, {'resource': resource, 'params': {}, 'body': {}}, method
+        )
+        with self.__lock:
+            if len(self.__decisions) >= self.max_size:
+                self.__decisions.clear()
+            self.__decisions[key] = decision
+        return decision
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__decisions.clear()
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.bypasses
+        return {
+            "size": len(self.__decisions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
@@ -1,13 +1,31 @@
 import urllib.parse
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, PositiveFloat, PositiveInt, model_validator
 
 
 class Service(BaseModel):
     name: str
-    entrypoint: HttpUrl
+    entrypoint: HttpUrl | None = None
+    # Реплики сервиса, если их несколько; entrypoint по умолчанию - первая реплика
+    endpoints: list[HttpUrl] = []
+    health_check: str = 'openapi.json'
+    # Ограничения запросов к сервису; если не указаны, используются настройки шлюза
+    max_concurrent_requests: int | None = None
+    timeout: float | None = None
     inject_token_in_swagger: bool = False
 
+    @model_validator(mode='after')
+    def check_endpoints(self) -> 'Service':
+        if self.entrypoint is None:
+            if not self.endpoints:
+                raise ValueError(f'Для сервиса {self.name} не указан entrypoint или endpoints')
+            self.entrypoint = self.endpoints[0]
+        return self
+
+    @property
+    def endpoint_list(self) -> list[str]:
+        return [e.unicode_string() for e in self.endpoints or [self.entrypoint]]
+
     @property
     def openapi_scheme(self) -> str:
         return urllib.parse.urljoin(
@@ -15,6 +33,23 @@ class Service(BaseModel):
         )
 
 
+class RateLimit(BaseModel):
+    # Не больше requests запросов за per секунд, с кратковременным превышением до burst запросов
+    requests: PositiveInt
+    per: PositiveFloat = 1
+    burst: PositiveInt | None = None
+    # Политики с одинаковой группой расходуют общий лимит; по умолчанию группа - шаблон ресурса
+    group: str | None = None
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.per
+
+    @property
+    def capacity(self) -> int:
+        return self.burst if self.burst is not None else self.requests
+
+
 class Policy(BaseModel):
     service: str
     rule: str = None
@@ -22,6 +57,12 @@ class Policy(BaseModel):
     resource_pattern: str | None = None
     methods: str
     white_list: bool = False
+    timeout: float | None = None
+    rate_limit: RateLimit | None = None
+    # Ответ не зависит от пользователя: одинаковые одновременные GET-запросы объединяются,
+    # а ответ может храниться cache_ttl секунд
+    shareable: bool = False
+    cache_ttl: float = 0
 
     @property
     def method_list(self) -> list[str]:
@@ -0,0 +1,295 @@
+import ast
+import logging
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import Callable
+
+import casbin
+
+from .policiesconfig import PoliciesConfig, Policy
+
+
+logger = logging.getLogger(__name__)
+
+# Модель casbin, которую повторяет скомпилированный движок
+COMPILED_MATCHER = 'regexMatch(r.obj.resource, p.obj) && regexMatch(r.act, p.act) && eval(p.sub_rule)'
+COMPILED_EFFECT = 'some(where (p.eft == allow))'
+
+REQUEST_NAMES = ('sub', 'obj', 'act')
+
+# Узлы выражения, допустимые в правилах политик
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.Compare,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.Attribute, ast.Name, ast.Load, ast.Constant
+)
+
+REGEX_METACHARACTERS = set('.^$*+?{}[]\\|()')
+
+
+class RuleCompileError(ValueError):
+    pass
+
+
+class PolicyAttributeError(AttributeError):
+    pass
+
+
+def get_attribute(value, name: str):
+    """
+    Возвращает атрибут или элемент словаря так же, как вычислитель выражений casbin
+    """
+    if type(value) is dict and name in value:
+        return value[name]
+    try:
+        return getattr(value, name)
+    except (AttributeError, TypeError):
+        pass
+    try:
+        return value[name]
+    except (KeyError, TypeError):
+        raise PolicyAttributeError(name)
+
+
+class RuleTransformer(ast.NodeTransformer):
+    """
+    Заменяет r.sub, r.obj и r.act аргументами предиката, а обращения к атрибутам - вызовами get_attribute
+    """
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        if isinstance(node.value, ast.Name) and node.value.id == 'r':
+            if node.attr not in REQUEST_NAMES:
+                raise RuleCompileError(f'Неизвестный параметр запроса: r.{node.attr}')
+            return ast.Name(id=node.attr, ctx=ast.Load())
+        return ast.Call(
+            func=ast.Name(id='get_attribute', ctx=ast.Load()),
+            args=[self.visit(node.value), ast.Constant(value=node.attr)],
+            keywords=[]
+        )
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        raise RuleCompileError(f'Неизвестное имя в правиле: {node.id}')
+
+
+def parse_rule(rule: str) -> ast.Expression:
+    """
+    Разбирает правило политики. Операторы &&, || и ! заменяются так же, как в casbin
+    """
+    expression = rule.replace('&&', 'and').replace('||', 'or').replace('!', 'not')
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise RuleCompileError(f'Некорректное правило "{rule}": {e.msg}')
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise RuleCompileError(f'Недопустимое выражение в правиле "{rule}": {type(node).__name__}')
+    return tree
+
+
+def compile_rule(rule: str) -> Callable[[dict, dict, str], object]:
+    """
+    Компилирует правило политики в функцию Python от параметров запроса (sub, obj, act)
+    """
+    body = RuleTransformer().visit(parse_rule(rule).body)
+    predicate = ast.Expression(body=ast.Lambda(
+        args=ast.arguments(
+            posonlyargs=[], args=[ast.arg(arg=name) for name in REQUEST_NAMES],
+            kwonlyargs=[], kw_defaults=[], defaults=[]
+        ),
+        body=body
+    ))
+    ast.fix_missing_locations(predicate)
+    code = compile(predicate, f'<policy rule: {rule}>', 'eval')
+    return eval(code, {'__builtins__': {}, 'get_attribute': get_attribute})
+
+
+def get_rule_attributes(rule: str) -> frozenset[str]:
+    """
+    Возвращает параметры запроса, которые читает правило, например sub.group_id или obj.params.user_id
+    """
+    attributes = set()
+
+    def visit(node: ast.AST) -> None:
+        if isinstance(node, ast.Attribute):
+            path = []
+            while isinstance(node, ast.Attribute):
+                path.append(node.attr)
+                node = node.value
+            # Имя r проверяется при компиляции правила
+            attributes.add('.'.join(reversed(path)))
+            return
+        for child in ast.iter_child_nodes(node):
+            visit(child)
+
+    visit(parse_rule(rule))
+    return frozenset(attributes)
+
+
+def reads_request_body(attributes: frozenset[str]) -> bool:
+    return any(a == 'obj' or a == 'obj.body' or a.startswith('obj.body.') for a in attributes)
+
+
+def get_route_segment(pattern: str) -> str | None:
+    """
+    Возвращает первый сегмент пути, которому соответствует шаблон ресурса,
+    или None, если сегмент нельзя определить по шаблону
+    """
+    pattern = pattern.removeprefix('^')
+    prefix_end = 0
+    while prefix_end < len(pattern) and pattern[prefix_end] not in REGEX_METACHARACTERS:
+        prefix_end += 1
+    prefix, rest = pattern[:prefix_end], pattern[prefix_end:]
+    if not prefix.startswith('/'):
+        return None
+    segment, separator, _ = prefix[1:].partition('/')
+    if separator or rest == '' or rest.startswith(('$', '(/', '(?:/')):
+        return segment
+    return None
+
+
+def get_request_segment(resource: str) -> str:
+    return resource.split('/', 2)[1] if resource.startswith('/') else ''
+
+
+@dataclass
+class CompiledPolicy:
+    order: int
+    policy: Policy
+    resource: re.Pattern
+    methods: re.Pattern
+    predicate: Callable[[dict, dict, str], object]
+    attributes: frozenset[str]
+    segment: str | None
+
+
+class CompiledPolicyEngine:
+    """
+    Проверяет запрос по политикам, правила которых скомпилированы при загрузке.
+    Кандидаты заранее отбираются по методу и первому сегменту пути, порядок политик
+    и результат совпадают с моделью casbin COMPILED_MATCHER
+    """
+
+    def __init__(self, policies: list[Policy]) -> None:
+        self.policies = [
+            CompiledPolicy(
+                order=order,
+                policy=policy,
+                resource=re.compile(policy.resource),
+                methods=re.compile(policy.methods),
+                predicate=compile_rule(policy.rule),
+                attributes=get_rule_attributes(policy.rule),
+                segment=get_route_segment(policy.resource)
+            )
+            for order, policy in enumerate(policies)
+        ]
+        self.__by_method: dict[str, dict[str | None, list[CompiledPolicy]]] = {}
+
+    def __index_method(self, method: str) -> dict[str | None, list[CompiledPolicy]]:
+        policies = [p for p in self.policies if p.methods.match(method)]
+        # Политики без определенного сегмента проверяются для любого пути
+        index = {None: [p for p in policies if p.segment is None]}
+        for segment in {p.segment for p in policies if p.segment is not None}:
+            index[segment] = [p for p in policies if p.segment in (segment, None)]
+        self.__by_method[method] = index
+        return index
+
+    def candidates(self, resource: str, method: str) -> list[CompiledPolicy]:
+        index = self.__by_method.get(method)
+        if index is None:
+            index = self.__index_method(method)
+        return index.get(get_request_segment(resource)) or index[None]
+
+    def matching(self, resource: str, method: str) -> list[CompiledPolicy]:
+        return [p for p in self.candidates(resource, method) if p.resource.match(resource)]
+
+    def needs_body(self, resource: str, method: str) -> bool:
+        """
+        Проверяет, читает ли правило какой-либо из подходящих политик тело запроса (r.obj.body)
+        """
+        return any(reads_request_body(p.attributes) for p in self.matching(resource, method))
+
+    def enforce(self, sub: dict, obj: dict, act: str) -> bool:
+        resource = obj['resource']
+        for p in self.candidates(resource, act):
+            if not p.resource.match(resource):
+                continue
+            result = p.predicate(sub, obj, act)
+            if result is True:
+                return True
+            if result is False:
+                continue
+            # Так же, как casbin, ненулевое вещественное значение разрешает доступ
+            if isinstance(result, float):
+                if result != 0:
+                    return True
+                continue
+            raise RuntimeError('matcher result should be bool, int or float')
+        return False
+
+
+class CasbinPolicyEngine:
+    """
+    Проверка по модели casbin из файла политик. Используется как эталон
+    для скомпилированного движка
+    """
+
+    def __init__(self, config: PoliciesConfig, policies: list[Policy]) -> None:
+        model_conf = self.__make_temp_file(config.model)
+        policy_conf = self.__make_temp_file(
+            ''.join(f'p, {p.rule}, {p.resource}, {p.methods}\n' for p in policies)
+        )
+        try:
+            self.enforcer: casbin.Enforcer = casbin.Enforcer(model_conf, policy_conf)
+        finally:
+            # casbin читает файлы только при создании, поэтому при перезагрузке политик они не накапливаются
+            os.remove(model_conf)
+            os.remove(policy_conf)
+
+    @staticmethod
+    def __make_temp_file(content: str) -> str:
+        tmp = tempfile.NamedTemporaryFile(delete=False)
+        with open(tmp.name, 'w') as f:
+            f.write(content)
+        tmp.close()
+
+        return tmp.name
+
+    def enforce(self, sub: dict, obj: dict, act: str) -> bool:
+        return self.enforcer.enforce(sub, obj, act)
+
+
+def get_policy_index(
+        engine: CompiledPolicyEngine | CasbinPolicyEngine, policies: list[Policy]
+    ) -> CompiledPolicyEngine:
+    """
+    Возвращает скомпилированные политики для отбора подходящих политик запроса при любом движке
+    """
+    return engine if isinstance(engine, CompiledPolicyEngine) else CompiledPolicyEngine(policies)
+
+
+def is_compiled_model(config: PoliciesConfig) -> bool:
+    values = {}
+    for line in config.model.splitlines():
+        key, separator, value = line.partition('=')
+        if separator:
+            values.setdefault(key.strip(), ' '.join(value.split()))
+    return values.get('m') == COMPILED_MATCHER and values.get('e') == COMPILED_EFFECT
+
+
+def create_policy_engine(
+        config: PoliciesConfig, policies: list[Policy], engine: str = 'compiled'
+    ) -> CompiledPolicyEngine | CasbinPolicyEngine:
+    """
+    Создает движок проверки политик: compiled или casbin. Если модель в файле политик
+    отличается от поддерживаемой, используется casbin
+    """
+    if engine == 'casbin':
+        return CasbinPolicyEngine(config, policies)
+    if engine != 'compiled':
+        raise ValueError(f'Неизвестный движок проверки политик: {engine}')
+    if not is_compiled_model(config):
+        logger.warning('Модель политик не поддерживается скомпилированным движком, используется casbin')
+        return CasbinPolicyEngine(config, policies)
+    return CompiledPolicyEngine(policies)
@@ -0,0 +1,74 @@
+import re
+
+import yaml
+
+from .decisioncache import DecisionCache
+from .policiesconfig import PoliciesConfig, Policy, Service
+from .policyengine import CasbinPolicyEngine, CompiledPolicyEngine, create_policy_engine, get_policy_index
+
+
+# Методы, для которых индекс политик строится при загрузке, а не при первом запросе
+INDEXED_METHODS = ("GET", "DELETE", "PATCH", "POST", "PUT", "HEAD", "OPTIONS")
+
+
+class PolicySetError(ValueError):
+    pass
+
+
+def load_policies_config(config_path: str) -> PoliciesConfig:
+    with open(config_path) as file:
+        data = yaml.safe_load(file)
+        return PoliciesConfig(**data)
+
+
+def validate_policies_config(config: PoliciesConfig) -> None:
+    """
+    Проверяет ссылки политик на сервисы и регулярные выражения ресурсов
+    """
+    names = [s.name for s in config.services]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise PolicySetError(f'Сервисы описаны несколько раз: {", ".join(sorted(duplicates))}')
+    for p in config.policies:
+        if p.service not in names:
+            raise PolicySetError(f'Политика {p.resource} ссылается на неизвестный сервис {p.service}')
+        for pattern in (p.resource, p.resource_pattern):
+            if pattern is None:
+                continue
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise PolicySetError(f'Неверное выражение {pattern} в политике {p.resource}: {e}') from e
+
+
+class PolicySet:
+    """
+    Политики из файла и построенные по ним структуры проверки. Набор не изменяется после создания:
+    при перезагрузке файла политик строится новый набор, который заменяет прежний целиком
+    """
+
+    def __init__(self, config: PoliciesConfig, engine: str = 'compiled', decision_cache_size: int = 10000) -> None:
+        validate_policies_config(config)
+        self.config = config
+        self.whitelist_policies: list[Policy] = [p for p in config.policies if p.white_list]
+        self.enforcing_policies: list[Policy] = [p for p in config.policies if not p.white_list]
+        self.engine: CompiledPolicyEngine | CasbinPolicyEngine = create_policy_engine(
+            config, self.enforcing_policies, engine
+        )
+        self.index: CompiledPolicyEngine = get_policy_index(self.engine, self.enforcing_policies)
+        for method in INDEXED_METHODS:
+            self.index.candidates('/', method)
+        self.decision_cache: DecisionCache | None = None
+        if decision_cache_size > 0:
+            self.decision_cache = DecisionCache(self.engine, self.enforcing_policies, decision_cache_size)
+        # Политики с собственным ограничением времени ответа сервиса
+        self.route_timeouts: list[Policy] = [p for p in config.policies if p.timeout is not None]
+        # Политики общих ресурсов, ответы которых не зависят от пользователя
+        self.shareable_policies: list[Policy] = [p for p in config.policies if p.shareable]
+        # Политики с ограничением частоты запросов
+        self.rate_limited_policies: list[Policy] = [p for p in config.policies if p.rate_limit is not None]
+        self.services: dict[str, Service] = {s.name: s for s in config.services}
+
+    @classmethod
+    def load(cls, config_path: str, engine: str = 'compiled', decision_cache_size: int = 10000) -> 'PolicySet':
+        return cls(load_policies_config(config_path), engine, decision_cache_size)
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .policiesconfig import RateLimit
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+class RateLimitExceeded(Exception):
+    def __init__(self, group: str, retry_after: float) -> None:
+        super().__init__(f'{group}: retry after {retry_after:.3f} s')
+        self.group = group
+        self.retry_after = retry_after
+
+
+class MemoryRateLimiter:
+    """
+    Ограничение частоты запросов алгоритмом token bucket в памяти шлюза.
+    Хранит не больше max_keys корзин, давно не использованные корзины удаляются
+    """
+
+    def __init__(self, max_keys: int = 100000) -> None:
+        self.max_keys = max_keys
+        self.__lock = threading.Lock()
+        # Ключ -> (число жетонов, время обновления)
+        self.__buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, limit: RateLimit) -> float:
+        """
+        Забирает жетон и возвращает 0 или время в секундах, через которое появится следующий жетон
+        """
+        now = time.monotonic()
+        with self.__lock:
+            tokens, updated = self.__buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / limit.rate
+            self.__buckets[key] = (tokens, now)
+            self.__buckets.move_to_end(key)
+            if len(self.__buckets) > self.max_keys:
+                self.__buckets.popitem(last=False)
+        return retry_after
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        return self.take(key, limit)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__buckets.clear()
+
+
+# Корзина в Redis обновляется одним скриптом, время берется с сервера Redis,
+# чтобы реплики шлюза с разными часами расходовали одну корзину одинаково
+REDIS_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimiter:
+    """
+    Ограничение частоты запросов с корзинами в Redis, общими для всех реплик шлюза.
+    При недоступности Redis запросы не ограничиваются
+    """
+
+    def __init__(self, url: str, prefix: str = 'gateway:rate-limit:') -> None:
+        if redis is None:
+            raise RuntimeError('Для RATE_LIMIT_BACKEND=redis требуется пакет redis')
+        self.prefix = prefix
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(REDIS_TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        try:
+            result = await self.script(keys=[self.prefix + key], args=[limit.rate, limit.capacity])
+        except redis.RedisError as e:
+            logger.warning('Ограничение частоты запросов недоступно: %s', e)
+            return 0.0
+        return float(result)
+
+
+def create_rate_limiter(cfg) -> MemoryRateLimiter | RedisRateLimiter:
+    if cfg.rate_limit_backend == 'memory':
+        return MemoryRateLimiter(cfg.rate_limit_max_keys)
+    if cfg.rate_limit_backend == 'redis':
+        return RedisRateLimiter(cfg.rate_limit_redis_url)
+    raise ValueError(f'Неизвестное хранилище ограничения частоты запросов: {cfg.rate_limit_backend}')
@@ -1,17 +1,19 @@
-import os
 import uuid
 import copy
 import re
-import tempfile
+import time
 
-import casbin
-import jwt
-import yaml
 from fastapi import Request, WebSocket
 from pydantic.dataclasses import dataclass
 from sqlalchemy.orm import Session
+from common.tracing import tracer
 
 from .policiesconfig import PoliciesConfig, Policy, Service
+from .policyengine import CasbinPolicyEngine, CompiledPolicyEngine
+from .policyset import PolicySet
+from .decisioncache import DecisionCache
+from .tokencache import TokenCache, decode_token
+from .ratelimit import MemoryRateLimiter, RateLimitExceeded, RedisRateLimiter
 from ..crud import crud_card, crud_chat, crud_meeting, crud_message, crud_record
 
 
@@ -19,64 +21,129 @@ from ..crud import crud_card, crud_chat, crud_meeting, crud_message, crud_record
 class EnforceResult:
     access_allowed: bool = False
     redirect_service: str = None
+    service_name: str = None
+    timeout: float | None = None
+    shareable: bool = False
+    cache_ttl: float = 0
 
 
 class RequestEnforcer:
-    def __init__(self, config_path: str, jwt_secret: str) -> None:
+    def __init__(
+            self, config_path: str, jwt_secret: str, engine: str = 'compiled', decision_cache_size: int = 10000,
+            token_cache_size: int = 10000, token_cache_ttl: float = 300,
+            rate_limiter: MemoryRateLimiter | RedisRateLimiter | None = None
+        ) -> None:
         self.jwt_secret: str = jwt_secret
-        self.config: PoliciesConfig = self.__load_config(config_path=config_path)
-        self.enforcer: casbin.Enforcer = self.__create_enforcer()
+        self.config_path: str = config_path
+        self.engine_name: str = engine
+        self.decision_cache_size: int = decision_cache_size
+        # Текущий набор политик. Запрос проверяется по набору, действовавшему при его получении,
+        # а перезагрузка заменяет набор одним присваиванием
+        self.policies: PolicySet = self.load_policies()
+        self.version: int = 1
+        self.loaded_at: float = time.time()
+        self.token_cache: TokenCache | None = None
+        if token_cache_size > 0:
+            self.token_cache = TokenCache(jwt_secret, token_cache_size, token_cache_ttl)
+        self.rate_limiter: MemoryRateLimiter | RedisRateLimiter = rate_limiter or MemoryRateLimiter()
+
+    def load_policies(self) -> PolicySet:
+        """
+        Читает и проверяет файл политик. Не изменяет текущий набор, поэтому может выполняться в отдельном потоке
+        """
+        return PolicySet.load(self.config_path, self.engine_name, self.decision_cache_size)
+
+    def swap_policies(self, policies: PolicySet) -> None:
+        self.policies = policies
+        self.version += 1
+        self.loaded_at = time.time()
 
     async def enforce_websocket(self, websocket: WebSocket, db: Session):
-        access_allowed, service_name, chat_id, client_id = await self.__check_by_policy_websocket(websocket, db)
+        policies = self.policies
+        access_allowed, service_name, chat_id, client_id = await self.__check_by_policy_websocket(
+            policies, websocket, db
+        )
         if access_allowed:
-            service = self.__get_service_by_name(service_name)
-            return EnforceResult(True, service.entrypoint.unicode_string()), chat_id, client_id
+            service = policies.services.get(service_name)
+            return EnforceResult(True, service.entrypoint.unicode_string(), service.name), chat_id, client_id
         return EnforceResult(), chat_id, client_id
         
     async def enforce(self, request: Request, db: Session | None = None):
-        in_whitelist, service_name = self.__is_request_in_whitelist(request)
-        if in_whitelist:
-            service = self.__get_service_by_name(service_name)
-            return EnforceResult(True, service.entrypoint.unicode_string())
+        policies = self.policies
+        await self.__check_rate_limit(policies, request)
 
-        access_allowed, service_name = await self.__check_by_policy(request, db)
-        if access_allowed:
-            service = self.__get_service_by_name(service_name)
-            return EnforceResult(True, service.entrypoint.unicode_string())
-        return EnforceResult()
-
-    def __load_config(self, config_path: str) -> PoliciesConfig:
-        with open(config_path) as file:
-            data = yaml.safe_load(file)
-            return PoliciesConfig(**data)
-
-    def __create_enforcer(self) -> casbin.Enforcer:
-        model_conf = self.__make_model_temp_file()
-        policy_conf = self.__make_policy_temp_file()
-        return casbin.Enforcer(model_conf, policy_conf)
-
-    def __make_model_temp_file(self) -> str:
-        tmp = tempfile.NamedTemporaryFile(delete=False)
-        with open(tmp.name, 'w') as f:
-            f.write(self.config.model)
-        tmp.close()
-
-        return tmp.name
-
-    def __make_policy_temp_file(self) -> str:
-        tmp = tempfile.NamedTemporaryFile(delete=False)
-        with open(tmp.name, 'w') as f:
-            f.writelines(
-                list(f'p, {p.rule}, {p.resource}, {p.methods}\n' for p in self.config.policies if not p.white_list)
-            )
-        tmp.close()
-
-        return tmp.name
-
-    def __is_request_in_whitelist(self, request: Request) -> tuple[bool, str] | tuple[bool, None]:
+        in_whitelist, service_name = self.__is_request_in_whitelist(policies, request)
+        if not in_whitelist:
+            access_allowed, service_name = await self.__check_by_policy(policies, request, db)
+            if not access_allowed:
+                return EnforceResult()
+
+        service = policies.services.get(service_name)
+        resource = '/' + request.path_params['path_name']
+        route_timeout = self.__find_route_policy(policies.route_timeouts, resource, request.method)
+        shareable = self.__find_route_policy(policies.shareable_policies, resource, request.method)
+        return EnforceResult(
+            True, service.entrypoint.unicode_string(), service.name,
+            route_timeout.timeout if route_timeout is not None else service.timeout,
+            shareable is not None,
+            shareable.cache_ttl if shareable is not None else 0
+        )
+
+    async def enforce_batch(
+            self, request: Request, resources: list[str], method: str = 'GET', db: Session | None = None
+        ) -> list[str]:
+        """
+        Возвращает ресурсы, доступные пользователю запроса методом method, в исходном порядке.
+        Токен проверяется, а данные пользователя загружаются один раз для всех ресурсов.
+        Тело запроса для ресурсов списка неизвестно, поэтому правила, проверяющие его, не выполняются
+        """
+        policies = self.policies
+        decisions: dict[str, bool] = {}
+        pending = []
+        for resource in dict.fromkeys(resources):
+            if self.__find_route_policy(policies.whitelist_policies, resource, method) is not None:
+                decisions[resource] = True
+            elif self.__find_route_policy(policies.enforcing_policies, resource, method) is not None:
+                pending.append(resource)
+
+        token_data = None
+        if pending:
+            with tracer.child_span('policy.extract_token'):
+                token_data = self.__extract_token_data(request)
+        if token_data is None:
+            pending = []
+
+        resources_data = []
+        for resource in pending:
+            decision = self.__get_cached_decision(policies, token_data, resource, method)
+            if decision is not None:
+                decisions[resource] = decision
+                continue
+            resource_data = {
+                'resource': resource,
+                'params': self.__get_resource_data_by_pattern(policies, resource, method),
+                'body': {}
+            }
+            resources_data.append(resource_data)
+
+        if resources_data:
+            with tracer.child_span('policy.enrich_token'):
+                subjects = self.__enrich_token_data_batch(token_data, resources_data, db)
+            with tracer.child_span('policy.evaluate'):
+                for subject, resource_data in zip(subjects, resources_data):
+                    try:
+                        decision = policies.engine.enforce(subject, resource_data, method)
+                    except Exception:
+                        # Ресурс, для которого не найдены данные (например, несуществующая медкарта), недоступен
+                        decision = False
+                    decisions[resource_data['resource']] = decision
+
+        return [resource for resource in resources if decisions.get(resource, False)]
+
+    @staticmethod
+    def __is_request_in_whitelist(policies: PolicySet, request: Request) -> tuple[bool, str] | tuple[bool, None]:
         resource = '/' + request.path_params['path_name']
-        for p in self.whitelist_policies:
+        for p in policies.whitelist_policies:
             if re.match(p.resource, resource) is not None and request.method in p.method_list:
                 return True, p.service
         return False, None
@@ -85,10 +152,15 @@ class RequestEnforcer:
         try:
             if 'authorization' in request.headers:
                 token = request.headers['authorization'].split(' ')[1]
-                return jwt.decode(token, self.jwt_secret, algorithms=["HS256"], audience=["fastapi-users:auth"])
+                return self.__decode_token(token)
         except:
             return None
 
+    def __decode_token(self, token: str) -> dict:
+        if self.token_cache is None:
+            return decode_token(token, self.jwt_secret)
+        return self.token_cache.decode(token)
+
     @staticmethod
     async def __get_request_body(request: Request):
         result = {}
@@ -101,66 +173,89 @@ class RequestEnforcer:
         return result
 
     def __enrich_token_data(self, token_data: dict, resource_data: dict, db: Session):
-        result = copy.deepcopy(token_data)
+        return self.__enrich_token_data_batch(token_data, [resource_data], db)[0]
+
+    @staticmethod
+    def __enrich_token_data_batch(token_data: dict, resources_data: list[dict], db: Session) -> list[dict]:
+        """
+        Дополняет данные токена для каждого ресурса. Данные пользователя загружаются один раз,
+        а медкарты и встречи всех ресурсов - одним запросом
+        """
+        shared = copy.deepcopy(token_data)
         user_id = uuid.UUID(token_data['sub'])
+        params = [resource_data['params'] for resource_data in resources_data]
+
+        def requested(name: str) -> list:
+            return [p[name] for p in params if p.get(name, None)]
 
         # Add empty available pages of medical card
-        result.update({ 'available_pages_of_medical_card': [] })
+        shared.update({ 'available_pages_of_medical_card': [] })
 
         # Add empty available pages of health diary
-        result.update({ 'available_pages_of_health_diary': [] })
+        shared.update({ 'available_pages_of_health_diary': [] })
 
         # Add empty available chats
-        result.update({ 'available_chats': [] })
+        shared.update({ 'available_chats': [] })
 
         # Add empty available messages
-        result.update({ 'available_messages': [] })
+        shared.update({ 'available_messages': [] })
 
         # Add empty available records
-        result.update({ 'available_records': [] })
+        shared.update({ 'available_records': [] })
 
-        page_id = resource_data['params'].get('page_id', None)
-        if page_id:
+        if requested('page_id'):
             # Add available pages of medical card
             available_pages_of_medical_card = crud_card.get_available_pages_of_medical_card(db=db, doctor_id=user_id)
-            result['available_pages_of_medical_card'].extend([str(page) for page in available_pages_of_medical_card])
-        
-        card_id = resource_data['params'].get('card_id', None)
-        if card_id:
-            card = crud_card.get_card(db=db, card_id=card_id)
-            # Add card owner id
-            result.update({'card_owner_id': str(card.id_user)}) 
-
-        page_diary_id = resource_data['params'].get('page_diary_id', None)
-        if page_diary_id:
+            shared['available_pages_of_medical_card'].extend([str(page) for page in available_pages_of_medical_card])
+
+        if requested('page_diary_id'):
             # Add available pages of health diary
             available_pages_of_health_diary = crud_card.get_available_pages_of_health_diary(db=db, user_id=user_id)
-            result['available_pages_of_health_diary'].extend([str(page) for page in available_pages_of_health_diary])
+            shared['available_pages_of_health_diary'].extend([str(page) for page in available_pages_of_health_diary])
 
-        chat_id = resource_data['params'].get('chat_id', None)
-        if chat_id:
+        if requested('chat_id'):
             available_chats = crud_chat.get_available_chats(db=db, user_id=user_id)
             # Add available chats
-            result['available_chats'].extend([chat for chat in available_chats])
-            result['available_chats'].extend([str(chat) for chat in available_chats])
+            shared['available_chats'].extend([chat for chat in available_chats])
+            shared['available_chats'].extend([str(chat) for chat in available_chats])
 
-        message_id = resource_data['params'].get('message_id', None)
-        if message_id:
+        if requested('message_id'):
             available_messages = crud_message.get_available_messages(db=db, user_id=user_id)
             # Add available messages
-            result['available_messages'].extend([str(msg) for msg in available_messages])
+            shared['available_messages'].extend([str(msg) for msg in available_messages])
+
+        card_owners = {}
+        card_ids = requested('card_id')
+        if card_ids:
+            card_owners = {str(card.id): str(card.id_user) for card in crud_card.get_cards(db, card_ids)}
 
-        meeting_id = resource_data['params'].get('meeting_id', None)
-        if meeting_id:
+        meeting_records = {}
+        meeting_ids = requested('meeting_id')
+        if meeting_ids:
             available_records = crud_record.get_available_records(db=db, user_id=user_id)
             # Add available records
-            result['available_records'].extend([str(record) for record in available_records])
-            
-            meeting = crud_meeting.get_meeting(db, meeting_id)
-            # Add record id
-            result.update({'record_id': str(meeting.record_id)})
+            shared['available_records'].extend([str(record) for record in available_records])
 
-        return result
+            meeting_records = {
+                str(meeting.meeting_id): str(meeting.record_id) for meeting in crud_meeting.get_meetings(db, meeting_ids)
+            }
+
+        results = []
+        for p in params:
+            # Списки доступных объектов общие для всех ресурсов: правила их только читают
+            result = dict(shared)
+            card_id = p.get('card_id', None)
+            if card_id and str(card_id) in card_owners:
+                # Add card owner id
+                result.update({'card_owner_id': card_owners[str(card_id)]})
+
+            meeting_id = p.get('meeting_id', None)
+            if meeting_id and str(meeting_id) in meeting_records:
+                # Add record id
+                result.update({'record_id': meeting_records[str(meeting_id)]})
+            results.append(result)
+
+        return results
 
     @staticmethod
     def __get_data_by_pattern(resource: str, pattern: str):
@@ -169,42 +264,63 @@ class RequestEnforcer:
             return result.groupdict()
         return {}
 
-    def __get_resource_data_by_pattern(self, resource: str, method: str) -> dict:
-        for p in self.config.policies:
+    def __get_resource_data_by_pattern(self, policies: PolicySet, resource: str, method: str) -> dict:
+        for p in policies.config.policies:
             if re.fullmatch(p.resource, resource) is not None and method in p.method_list:
                 if p.resource_pattern is None:
                     break
                 return self.__get_data_by_pattern(resource, p.resource_pattern)
         return {}
 
-    async def __check_by_policy(self, request: Request, db: Session | None = None) -> tuple[bool, str] | tuple[bool, None]:
-        token_data = self.__extract_token_data(request)
+    @staticmethod
+    def __get_cached_decision(policies: PolicySet, token_data: dict, resource: str, method: str) -> bool | None:
+        """
+        Возвращает запомненное решение для политик, зависящих только от группы пользователя
+        """
+        group_id = token_data.get('group_id')
+        if policies.decision_cache is None or type(group_id) is not int:
+            return None
+        with tracer.child_span('policy.decision_cache'):
+            return policies.decision_cache.get(group_id, resource, method)
+
+    async def __check_by_policy(
+            self, policies: PolicySet, request: Request, db: Session | None = None
+        ) -> tuple[bool, str] | tuple[bool, None]:
+        with tracer.child_span('policy.extract_token'):
+            token_data = self.__extract_token_data(request)
 
         if token_data is None:
             return False, None
 
         resource = '/' + request.path_params['path_name']
-        resource_data = {
-            'resource': resource,
-            'params': {},
-            'body': {}
-        }
-        resource_data['params'].update(self.__get_resource_data_by_pattern(resource, request.method))
-        resource_data['body'].update(await self.__get_request_body(request))
-        
-        token_data = self.__enrich_token_data(token_data, resource_data, db)
-        access_allowed = self.enforcer.enforce(token_data, resource_data, request.method)
+        access_allowed = self.__get_cached_decision(policies, token_data, resource, request.method)
+        if access_allowed is None:
+            resource_data = {
+                'resource': resource,
+                'params': {},
+                'body': {}
+            }
+            resource_data['params'].update(self.__get_resource_data_by_pattern(policies, resource, request.method))
+            # Тело читается целиком, только если его проверяет правило политики,
+            # иначе оно передается сервису потоком
+            if policies.index.needs_body(resource, request.method):
+                resource_data['body'].update(await self.__get_request_body(request))
+
+            with tracer.child_span('policy.enrich_token'):
+                token_data = self.__enrich_token_data(token_data, resource_data, db)
+            with tracer.child_span('policy.evaluate'):
+                access_allowed = policies.engine.enforce(token_data, resource_data, request.method)
         if access_allowed is False:
             return False, None
 
-        for p in self.enforcing_policies:
+        for p in policies.enforcing_policies:
             if re.match(p.resource, resource) is not None and request.method in p.method_list:
                 return True, p.service
 
         return True, None
 
     async def __check_by_policy_websocket(
-            self, websocket: WebSocket, db: Session
+            self, policies: PolicySet, websocket: WebSocket, db: Session
         ) -> tuple[bool, str, int, uuid.UUID] | tuple[bool, None, None, None]:
 
         websocket_method = 'GET'
@@ -213,7 +329,7 @@ class RequestEnforcer:
         if token is None:
             return False, None, None, None
 
-        token_data = jwt.decode(token, self.jwt_secret, algorithms=["HS256"], audience=["fastapi-users:auth"])
+        token_data = self.__decode_token(token)
 
         resource = '/' + websocket.path_params['path_name']
         resource_data = {
@@ -221,25 +337,69 @@ class RequestEnforcer:
             'params': {},
             'body': {}
         }
-        resource_data['params'].update(self.__get_resource_data_by_pattern(resource, websocket_method))
+        resource_data['params'].update(self.__get_resource_data_by_pattern(policies, resource, websocket_method))
 
-        token_data = self.__enrich_token_data(token_data, resource_data, db)
-        access_allowed = self.enforcer.enforce(token_data, resource_data, websocket_method)
+        with tracer.child_span('policy.enrich_token'):
+            token_data = self.__enrich_token_data(token_data, resource_data, db)
+        with tracer.child_span('policy.evaluate'):
+            access_allowed = policies.engine.enforce(token_data, resource_data, websocket_method)
         if access_allowed is False:
             return False, None, None, None
 
-        for p in self.enforcing_policies:
+        for p in policies.enforcing_policies:
             if re.match(p.resource, resource) is not None and websocket_method in p.method_list:
                 return True, p.service, int(resource_data['params']['chat_id']), resource_data['params']['user_id']
 
         return True, None, None, None
 
-    def __get_service_by_name(self, service_name: str) -> Service | None:
-        for s in self.config.services:
-            if s.name == service_name:
-                return s
+    async def __check_rate_limit(self, policies: PolicySet, request: Request) -> None:
+        """
+        Расходует жетон первой подходящей политики с ограничением частоты запросов.
+        Лимит считается для пользователя из токена, а без токена - для адреса клиента
+        """
+        if not policies.rate_limited_policies:
+            return
+        resource = '/' + request.path_params['path_name']
+        for p in policies.rate_limited_policies:
+            if re.match(p.resource, resource) is not None and request.method in p.method_list:
+                break
+        else:
+            return
+
+        with tracer.child_span('policy.rate_limit'):
+            token_data = self.__extract_token_data(request)
+            if token_data is not None and 'sub' in token_data:
+                subject = 'user:' + str(token_data['sub'])
+            else:
+                subject = 'client:' + (request.client.host if request.client else '')
+            group = p.rate_limit.group or p.resource
+            retry_after = await self.rate_limiter.acquire(f'{group}:{subject}', p.rate_limit)
+        if retry_after > 0:
+            raise RateLimitExceeded(group, retry_after)
+
+    @staticmethod
+    def __find_route_policy(policies: list[Policy], resource: str, method: str) -> Policy | None:
+        for p in policies:
+            if re.match(p.resource, resource) is not None and method in p.method_list:
+                return p
         return None
 
+    @property
+    def config(self) -> PoliciesConfig:
+        return self.policies.config
+
+    @property
+    def engine(self) -> CompiledPolicyEngine | CasbinPolicyEngine:
+        return self.policies.engine
+
+    @property
+    def index(self) -> CompiledPolicyEngine:
+        return self.policies.index
+
+    @property
+    def decision_cache(self) -> DecisionCache | None:
+        return self.policies.decision_cache
+
     @property
     def service_schemes(self) -> list[str]:
         return [s.openapi_scheme for s in self.config.services]
@@ -254,8 +414,8 @@ class RequestEnforcer:
 
     @property
     def whitelist_policies(self) -> list[Policy]:
-        return [p for p in self.config.policies if p.white_list]
+        return self.policies.whitelist_policies
 
     @property
     def enforcing_policies(self) -> list[Policy]:
-        return [p for p in self.config.policies if not p.white_list]
+        return self.policies.enforcing_policies
@@ -0,0 +1,85 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+
+JWT_ALGORITHMS = ["HS256"]
+JWT_AUDIENCE = ["fastapi-users:auth"]
+
+
+class TokenCache:
+    """
+    Хранит данные проверенных токенов до истечения срока действия (exp), но не дольше ttl.
+    Ключ - хеш токена, поэтому сами токены в памяти шлюза не хранятся. Ошибки проверки
+    запоминаются на negative_ttl, чтобы повторы некорректного токена не проверялись заново
+    """
+
+    def __init__(self, jwt_secret: str, max_size: int, ttl: float = 300, negative_ttl: float = 30) -> None:
+        self.jwt_secret = jwt_secret
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.__lock = threading.Lock()
+        # Хеш токена -> (данные токена или ошибка проверки, время истечения записи)
+        self.__tokens: OrderedDict[bytes, tuple[dict | jwt.InvalidTokenError, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejections = 0
+
+    def decode(self, token: str) -> dict:
+        """
+        Возвращает данные токена или вызывает jwt.InvalidTokenError, как jwt.decode
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        with self.__lock:
+            entry = self.__tokens.get(key)
+            if entry is not None and entry[1] > now:
+                self.__tokens.move_to_end(key)
+                self.hits += 1
+                value = entry[0]
+                if isinstance(value, jwt.InvalidTokenError):
+                    self.rejections += 1
+                    raise value.with_traceback(None)
+                return dict(value)
+            self.misses += 1
+
+        try:
+            claims = decode_token(token, self.jwt_secret)
+        except jwt.InvalidTokenError as e:
+            self.__store(key, e, now + self.negative_ttl)
+            raise
+        expires_at = now + self.ttl
+        if isinstance(claims.get('exp'), (int, float)):
+            expires_at = min(expires_at, claims['exp'])
+        self.__store(key, claims, expires_at)
+        return dict(claims)
+
+    def __store(self, key: bytes, value: dict | jwt.InvalidTokenError, expires_at: float) -> None:
+        with self.__lock:
+            self.__tokens[key] = (value, expires_at)
+            self.__tokens.move_to_end(key)
+            while len(self.__tokens) > self.max_size:
+                self.__tokens.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__tokens.clear()
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.__tokens),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejections": self.rejections,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+def decode_token(token: str, jwt_secret: str) -> dict:
+    return jwt.decode(token, jwt_secret, algorithms=JWT_ALGORITHMS, audience=JWT_AUDIENCE)
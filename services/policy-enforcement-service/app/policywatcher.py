@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable
+
+import anyio
+
+from common.instrumentation import REGISTRY, Counter, Histogram
+
+from .policies.policyset import PolicySet
+from .policies.requestenforcer import RequestEnforcer
+
+
+logger = logging.getLogger(__name__)
+
+POLICY_RELOADS: Counter = REGISTRY.register(Counter(
+    'gateway_policy_reloads_total', 'Количество перезагрузок файла политик: ok - применен, error - отклонен',
+    ('result',)
+))
+POLICY_RELOAD_DURATION: Histogram = REGISTRY.register(Histogram(
+    'gateway_policy_reload_duration_seconds', 'Длительность загрузки, проверки и замены набора политик'
+))
+
+
+class PolicyWatcher:
+    """
+    Следит за файлом политик и перезагружает их без перезапуска шлюза. Новый набор строится
+    и проверяется в отдельном потоке, а затем заменяет текущий; при ошибке остается прежний набор
+    """
+
+    def __init__(self, enforcer: RequestEnforcer, on_reload: Callable[[PolicySet], None] | None = None) -> None:
+        self.enforcer = enforcer
+        self.on_reload = on_reload
+        self.last_duration: float | None = None
+        self.last_error: str | None = None
+        self.__file_state = self.__get_file_state()
+        self.__lock = asyncio.Lock()
+        self.__task: asyncio.Task | None = None
+
+    def __get_file_state(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.enforcer.config_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def reload(self) -> bool:
+        async with self.__lock:
+            self.__file_state = self.__get_file_state()
+            started = time.perf_counter()
+            try:
+                policies = await anyio.to_thread.run_sync(self.enforcer.load_policies)
+            except Exception as e:
+                POLICY_RELOADS.inc(('error',))
+                self.last_error = str(e)
+                logger.error('Файл политик %s не применен: %s', self.enforcer.config_path, e)
+                return False
+            self.enforcer.swap_policies(policies)
+            if self.on_reload is not None:
+                self.on_reload(policies)
+            self.last_duration = time.perf_counter() - started
+            self.last_error = None
+            POLICY_RELOADS.inc(('ok',))
+            POLICY_RELOAD_DURATION.observe((), self.last_duration)
+            logger.info(
+                'Политики перезагружены (версия %s) за %.3f с', self.enforcer.version, self.last_duration
+            )
+            return True
+
+    async def __watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if self.__get_file_state() != self.__file_state:
+                await self.reload()
+
+    def start(self, interval: float) -> None:
+        if interval > 0 and self.__task is None:
+            self.__task = asyncio.create_task(self.__watch(interval))
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+            self.__task = None
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "version": self.enforcer.version,
+            "loaded_at": self.enforcer.loaded_at,
+            "last_duration_ms": round(self.last_duration * 1000, 3) if self.last_duration is not None else None,
+            "last_error": self.last_error
+        }
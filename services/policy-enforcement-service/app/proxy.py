@@ -0,0 +1,13 @@
+from typing import AsyncIterator
+
+from fastapi import Request
+
+
+def get_request_content(request: Request) -> AsyncIterator[bytes] | None:
+    """
+    Возвращает тело запроса для передачи сервису потоком, без чтения в память целиком.
+    Если тело уже прочитано для проверки политик, передается прочитанное тело
+    """
+    if 'content-length' not in request.headers and 'transfer-encoding' not in request.headers:
+        return None
+    return request.stream()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+
+from common.instrumentation import REGISTRY, Counter, Gauge
+
+from .policies.policiesconfig import Service
+
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_HALF_OPEN = 'half_open'
+CIRCUIT_OPEN = 'open'
+
+CIRCUIT_STATE_VALUES = {CIRCUIT_CLOSED: 0, CIRCUIT_HALF_OPEN: 1, CIRCUIT_OPEN: 2}
+
+CIRCUIT_STATE: Gauge = REGISTRY.register(Gauge(
+    'gateway_circuit_state', 'Состояние автомата сервиса: 0 - закрыт, 1 - полуоткрыт, 2 - открыт', ('service',)
+))
+CIRCUIT_TRANSITIONS: Counter = REGISTRY.register(Counter(
+    'gateway_circuit_transitions_total', 'Количество переходов автомата сервиса в состояние', ('service', 'state')
+))
+UPSTREAM_REJECTIONS: Counter = REGISTRY.register(Counter(
+    'gateway_upstream_rejections_total', 'Количество запросов, отклоненных без обращения к сервису',
+    ('service', 'reason')
+))
+UPSTREAM_ACTIVE: Gauge = REGISTRY.register(Gauge(
+    'gateway_upstream_active_requests', 'Количество запросов к сервису, выполняемых шлюзом', ('service',)
+))
+UPSTREAM_QUEUED: Gauge = REGISTRY.register(Gauge(
+    'gateway_upstream_queued_requests', 'Количество запросов, ожидающих свободного места в лимите сервиса',
+    ('service',)
+))
+
+
+class ServiceUnavailable(Exception):
+    def __init__(self, service: str, reason: str) -> None:
+        super().__init__(f'{service}: {reason}')
+        self.service = service
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель сервиса. После failure_threshold ошибок подряд размыкается
+    и отклоняет запросы recovery_seconds, затем пропускает half_open_requests пробных
+    запросов: успешный пробный запрос замыкает автомат, ошибка снова размыкает его
+    """
+
+    def __init__(
+            self, service: str, failure_threshold: int, recovery_seconds: float, half_open_requests: int = 1
+        ) -> None:
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_requests = half_open_requests
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.changed_at = time.monotonic()
+        self.probes = 0
+        CIRCUIT_STATE.set((service,), CIRCUIT_STATE_VALUES[self.state])
+
+    def __set_state(self, state: str) -> None:
+        logger.warning('Автомат сервиса %s: %s -> %s', self.service, self.state, state)
+        self.state = state
+        self.changed_at = time.monotonic()
+        self.failures = 0
+        self.probes = 0
+        CIRCUIT_STATE.set((self.service,), CIRCUIT_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.inc((self.service, state))
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0 or self.state == CIRCUIT_CLOSED:
+            return True
+        elapsed = time.monotonic() - self.changed_at
+        if self.state == CIRCUIT_OPEN:
+            if elapsed < self.recovery_seconds:
+                return False
+            self.__set_state(CIRCUIT_HALF_OPEN)
+        elif self.probes >= self.half_open_requests:
+            # Пробный запрос, завершившийся без результата, не должен оставлять автомат полуоткрытым навсегда
+            if elapsed < self.recovery_seconds:
+                return False
+            self.__set_state(CIRCUIT_HALF_OPEN)
+        self.probes += 1
+        return True
+
+    def record(self, failed: bool) -> None:
+        if self.failure_threshold <= 0:
+            return
+        if self.state == CIRCUIT_HALF_OPEN:
+            self.__set_state(CIRCUIT_OPEN if failed else CIRCUIT_CLOSED)
+        elif self.state == CIRCUIT_CLOSED:
+            self.failures = self.failures + 1 if failed else 0
+            if self.failures >= self.failure_threshold:
+                self.__set_state(CIRCUIT_OPEN)
+
+
+class ConcurrencyLimiter:
+    """
+    Ограничивает число одновременных запросов к сервису. Запросы сверх лимита ждут в очереди
+    не дольше queue_timeout, а при max_queue ожидающих новые запросы сразу отклоняются
+    """
+
+    def __init__(self, service: str, max_concurrent: int, max_queue: int, queue_timeout: float) -> None:
+        self.service = service
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.__semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+
+    async def acquire(self) -> None:
+        if self.__semaphore is not None:
+            if self.__semaphore.locked():
+                if self.waiting >= self.max_queue:
+                    raise ServiceUnavailable(self.service, 'queue_full')
+                self.waiting += 1
+                UPSTREAM_QUEUED.inc((self.service,))
+                try:
+                    await asyncio.wait_for(self.__semaphore.acquire(), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    raise ServiceUnavailable(self.service, 'queue_timeout')
+                finally:
+                    self.waiting -= 1
+                    UPSTREAM_QUEUED.dec((self.service,))
+            else:
+                await self.__semaphore.acquire()
+        self.active += 1
+        UPSTREAM_ACTIVE.inc((self.service,))
+
+    def release(self) -> None:
+        self.active -= 1
+        UPSTREAM_ACTIVE.dec((self.service,))
+        if self.__semaphore is not None:
+            self.__semaphore.release()
+
+
+class ServiceGuard:
+    """
+    Лимит одновременных запросов и автоматический выключатель сервиса
+    """
+
+    def __init__(self, breaker: CircuitBreaker, limiter: ConcurrencyLimiter) -> None:
+        self.breaker = breaker
+        self.limiter = limiter
+        self.rejections: dict[str, int] = {}
+
+    async def acquire(self) -> None:
+        """
+        Занимает место в лимите сервиса или вызывает ServiceUnavailable
+        """
+        try:
+            if not self.breaker.allow():
+                raise ServiceUnavailable(self.breaker.service, 'circuit_open')
+            await self.limiter.acquire()
+        except ServiceUnavailable as e:
+            self.rejections[e.reason] = self.rejections.get(e.reason, 0) + 1
+            UPSTREAM_REJECTIONS.inc((e.service, e.reason))
+            raise
+
+    def release(self) -> None:
+        self.limiter.release()
+
+    def record(self, failed: bool) -> None:
+        self.breaker.record(failed)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "active": self.limiter.active,
+            "waiting": self.limiter.waiting,
+            "rejections": dict(self.rejections)
+        }
+
+
+def create_service_guards(services: list[Service], cfg) -> dict[str, ServiceGuard]:
+    """
+    Создает ограничители сервисов по настройкам шлюза. Лимит одновременных запросов
+    можно переопределить для сервиса в файле политик (max_concurrent_requests)
+    """
+    guards = {}
+    for s in services:
+        max_concurrent = s.max_concurrent_requests
+        if max_concurrent is None:
+            max_concurrent = cfg.upstream_max_concurrent_requests
+        guards[s.name] = ServiceGuard(
+            CircuitBreaker(
+                s.name, cfg.circuit_failure_threshold, cfg.circuit_recovery_seconds, cfg.circuit_half_open_requests
+            ),
+            ConcurrencyLimiter(s.name, max_concurrent, cfg.upstream_max_queue, cfg.upstream_queue_timeout)
+        )
+    return guards
@@ -1,3 +1,16 @@
+from pydantic import BaseModel
+
+
+class AuthorizeBatchRequest(BaseModel):
+    method: str = 'GET'
+    # Пути ресурсов так же, как в запросах к шлюзу, например /pages/<id>
+    resources: list[str]
+
+
+class AuthorizeBatchResponse(BaseModel):
+    allowed: list[str]
+
+
 class SchemeBuilder:
     def __init__(self, source_scheme: dict) -> None:
         self.__result: dict = source_scheme
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import random
+import time
+import urllib.parse
+
+import httpx
+
+from common.instrumentation import REGISTRY, Gauge, Histogram
+
+from .policies.policiesconfig import Service
+
+
+logger = logging.getLogger(__name__)
+
+BALANCING_STRATEGIES = ('least-outstanding', 'p2c')
+
+# Ответы, которые считаются отказом реплики, а не ошибкой обработки запроса сервисом
+FAILURE_STATUS_CODES = (502, 503, 504)
+
+# Вес нового значения в скользящем среднем времени ответа реплики
+LATENCY_SMOOTHING = 0.2
+
+ENDPOINT_DURATION: Histogram = REGISTRY.register(Histogram(
+    'gateway_endpoint_duration_seconds', 'Время до получения заголовков ответа реплики сервиса',
+    ('service', 'endpoint')
+))
+ENDPOINT_OUTSTANDING: Gauge = REGISTRY.register(Gauge(
+    'gateway_endpoint_outstanding_requests', 'Количество незавершенных запросов к реплике сервиса',
+    ('service', 'endpoint')
+))
+ENDPOINT_AVAILABLE: Gauge = REGISTRY.register(Gauge(
+    'gateway_endpoint_available', 'Реплика участвует в балансировке (1) или исключена (0)',
+    ('service', 'endpoint')
+))
+
+
+class Endpoint:
+    """
+    Реплика сервиса и ее состояние для балансировки
+    """
+
+    def __init__(self, service: str, url: str, health_check_url: str) -> None:
+        self.service = service
+        self.url = url
+        self.health_check_url = health_check_url
+        self.outstanding = 0
+        # Результат активной проверки
+        self.healthy = True
+        self.health_check_failures = 0
+        # Исключение по ошибкам запросов
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.latency = 0.0
+
+    @property
+    def labels(self) -> tuple:
+        return self.service, self.url
+
+    def is_available(self, now: float) -> bool:
+        return self.healthy and self.ejected_until <= now
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": self.ejected_until > time.monotonic(),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "latency_ms": round(self.latency * 1000, 3)
+        }
+
+
+class UpstreamPool:
+    """
+    Реплики одного сервиса. Запрос направляется реплике с наименьшим числом незавершенных
+    запросов (least-outstanding) или лучшей из двух случайных (p2c). Реплика исключается
+    из балансировки после failure_threshold ошибок подряд на eject_seconds, а также пока
+    не проходит активную проверку
+    """
+
+    def __init__(
+            self, service: Service, strategy: str = 'least-outstanding',
+            failure_threshold: int = 3, eject_seconds: float = 30
+        ) -> None:
+        if strategy not in BALANCING_STRATEGIES:
+            raise ValueError(f'Неизвестный способ балансировки: {strategy}')
+        self.service = service
+        self.name = service.name
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.endpoints = [
+            Endpoint(service.name, url, urllib.parse.urljoin(url, service.health_check))
+            for url in service.endpoint_list
+        ]
+        for endpoint in self.endpoints:
+            ENDPOINT_AVAILABLE.set(endpoint.labels, 1)
+
+    def choose(self) -> Endpoint:
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.is_available(now)]
+        # Если исключены все реплики, запрос все равно отправляется одной из них
+        if not candidates:
+            candidates = self.endpoints
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == 'p2c':
+            candidates = random.sample(candidates, 2)
+        else:
+            candidates = random.sample(candidates, len(candidates))
+        return min(candidates, key=lambda e: (e.outstanding, e.latency))
+
+    def acquire(self) -> Endpoint:
+        endpoint = self.choose()
+        endpoint.outstanding += 1
+        ENDPOINT_OUTSTANDING.inc(endpoint.labels)
+        return endpoint
+
+    def release(self, endpoint: Endpoint) -> None:
+        endpoint.outstanding -= 1
+        ENDPOINT_OUTSTANDING.dec(endpoint.labels)
+
+    def record(self, endpoint: Endpoint, duration: float, failed: bool) -> None:
+        """
+        Учитывает время ответа реплики и ошибку запроса
+        """
+        endpoint.requests += 1
+        ENDPOINT_DURATION.observe(endpoint.labels, duration)
+        if endpoint.requests == 1:
+            endpoint.latency = duration
+        else:
+            endpoint.latency += LATENCY_SMOOTHING * (duration - endpoint.latency)
+
+        if not failed:
+            endpoint.failures = 0
+            return
+        endpoint.failures += 1
+        if endpoint.failures >= self.failure_threshold:
+            endpoint.failures = 0
+            endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            logger.warning('Реплика %s сервиса %s исключена на %s с', endpoint.url, self.name, self.eject_seconds)
+        self.update_available(endpoint)
+
+    def record_health_check(self, endpoint: Endpoint, passed: bool) -> None:
+        if passed:
+            endpoint.health_check_failures = 0
+            if not endpoint.healthy:
+                logger.info('Реплика %s сервиса %s снова доступна', endpoint.url, self.name)
+            endpoint.healthy = True
+        else:
+            endpoint.health_check_failures += 1
+            if endpoint.healthy and endpoint.health_check_failures >= self.failure_threshold:
+                logger.warning('Реплика %s сервиса %s не проходит проверку', endpoint.url, self.name)
+                endpoint.healthy = False
+        self.update_available(endpoint)
+
+    @staticmethod
+    def update_available(endpoint: Endpoint) -> None:
+        ENDPOINT_AVAILABLE.set(endpoint.labels, 1 if endpoint.is_available(time.monotonic()) else 0)
+
+    @property
+    def stats(self) -> list[dict]:
+        return [e.stats for e in self.endpoints]
+
+
+class UpstreamRegistry:
+    """
+    Реплики всех сервисов и периодическая активная проверка их доступности
+    """
+
+    def __init__(
+            self, services: list[Service], strategy: str = 'least-outstanding',
+            failure_threshold: int = 3, eject_seconds: float = 30
+        ) -> None:
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.pools: dict[str, UpstreamPool] = {
+            s.name: UpstreamPool(s, strategy, failure_threshold, eject_seconds) for s in services
+        }
+        self.__task: asyncio.Task | None = None
+
+    def get(self, service_name: str) -> UpstreamPool:
+        return self.pools[service_name]
+
+    def update(self, services: list[Service]) -> set[str]:
+        """
+        Применяет измененный список сервисов: реплики неизмененных сервисов сохраняют свое состояние.
+        Возвращает имена добавленных и измененных сервисов
+        """
+        pools = {}
+        changed = set()
+        for s in services:
+            pool = self.pools.get(s.name)
+            if pool is None or pool.service != s:
+                pool = UpstreamPool(s, self.strategy, self.failure_threshold, self.eject_seconds)
+                changed.add(s.name)
+            pools[s.name] = pool
+        # Запросы, начатые до замены, завершаются с прежним пулом
+        self.pools = pools
+        return changed
+
+    async def check_health(self, timeout: float) -> None:
+        async def check(client: httpx.AsyncClient, pool: UpstreamPool, endpoint: Endpoint) -> None:
+            try:
+                response = await client.get(endpoint.health_check_url)
+                passed = response.status_code < 500
+            except httpx.HTTPError:
+                passed = False
+            pool.record_health_check(endpoint, passed)
+
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            await asyncio.gather(*(
+                check(client, pool, endpoint) for pool in self.pools.values() for endpoint in pool.endpoints
+            ))
+
+    async def __run_health_checks(self, interval: float, timeout: float) -> None:
+        while True:
+            try:
+                await self.check_health(timeout)
+            except Exception:
+                logger.exception('Ошибка проверки доступности реплик')
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float, timeout: float) -> None:
+        if interval > 0 and self.__task is None:
+            self.__task = asyncio.create_task(self.__run_health_checks(interval, timeout))
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+            self.__task = None
+
+    @property
+    def stats(self) -> dict:
+        return {name: pool.stats for name, pool in self.pools.items()}
@@ -0,0 +1,85 @@
+"""
+Сравнивает число решений в секунду скомпилированного движка проверки политик и casbin.
+
+    python benchmarks/policy_engine.py [--requests 2000] [--policies policies.yaml]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import yaml
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Пакет policies импортируется без пакета app, чтобы не подключаться к базе данных
+sys.path.insert(0, os.path.join(SERVICE_DIR, 'app'))
+
+from policies.policiesconfig import PoliciesConfig  # noqa: E402
+from policies.policyengine import CasbinPolicyEngine, CompiledPolicyEngine  # noqa: E402
+
+
+USER_ID = '4ef277c1-94fd-4045-b6a6-c126bc851b0e'
+
+# Типичные запросы: метод, путь, параметры пути, группа пользователя
+REQUESTS = (
+    ('GET', '/templates', {}, 2),
+    ('GET', '/templates/24', {}, 3),
+    ('GET', '/family_status', {}, 3),
+    ('GET', '/cards/11', {}, 2),
+    ('GET', f'/cards/me/{USER_ID}', {'user_id': USER_ID}, 3),
+    ('GET', f'/diaries/user/{USER_ID}', {'user_id': USER_ID}, 3),
+    ('GET', f'/chats/{USER_ID}', {'user_id': USER_ID}, 3),
+    ('GET', f'/records/user/{USER_ID}', {'user_id': USER_ID}, 3),
+    ('POST', '/templates', {}, 3),
+    ('DELETE', '/cards/11', {}, 2),
+)
+
+
+def make_sub(group_id: int) -> dict:
+    return {
+        'sub': USER_ID,
+        'group_id': group_id,
+        'available_pages_of_medical_card': [],
+        'available_pages_of_health_diary': [],
+        'available_chats': [],
+        'available_messages': [],
+        'available_records': []
+    }
+
+
+def measure(engine, count: int) -> float:
+    requests = [
+        (make_sub(group_id), {'resource': resource, 'params': params, 'body': {}}, method)
+        for method, resource, params, group_id in REQUESTS
+    ]
+    started = time.perf_counter()
+    for i in range(count):
+        sub, obj, act = requests[i % len(requests)]
+        engine.enforce(sub, obj, act)
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--policies', default=os.path.join(SERVICE_DIR, 'policies.yaml'))
+    args = parser.parse_args()
+
+    # casbin пишет в журнал каждый запрет
+    logging.getLogger('casbin').setLevel(logging.ERROR)
+
+    with open(args.policies) as file:
+        config = PoliciesConfig(**yaml.safe_load(file))
+    policies = [p for p in config.policies if not p.white_list]
+
+    compiled = measure(CompiledPolicyEngine(policies), args.requests * 100)
+    reference = measure(CasbinPolicyEngine(config, policies), args.requests)
+    print(f'policies: {len(policies)}')
+    print(f'casbin:   {reference:12.0f} decisions/s')
+    print(f'compiled: {compiled:12.0f} decisions/s ({compiled / reference:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
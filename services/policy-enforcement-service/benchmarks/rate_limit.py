@@ -0,0 +1,39 @@
+"""
+Измеряет время решения ограничения частоты запросов в памяти шлюза.
+
+    python benchmarks/rate_limit.py [--requests 200000] [--users 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Пакет policies импортируется без пакета app, чтобы не подключаться к базе данных
+sys.path.insert(0, os.path.join(SERVICE_DIR, 'app'))
+
+from policies.policiesconfig import RateLimit  # noqa: E402
+from policies.ratelimit import MemoryRateLimiter  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    limiter = MemoryRateLimiter()
+    limit = RateLimit(requests=10, burst=20)
+    keys = [f'^/messages/last/\\d+$:user:{i}' for i in range(args.users)]
+
+    started = time.perf_counter()
+    for i in range(args.requests):
+        limiter.take(keys[i % len(keys)], limit)
+    elapsed = time.perf_counter() - started
+    print(f'keys:     {len(keys)}')
+    print(f'decision: {elapsed / args.requests * 1e6:8.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Сравнивает число проверок токенов в секунду с кэшем проверенных токенов и без него.
+
+    python benchmarks/token_cache.py [--requests 20000] [--tokens 10]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import jwt
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Пакет policies импортируется без пакета app, чтобы не подключаться к базе данных
+sys.path.insert(0, os.path.join(SERVICE_DIR, 'app'))
+
+from policies.tokencache import JWT_AUDIENCE, TokenCache, decode_token  # noqa: E402
+
+
+JWT_SECRET = 'jwt_secret'
+
+
+def make_tokens(count: int) -> list[str]:
+    return [
+        jwt.encode({
+            'sub': str(uuid.uuid4()),
+            'group_id': 3,
+            'aud': JWT_AUDIENCE,
+            'exp': int(time.time()) + 3600
+        }, key=JWT_SECRET)
+        for _ in range(count)
+    ]
+
+
+def measure(decode, tokens: list[str], count: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        decode(tokens[i % len(tokens)])
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--tokens', type=int, default=10)
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.tokens)
+    cache = TokenCache(JWT_SECRET, max_size=10000)
+
+    reference = measure(lambda token: decode_token(token, JWT_SECRET), tokens, args.requests)
+    cached = measure(cache.decode, tokens, args.requests)
+    print(f'tokens:   {len(tokens)}')
+    print(f'jwt:      {reference:12.0f} tokens/s')
+    print(f'cached:   {cached:12.0f} tokens/s ({cached / reference:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import unittest
+
+from app.coalescing import ResponseCoalescer, SharedResponse, get_response_ttl, is_cache_bypassed
+
+KEY = ('template-service', '/templates', '', None, None, None, None)
+
+
+class UpstreamStub:
+    def __init__(self, headers: list[tuple[str, str]] = None, delay: float = 0.05) -> None:
+        self.headers = headers or []
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> SharedResponse:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return SharedResponse(200, self.headers, f'[{self.calls}]'.encode())
+
+
+class ResponseTtlTestCase(unittest.TestCase):
+    def test_cache_control(self):
+        def ttl(status_code=200, **headers):
+            response = SharedResponse(status_code, [(k.replace('_', '-'), v) for k, v in headers.items()], b'')
+            return get_response_ttl(response, 5)
+
+        self.assertEqual(ttl(), 5)
+        self.assertEqual(ttl(cache_control='public, max-age=2'), 2)
+        self.assertEqual(ttl(cache_control='max-age=60, s-maxage=3'), 3)
+        self.assertEqual(ttl(cache_control='max-age=60'), 5)
+        self.assertEqual(ttl(cache_control='no-store'), 0)
+        self.assertEqual(ttl(cache_control='private, max-age=60'), 0)
+        self.assertEqual(ttl(set_cookie='session=1'), 0)
+        self.assertEqual(ttl(status_code=304), 0)
+
+    def test_request_bypass(self):
+        self.assertTrue(is_cache_bypassed('no-cache'))
+        self.assertTrue(is_cache_bypassed('max-age=0, no-store'))
+        self.assertFalse(is_cache_bypassed('max-age=0'))
+        self.assertFalse(is_cache_bypassed(None))
+
+
+class ResponseCoalescerTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.coalescer = ResponseCoalescer()
+
+    async def test_concurrent_requests_are_coalesced(self):
+        upstream = UpstreamStub()
+        results = await asyncio.gather(*(self.coalescer.fetch(KEY, 0, upstream) for _ in range(20)))
+
+        self.assertEqual(upstream.calls, 1)
+        self.assertEqual({response.body for response, _ in results}, {b'[1]'})
+        self.assertEqual([shared for _, shared in results].count(False), 1)
+        self.assertEqual(self.coalescer.stats, {'inflight': 0, 'cached': 0})
+
+        await self.coalescer.fetch(KEY, 0, upstream)
+        self.assertEqual(upstream.calls, 2)
+
+    async def test_micro_cache(self):
+        upstream = UpstreamStub(delay=0)
+        await self.coalescer.fetch(KEY, 0.1, upstream)
+        response, shared = await self.coalescer.fetch(KEY, 0.1, upstream)
+        self.assertTrue(shared)
+        self.assertEqual((upstream.calls, response.body), (1, b'[1]'))
+
+        response, _ = await self.coalescer.fetch(KEY, 0.1, upstream, use_cache=False)
+        self.assertEqual(response.body, b'[2]')
+
+        await asyncio.sleep(0.11)
+        response, _ = await self.coalescer.fetch(KEY, 0.1, upstream)
+        self.assertEqual(response.body, b'[3]')
+
+    async def test_no_store(self):
+        upstream = UpstreamStub(headers=[('cache-control', 'no-store')], delay=0)
+        await self.coalescer.fetch(KEY, 10, upstream)
+        await self.coalescer.fetch(KEY, 10, upstream)
+        self.assertEqual(upstream.calls, 2)
+
+    async def test_invalidate(self):
+        upstream = UpstreamStub(delay=0)
+        await self.coalescer.fetch(KEY, 10, upstream)
+        self.coalescer.invalidate('user-service')
+        self.assertEqual(self.coalescer.stats['cached'], 1)
+        self.coalescer.invalidate('template-service')
+        await self.coalescer.fetch(KEY, 10, upstream)
+        self.assertEqual(upstream.calls, 2)
+
+    async def test_cancelled_leader(self):
+        upstream = UpstreamStub()
+        leader = asyncio.create_task(self.coalescer.fetch(KEY, 0, upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(self.coalescer.fetch(KEY, 0, upstream))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        response, shared = await follower
+        self.assertEqual((response.body, shared), (b'[1]', True))
+
+    async def test_error_is_shared(self):
+        async def failing_upstream():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('upstream')
+
+        results = await asyncio.gather(
+            *(self.coalescer.fetch(KEY, 10, failing_upstream) for _ in range(3)), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(self.coalescer.stats, {'inflight': 0, 'cached': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
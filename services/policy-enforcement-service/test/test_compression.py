@@ -0,0 +1,125 @@
+import asyncio
+import gzip
+import json
+import unittest
+from unittest import mock
+
+from starlette.datastructures import Headers
+from starlette.responses import Response, StreamingResponse
+
+from app import compression
+from app.compression import CompressionMiddleware, choose_encoding
+
+PAYLOAD = json.dumps([{"id": i, "name": f"Пациент {i}", "records": list(range(20))} for i in range(200)]).encode()
+
+
+async def run(app, accept_encoding: str | None = 'gzip', method: str = 'GET') -> tuple[int, Headers, list[bytes]]:
+    headers = [(b'accept-encoding', accept_encoding.encode())] if accept_encoding is not None else []
+    scope = {'type': 'http', 'method': method, 'path': '/', 'query_string': b'', 'headers': headers}
+    messages = []
+    disconnected = asyncio.Event()
+
+    async def receive():
+        # StreamingResponse ждет отключения клиента, пока отправляет ответ
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+
+    await CompressionMiddleware(app, minimum_size=1024)(scope, receive, send)
+    start = messages[0]
+    return start['status'], Headers(raw=start['headers']), [m['body'] for m in messages[1:]]
+
+
+def chunked(chunks: list[bytes], media_type: str = 'application/json'):
+    async def generate():
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(0)
+    return StreamingResponse(generate(), media_type=media_type)
+
+
+class ChooseEncodingTestCase(unittest.TestCase):
+    def test_negotiation(self):
+        supported = ('br', 'gzip')
+        self.assertEqual(choose_encoding('gzip, deflate, br', supported), 'br')
+        self.assertEqual(choose_encoding('gzip, deflate, br', ('gzip',)), 'gzip')
+        self.assertEqual(choose_encoding('br;q=0.5, gzip', supported), 'gzip')
+        self.assertEqual(choose_encoding('br;q=0, gzip;q=0', supported), None)
+        self.assertEqual(choose_encoding('*;q=0.1', supported), 'br')
+        self.assertEqual(choose_encoding('identity', supported), None)
+        self.assertEqual(choose_encoding(None, supported), None)
+
+
+class CompressionMiddlewareTestCase(unittest.TestCase):
+    def test_compresses_large_response(self):
+        app = Response(PAYLOAD, media_type='application/json', headers={'ETag': '"v1"'})
+        status, headers, bodies = asyncio.run(run(app))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(headers['vary'], 'Accept-Encoding')
+        self.assertEqual(headers['etag'], 'W/"v1"')
+        self.assertNotIn('content-length', headers)
+        body = b''.join(bodies)
+        self.assertLess(len(body), len(PAYLOAD) // 4)
+        self.assertEqual(gzip.decompress(body), PAYLOAD)
+
+    def test_streams_chunks(self):
+        chunks = [PAYLOAD[i:i + 4096] for i in range(0, len(PAYLOAD), 4096)]
+        status, headers, bodies = asyncio.run(run(chunked(chunks)))
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        # Каждый фрагмент отправляется клиенту сразу, не дожидаясь конца ответа
+        self.assertGreaterEqual(len([b for b in bodies if b]), len(chunks))
+        self.assertEqual(gzip.decompress(b''.join(bodies)), PAYLOAD)
+
+    def test_large_chunk(self):
+        payload = PAYLOAD * 10
+        status, headers, bodies = asyncio.run(run(chunked([payload, payload])))
+        self.assertEqual(gzip.decompress(b''.join(bodies)), payload * 2)
+
+    def test_passthrough(self):
+        def assert_identity(app, accept_encoding='gzip', method='GET'):
+            status, headers, bodies = asyncio.run(run(app, accept_encoding, method))
+            self.assertNotEqual(headers.get('content-encoding'), 'gzip')
+            return headers, b''.join(bodies)
+
+        assert_identity(Response(PAYLOAD, media_type='application/json'), accept_encoding=None)
+        assert_identity(Response(PAYLOAD, media_type='application/json'), accept_encoding='identity')
+        assert_identity(Response(PAYLOAD, media_type='application/json'), method='HEAD')
+        assert_identity(Response(PAYLOAD, media_type='application/pdf'))
+        assert_identity(Response(status_code=304, headers={'ETag': '"v1"'}))
+
+        headers, body = assert_identity(Response(b'{"id": 1}', media_type='application/json'))
+        self.assertEqual(body, b'{"id": 1}')
+        self.assertEqual(headers['content-length'], '9')
+
+        # Короткий потоковый ответ из одного фрагмента отправляется без сжатия
+        headers, body = assert_identity(chunked([b'[]']))
+        self.assertEqual(body, b'[]')
+
+        compressed = gzip.compress(PAYLOAD)
+        app = Response(compressed, media_type='application/json', headers={'Content-Encoding': 'gzip'})
+        status, headers, bodies = asyncio.run(run(app))
+        self.assertEqual(b''.join(bodies), compressed)
+        self.assertEqual(headers['content-length'], str(len(compressed)))
+
+
+class BrotliTestCase(unittest.TestCase):
+    @unittest.skipIf(compression.brotli is None, 'пакет brotli не установлен')
+    def test_brotli_chosen(self):
+        chunks = [PAYLOAD[i:i + 4096] for i in range(0, len(PAYLOAD), 4096)]
+        status, headers, bodies = asyncio.run(run(chunked(chunks), accept_encoding='gzip, deflate, br'))
+        self.assertEqual(headers['content-encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(b''.join(bodies)), PAYLOAD)
+
+    def test_gzip_without_brotli(self):
+        with mock.patch.object(compression, 'brotli', None):
+            with self.assertLogs('app.compression', level='WARNING'):
+                status, headers, bodies = asyncio.run(run(chunked([PAYLOAD]), accept_encoding='gzip, deflate, br'))
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(bodies)), PAYLOAD)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import asyncio
+import socket
+import unittest
+
+import httpx
+from fastapi import FastAPI
+
+from app.metricsserver import MetricsServer
+from common.instrumentation import setup_metrics
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class MetricsServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_metrics_served_on_internal_port(self):
+        app = FastAPI()
+        metrics_app = FastAPI()
+        setup_metrics(app, metrics_app=metrics_app)
+        self.assertNotIn('/metrics', [route.path for route in app.routes])
+
+        port = get_free_port()
+        server = MetricsServer(metrics_app, '127.0.0.1', port)
+        server.start()
+        try:
+            async with httpx.AsyncClient() as client:
+                for _ in range(100):
+                    if server.started:
+                        break
+                    await asyncio.sleep(0.01)
+                response = await client.get(f'http://127.0.0.1:{port}/metrics')
+        finally:
+            await server.stop()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', response.text)
+
+    async def test_disabled(self):
+        server = MetricsServer(FastAPI(), '127.0.0.1', 0)
+        server.start()
+        self.assertFalse(server.started)
+        await server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
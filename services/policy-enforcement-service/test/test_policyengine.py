@@ -0,0 +1,218 @@
+import itertools
+import logging
+import os
+import re
+import unittest
+
+import yaml
+
+from app.policies.decisioncache import DecisionCache
+from app.policies.policiesconfig import PoliciesConfig
+from app.policies.policyengine import (CasbinPolicyEngine, CompiledPolicyEngine, RuleCompileError,
+                                       compile_rule, get_route_segment, get_rule_attributes)
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+POLICIES_CONFIG = os.path.join(SERVICE_DIR, 'policies.yaml')
+
+USER_ID = '4ef277c1-94fd-4045-b6a6-c126bc851b0e'
+OTHER_USER_ID = '3fa85f64-5717-4562-b3fc-2c963f66afa6'
+
+METHODS = ("GET", "DELETE", "PATCH", "POST", "PUT")
+
+# Замены частей шаблонов ресурсов, по которым строятся пути запросов
+SAMPLE_VALUES = (
+    ('[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', (USER_ID, OTHER_USER_ID)),
+    ('\\d+?', ('11',)),
+    ('\\d+', ('11',)),
+    ('[0-9]+', ('5',)),
+    ('.*', ('', '/extra'))
+)
+
+
+def load_config(path: str) -> PoliciesConfig:
+    with open(path) as file:
+        return PoliciesConfig(**yaml.safe_load(file))
+
+
+def sample_resources(pattern: str) -> set[str]:
+    """
+    Строит пути, соответствующие шаблону ресурса, и пути с необязательными группами
+    """
+    variants = [pattern.removeprefix('^').removesuffix('$')]
+    while any('(' in variant for variant in variants):
+        expanded = []
+        for variant in variants:
+            match = re.search(r'\(([^()]*)\)\?', variant)
+            if match is None:
+                expanded.append(variant)
+                continue
+            expanded.append(variant[:match.start()] + match.group(1) + variant[match.end():])
+            expanded.append(variant[:match.start()] + variant[match.end():])
+        variants = expanded
+
+    for part, values in SAMPLE_VALUES:
+        variants = [
+            variant.replace(part, value, 1)
+            for variant in variants
+            for value in (values if part in variant else ('',))
+        ]
+        while any(part in variant for variant in variants):
+            variants = [variant.replace(part, values[0], 1) for variant in variants]
+    return set(variants)
+
+
+def get_params(config: PoliciesConfig, resource: str, method: str) -> dict:
+    for p in config.policies:
+        if re.fullmatch(p.resource, resource) is not None and method in p.method_list:
+            if p.resource_pattern is None:
+                break
+            result = re.search(p.resource_pattern, resource)
+            return result.groupdict() if result is not None else {}
+    return {}
+
+
+def make_subjects() -> list[tuple[dict, dict]]:
+    """
+    Возвращает данные токена и тело запроса: с доступом к ресурсам пользователя и без него
+    """
+    subjects = []
+    for group_id, is_available in itertools.product((1, 2, 3, 4), (True, False)):
+        available = [USER_ID, '11', '5'] if is_available else []
+        subjects.append(({
+            'sub': USER_ID,
+            'group_id': group_id,
+            'card_owner_id': USER_ID if is_available else OTHER_USER_ID,
+            'record_id': '11',
+            'available_pages_of_medical_card': available,
+            'available_pages_of_health_diary': available,
+            'available_chats': available,
+            'available_messages': available,
+            'available_records': available
+        }, {'id_user': USER_ID, 'id_doctor': USER_ID} if is_available else {}))
+    return subjects
+
+
+def decide(engine, sub: dict, obj: dict, act: str) -> str:
+    try:
+        return 'allow' if engine.enforce(sub, obj, act) else 'deny'
+    except Exception:
+        return 'error'
+
+
+class CompileRuleTestCase(unittest.TestCase):
+    def test_compile_rule(self):
+        predicate = compile_rule('r.sub.group_id == 2 && r.obj.params.page_id in r.sub.available_pages')
+        sub = {'group_id': 2, 'available_pages': ['1']}
+        self.assertTrue(predicate(sub, {'params': {'page_id': '1'}}, 'GET'))
+        self.assertFalse(predicate(sub, {'params': {'page_id': '2'}}, 'GET'))
+        self.assertFalse(predicate({'group_id': 3}, {'params': {}}, 'GET'))
+
+    def test_missing_attribute(self):
+        predicate = compile_rule('r.sub.group_id == 3 && r.obj.params.user_id == r.sub.sub')
+        with self.assertRaises(AttributeError):
+            predicate({'group_id': 3, 'sub': USER_ID}, {'params': {}}, 'GET')
+
+    def test_invalid_rule(self):
+        for rule in ('__import__("os")', 'r.sub.group_id == x', 'r.req.group_id == 1', 'r.sub.group_id ==', 'r.sub[0]'):
+            with self.assertRaises(RuleCompileError, msg=rule):
+                compile_rule(rule)
+
+    def test_rule_attributes(self):
+        self.assertEqual(get_rule_attributes('r.sub.group_id == 1 || r.sub.group_id == 2'), {'sub.group_id'})
+        self.assertEqual(
+            get_rule_attributes('(r.sub.group_id == 2 || r.sub.group_id == 3) && r.obj.params.user_id == r.sub.sub'),
+            {'sub.group_id', 'obj.params.user_id', 'sub.sub'}
+        )
+
+    def test_route_segment(self):
+        self.assertEqual(get_route_segment('^/templates(/\\d+)?$'), 'templates')
+        self.assertEqual(get_route_segment('^/users/me.*$'), 'users')
+        self.assertEqual(get_route_segment('/diaries/user/[0-9a-f]{8}$'), 'diaries')
+        self.assertEqual(get_route_segment('^/chats$'), 'chats')
+        self.assertIsNone(get_route_segment('^/chat_storage.*$'))
+        self.assertIsNone(get_route_segment('^.*$'))
+
+
+class NeedsBodyTestCase(unittest.TestCase):
+    def test_needs_body(self):
+        config = load_config(POLICIES_CONFIG)
+        engine = CompiledPolicyEngine([p for p in config.policies if not p.white_list])
+        self.assertTrue(engine.needs_body('/records', 'POST'))
+        self.assertFalse(engine.needs_body('/records', 'GET'))
+        self.assertTrue(engine.needs_body('/pages/card/11/template/5', 'POST'))
+        self.assertFalse(engine.needs_body('/templates', 'POST'))
+        self.assertFalse(engine.needs_body('/unknown', 'POST'))
+
+
+class PolicyEngineEquivalenceTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        # casbin пишет в журнал каждый запрет
+        logging.getLogger('casbin').setLevel(logging.ERROR)
+
+    def tearDown(self) -> None:
+        logging.getLogger('casbin').setLevel(logging.NOTSET)
+
+    def test_compiled_engine_matches_casbin(self):
+        config = load_config(POLICIES_CONFIG)
+        policies = [p for p in config.policies if not p.white_list]
+        compiled = CompiledPolicyEngine(policies)
+        reference = CasbinPolicyEngine(config, policies)
+
+        resources = set().union(*(sample_resources(p.resource) for p in policies))
+        resources |= {'/', '/unknown', '/templates/abc'}
+        decisions = set()
+        for resource, method in itertools.product(sorted(resources), METHODS):
+            params = get_params(config, resource, method)
+            for sub, body in make_subjects():
+                obj = {'resource': resource, 'params': params, 'body': body}
+                expected = decide(reference, sub, obj, method)
+                self.assertEqual(
+                    decide(compiled, sub, obj, method), expected,
+                    f'{method} {resource} group_id={sub["group_id"]} body={body}'
+                )
+                decisions.add(expected)
+        self.assertEqual(decisions, {'allow', 'deny', 'error'})
+
+
+class DecisionCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        config = load_config(POLICIES_CONFIG)
+        self.policies = [p for p in config.policies if not p.white_list]
+        self.engine = CompiledPolicyEngine(self.policies)
+        self.cache = DecisionCache(self.engine, self.policies, max_size=100)
+
+    def test_group_only_policies(self):
+        for group_id, method, resource in itertools.product((1, 2, 3), METHODS, ('/templates', '/templates/11')):
+            expected = self.engine.enforce(
+                {'group_id': group_id}, {'resource': resource, 'params': {}, 'body': {}}, method
+            )
+            self.assertEqual(self.cache.get(group_id, resource, method), expected)
+            self.assertEqual(self.cache.get(group_id, resource, method), expected)
+        # Повторные запросы и пути с тем же набором политик берут решение из кэша
+        self.assertGreaterEqual(self.cache.stats['hits'], self.cache.stats['misses'])
+        self.assertEqual(self.cache.stats['hits'] + self.cache.stats['misses'], 60)
+        self.assertEqual(self.cache.stats['bypasses'], 0)
+
+    def test_same_policies_share_decision(self):
+        self.assertTrue(self.cache.get(2, '/cards/11', 'GET'))
+        self.assertTrue(self.cache.get(2, '/cards/12', 'GET'))
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+    def test_parameter_dependent_policies(self):
+        self.assertIsNone(self.cache.get(3, f'/cards/me/{USER_ID}', 'GET'))
+        self.assertIsNone(self.cache.get(2, f'/diaries/doctor/{USER_ID}/attention', 'GET'))
+        self.assertEqual(self.cache.stats['bypasses'], 2)
+
+    def test_unknown_route(self):
+        self.assertFalse(self.cache.get(1, '/unknown', 'GET'))
+
+    def test_max_size(self):
+        cache = DecisionCache(self.engine, self.policies, max_size=1)
+        cache.get(1, '/templates', 'GET')
+        cache.get(2, '/templates', 'GET')
+        self.assertEqual(cache.stats['size'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
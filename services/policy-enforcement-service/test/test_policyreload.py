@@ -0,0 +1,117 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import yaml
+
+from app.policies.policiesconfig import PoliciesConfig
+from app.policies.policyset import PolicySet, PolicySetError, load_policies_config
+from app.policies.requestenforcer import RequestEnforcer
+from app.policywatcher import PolicyWatcher
+
+TEST_POLICIES_CONFIG = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), 'test_policies.yaml'
+)
+
+TEST_JWT_SECRET = '4e7c09ff-f69e-45f0-8285-99f80a289320'
+
+
+def load_data() -> dict:
+    with open(TEST_POLICIES_CONFIG) as file:
+        return yaml.safe_load(file)
+
+
+class PolicySetTestCase(unittest.TestCase):
+    def test_load(self):
+        policies = PolicySet.load(TEST_POLICIES_CONFIG)
+        self.assertEqual(len(policies.whitelist_policies) + len(policies.enforcing_policies), 45)
+        self.assertIn('user-service', policies.services)
+        self.assertIsNotNone(policies.decision_cache)
+
+    def test_casbin_temp_files_removed(self):
+        config = load_policies_config(TEST_POLICIES_CONFIG)
+        before = set(os.listdir(tempfile.gettempdir()))
+        PolicySet(config, engine='casbin')
+        self.assertEqual(set(os.listdir(tempfile.gettempdir())) - before, set())
+
+    def test_validation(self):
+        data = load_data()
+        data['policies'][0]['service'] = 'unknown-service'
+        with self.assertRaises(PolicySetError):
+            PolicySet(PoliciesConfig(**data))
+
+        data = load_data()
+        data['policies'][0]['resource'] = '^/users/(['
+        with self.assertRaises(PolicySetError):
+            PolicySet(PoliciesConfig(**data))
+
+        data = load_data()
+        data['services'].append(data['services'][0])
+        with self.assertRaises(PolicySetError):
+            PolicySet(PoliciesConfig(**data))
+
+
+class PolicyWatcherTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.directory, 'policies.yaml')
+        shutil.copy(TEST_POLICIES_CONFIG, self.config_path)
+        self.enforcer = RequestEnforcer(self.config_path, TEST_JWT_SECRET, token_cache_size=0)
+        self.applied = []
+        self.watcher = PolicyWatcher(self.enforcer, self.applied.append)
+
+    async def asyncTearDown(self) -> None:
+        await self.watcher.stop()
+        shutil.rmtree(self.directory)
+
+    def write_config(self, data: dict | str) -> None:
+        with open(self.config_path, 'w') as file:
+            if isinstance(data, str):
+                file.write(data)
+            else:
+                yaml.safe_dump(data, file, allow_unicode=True)
+
+    async def test_reload_swaps_policy_set(self):
+        previous = self.enforcer.policies
+        data = load_data()
+        data['policies'] = data['policies'][:10]
+        self.write_config(data)
+
+        self.assertTrue(await self.watcher.reload())
+        self.assertIsNot(self.enforcer.policies, previous)
+        self.assertEqual(len(self.enforcer.config.policies), 10)
+        self.assertEqual(self.enforcer.version, 2)
+        self.assertEqual(self.applied, [self.enforcer.policies])
+        self.assertIsNotNone(self.watcher.stats['last_duration_ms'])
+        # Прежний набор не изменяется и может использоваться запросами, начатыми до замены
+        self.assertEqual(len(previous.config.policies), 45)
+
+    async def test_invalid_config_keeps_policy_set(self):
+        previous = self.enforcer.policies
+        self.write_config('services: [')
+
+        self.assertFalse(await self.watcher.reload())
+        self.assertIs(self.enforcer.policies, previous)
+        self.assertEqual(self.enforcer.version, 1)
+        self.assertIsNotNone(self.watcher.stats['last_error'])
+        self.assertEqual(self.applied, [])
+
+    async def test_watch_file(self):
+        self.watcher.start(0.01)
+        data = load_data()
+        data['policies'] = data['policies'][:5]
+        await asyncio.sleep(0.05)
+        self.write_config(data)
+        # Время изменения файла может не измениться при быстрой записи, поэтому меняется и размер
+        for _ in range(100):
+            if self.enforcer.version > 1:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.enforcer.version, 2)
+        self.assertEqual(len(self.enforcer.config.policies), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import tracemalloc
+import unittest
+
+import httpx
+from starlette.requests import Request
+
+from app.proxy import get_request_content
+
+CHUNK_SIZE = 1024 * 1024
+CHUNK_COUNT = 64
+
+
+def build_upload_request(headers: dict, chunks: list[bytes]) -> Request:
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    return Request({
+        'type': 'http',
+        'method': 'POST',
+        'path': '/documents',
+        'headers': [(k.encode(), v.encode()) for k, v in headers.items()]
+    }, receive)
+
+
+class UpstreamStub(httpx.AsyncBaseTransport):
+    """
+    Читает тело запроса по фрагментам, в отличие от httpx.MockTransport, который читает его целиком
+    """
+
+    def __init__(self) -> None:
+        self.received = 0
+        self.headers = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.headers = request.headers
+        async for chunk in request.stream:
+            self.received += len(chunk)
+        return httpx.Response(201)
+
+
+class RequestContentTestCase(unittest.IsolatedAsyncioTestCase):
+    async def send(self, request: Request) -> UpstreamStub:
+        upstream = UpstreamStub()
+        async with httpx.AsyncClient(transport=upstream, base_url='http://upstream') as client:
+            await client.post('/documents', headers=request.headers.raw, content=get_request_content(request))
+        return upstream
+
+    async def test_large_upload_is_streamed(self):
+        chunk = b'x' * CHUNK_SIZE
+        request = build_upload_request(
+            {'content-length': str(CHUNK_SIZE * CHUNK_COUNT), 'content-type': 'application/dicom'},
+            [chunk] * CHUNK_COUNT
+        )
+
+        tracemalloc.start()
+        try:
+            upstream = await self.send(request)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(upstream.received, CHUNK_SIZE * CHUNK_COUNT)
+        self.assertEqual(upstream.headers['content-length'], str(CHUNK_SIZE * CHUNK_COUNT))
+        self.assertNotIn('transfer-encoding', upstream.headers)
+        # Тело не собирается в памяти: пик - несколько фрагментов, а не вся загрузка
+        self.assertLess(peak, 8 * CHUNK_SIZE)
+
+    async def test_body_read_for_policies(self):
+        request = build_upload_request({'content-length': '16'}, [b'{"id_user": ', b'"1"}'])
+        self.assertEqual(await request.json(), {'id_user': '1'})
+
+        upstream = await self.send(request)
+        self.assertEqual(upstream.received, 16)
+
+    async def test_without_body(self):
+        request = build_upload_request({}, [])
+        self.assertIsNone(get_request_content(request))
+
+
+if __name__ == '__main__':
+    unittest.main()
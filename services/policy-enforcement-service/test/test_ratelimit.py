@@ -0,0 +1,54 @@
+import time
+import unittest
+
+from app.policies.policiesconfig import RateLimit
+from app.policies.ratelimit import MemoryRateLimiter
+
+
+class RateLimitTestCase(unittest.TestCase):
+    def test_defaults(self):
+        limit = RateLimit(requests=10, per=2)
+        self.assertEqual(limit.rate, 5)
+        self.assertEqual(limit.capacity, 10)
+        self.assertEqual(RateLimit(requests=10, burst=30).capacity, 30)
+        with self.assertRaises(ValueError):
+            RateLimit(requests=0)
+
+
+class MemoryRateLimiterTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.limiter = MemoryRateLimiter()
+        self.limit = RateLimit(requests=10, per=1, burst=3)
+
+    def test_burst(self):
+        results = [self.limiter.take('messages:user:1', self.limit) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+        self.assertLessEqual(results[3], 0.1)
+
+    def test_refill(self):
+        for _ in range(3):
+            self.limiter.take('messages:user:1', self.limit)
+        retry_after = self.limiter.take('messages:user:1', self.limit)
+        time.sleep(retry_after + 0.01)
+        self.assertEqual(self.limiter.take('messages:user:1', self.limit), 0)
+
+    def test_keys_are_independent(self):
+        for _ in range(3):
+            self.limiter.take('messages:user:1', self.limit)
+        self.assertGreater(self.limiter.take('messages:user:1', self.limit), 0)
+        self.assertEqual(self.limiter.take('messages:user:2', self.limit), 0)
+        self.assertEqual(self.limiter.take('schedules:user:1', self.limit), 0)
+
+    def test_max_keys(self):
+        limiter = MemoryRateLimiter(max_keys=2)
+        for _ in range(3):
+            limiter.take('messages:user:1', self.limit)
+        limiter.take('messages:user:2', self.limit)
+        limiter.take('messages:user:3', self.limit)
+        # Корзина, которая дольше всех не использовалась, удалена и начинается заново
+        self.assertEqual(limiter.take('messages:user:1', self.limit), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,12 +2,17 @@ import os
 import uuid
 import unittest
 import json
+import datetime
 
+import httpx
 import jwt
 from starlette.requests import Request
 from starlette.datastructures import Headers
 from app.policies.requestenforcer import RequestEnforcer, Service, EnforceResult
 from app.app import get_db
+from app.app import app as gateway_app, app_config
+from app.database import models
+from common.accessfilter import AccessFilter
 
 TEST_POLICIES_CONFIG = os.path.join(
     os.path.dirname(os.path.realpath(__file__)), 'test_policies.yaml'
@@ -78,7 +83,7 @@ def build_request(
 class RequestEnforceTestCase(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self) -> None:
         self.policy_checker: RequestEnforcer = RequestEnforcer(
-            TEST_POLICIES_CONFIG, TEST_JWT_SECRET
+            TEST_POLICIES_CONFIG, TEST_JWT_SECRET, token_cache_size=0
         )
         self.session = next(get_db())
 
@@ -400,6 +405,26 @@ class RequestEnforceTestCase(unittest.IsolatedAsyncioTestCase):
         result = await self.policy_checker.enforce(request, self.session)
         self._assert_access_denied(result, f'Patient GET /chats/{self.outsider_user_id}')
 
+    # batch
+    async def test_batch_filter(self):
+        # Doctor
+        request = self._prepare_request(self.user_id, 2, 'POST', '/authorize')
+        resources = [f'/pages/{self.page_id}', f'/pages/{self.outsider_user_id}', '/unknown', f'/pages/{self.page_id}']
+        result = await self.policy_checker.enforce_batch(request, resources, 'PUT', self.session)
+        self.assertListEqual(result, [f'/pages/{self.page_id}', f'/pages/{self.page_id}'])
+
+        # Patient
+        card_owner_id = '993d8c4b-fbdf-437b-bb1d-c7fae756b9d3'
+        request = self._prepare_request(card_owner_id, 3, 'POST', '/authorize')
+        resources = [f'/pages/card/{self.card_id}', '/pages/card/999999']
+        result = await self.policy_checker.enforce_batch(request, resources, 'GET', self.session)
+        self.assertListEqual(result, [f'/pages/card/{self.card_id}'])
+
+        # Without token
+        request = self._prepare_request(self.user_id, 2, 'POST', '/authorize', make_headers=False)
+        result = await self.policy_checker.enforce_batch(request, [f'/pages/{self.page_id}'], 'PUT', self.session)
+        self.assertListEqual(result, [])
+
     def test_services_list(self):
         expected_services = [USER_SERVICE, TEMPLATE_SERVICE, MEDICAL_CARD_SERVICE, HEALTH_DIARY_SERVICE, RECORD_SERVICE, CHAT_SERVICE]
 
@@ -433,3 +458,65 @@ class RequestEnforceTestCase(unittest.IsolatedAsyncioTestCase):
     def _assert_access_denied(self, result: EnforceResult, errorMessage: str):
         self.assertFalse(result.access_allowed, errorMessage)
         self.assertIsNone(result.redirect_service)
+
+
+class AccessFilterTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Список встреч фильтруется запросом POST /authorize к шлюзу с политиками из policies.yaml
+    """
+
+    async def asyncSetUp(self) -> None:
+        self.session = next(get_db())
+        gateway_app.dependency_overrides[get_db] = lambda: self.session
+
+        self.patient_id = uuid.uuid4()
+        record = models.Records(
+            id=uuid.uuid4(), id_user=self.patient_id, id_doctor=uuid.uuid4(),
+            date=datetime.date.today(), time='10:00', is_online=True
+        )
+        self.own_meeting = models.Meetings(
+            id=uuid.uuid4(), meeting_id=900000000001, record_id=record.id,
+            start_date=datetime.date.today(), start_time='10:00'
+        )
+        self.other_meeting = models.Meetings(
+            id=uuid.uuid4(), meeting_id=900000000002, record_id=uuid.uuid4(),
+            start_date=datetime.date.today(), start_time='11:00'
+        )
+        # Строки не фиксируются и откатываются при закрытии сессии
+        self.session.add(record)
+        self.session.flush()
+        self.session.add_all([self.own_meeting, self.other_meeting])
+        self.session.flush()
+
+        self.access_filter = AccessFilter('http://gateway', transport=httpx.ASGITransport(app=gateway_app))
+
+    async def asyncTearDown(self) -> None:
+        await self.access_filter.close()
+        gateway_app.dependency_overrides.pop(get_db, None)
+        self.session.rollback()
+        self.session.close()
+
+    async def test_patient_sees_own_meetings(self):
+        meetings = [self.own_meeting, self.other_meeting]
+        request = self._prepare_request(self.patient_id, 3)
+        result = await self.access_filter.filter(request, meetings, lambda meeting: f'/meetings/{meeting.meeting_id}')
+        self.assertListEqual(result, [self.own_meeting])
+
+    async def test_doctor_sees_all_meetings(self):
+        meetings = [self.own_meeting, self.other_meeting]
+        request = self._prepare_request(uuid.uuid4(), 2)
+        result = await self.access_filter.filter(request, meetings, lambda meeting: f'/meetings/{meeting.meeting_id}')
+        self.assertListEqual(result, meetings)
+
+    async def test_without_token(self):
+        request = build_request(path='/meetings')
+        result = await self.access_filter.filter(request, [self.own_meeting], lambda meeting: f'/meetings/{meeting.meeting_id}')
+        self.assertListEqual(result, [])
+
+    def _prepare_request(self, user_id: uuid.UUID, group: int) -> Request:
+        token = jwt.encode({
+            'sub': str(user_id),
+            'group_id': group,
+            'aud': ["fastapi-users:auth"]
+        }, key=app_config.jwt_secret.get_secret_value())
+        return build_request(path='/meetings', headers={'authorization': f'Bearer {token}'})
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+import unittest
+
+import jwt
+from starlette.datastructures import Headers
+from starlette.requests import Request
+
+from app.policies.requestenforcer import RequestEnforcer
+from app.resilience import (CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, CircuitBreaker,
+                            ConcurrencyLimiter, ServiceGuard, ServiceUnavailable)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.breaker = CircuitBreaker('medical-card-service', failure_threshold=3, recovery_seconds=0.1)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(failed=True)
+        self.assertEqual(self.breaker.state, CIRCUIT_OPEN)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record(failed=True)
+        self.breaker.record(failed=True)
+        self.breaker.record(failed=False)
+        self.breaker.record(failed=True)
+        self.assertEqual(self.breaker.state, CIRCUIT_CLOSED)
+        self.breaker.record(failed=True)
+        self.breaker.record(failed=True)
+        self.assertEqual(self.breaker.state, CIRCUIT_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_probe_success(self):
+        self.open_breaker()
+        time.sleep(0.11)
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CIRCUIT_HALF_OPEN)
+        # Пока пробный запрос не завершен, остальные запросы отклоняются
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record(failed=False)
+        self.assertEqual(self.breaker.state, CIRCUIT_CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_probe_failure(self):
+        self.open_breaker()
+        time.sleep(0.11)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(failed=True)
+        self.assertEqual(self.breaker.state, CIRCUIT_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_lost_probe(self):
+        self.open_breaker()
+        time.sleep(0.11)
+        self.assertTrue(self.breaker.allow())
+        time.sleep(0.11)
+        self.assertTrue(self.breaker.allow())
+
+    def test_disabled(self):
+        breaker = CircuitBreaker('medical-card-service', failure_threshold=0, recovery_seconds=10)
+        for _ in range(10):
+            breaker.record(failed=True)
+        self.assertTrue(breaker.allow())
+
+
+class ConcurrencyLimiterTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_queue_full(self):
+        limiter = ConcurrencyLimiter('medical-card-service', max_concurrent=1, max_queue=1, queue_timeout=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.waiting, 1)
+
+        with self.assertRaises(ServiceUnavailable) as context:
+            await limiter.acquire()
+        self.assertEqual(context.exception.reason, 'queue_full')
+
+        limiter.release()
+        await waiter
+        self.assertEqual((limiter.active, limiter.waiting), (1, 0))
+
+    async def test_queue_timeout(self):
+        limiter = ConcurrencyLimiter('medical-card-service', max_concurrent=1, max_queue=10, queue_timeout=0.05)
+        await limiter.acquire()
+        with self.assertRaises(ServiceUnavailable) as context:
+            await limiter.acquire()
+        self.assertEqual(context.exception.reason, 'queue_timeout')
+        self.assertEqual((limiter.active, limiter.waiting), (1, 0))
+
+    async def test_unlimited(self):
+        limiter = ConcurrencyLimiter('medical-card-service', max_concurrent=0, max_queue=0, queue_timeout=0)
+        for _ in range(100):
+            await limiter.acquire()
+        self.assertEqual(limiter.active, 100)
+
+
+class ServiceGuardTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_service_is_isolated(self):
+        slow = ServiceGuard(
+            CircuitBreaker('medical-card-service', 5, 10),
+            ConcurrencyLimiter('medical-card-service', max_concurrent=2, max_queue=0, queue_timeout=1)
+        )
+        other = ServiceGuard(
+            CircuitBreaker('template-service', 5, 10),
+            ConcurrencyLimiter('template-service', max_concurrent=2, max_queue=0, queue_timeout=1)
+        )
+        await slow.acquire()
+        await slow.acquire()
+        with self.assertRaises(ServiceUnavailable):
+            await slow.acquire()
+        await other.acquire()
+        self.assertEqual(slow.stats['rejections'], {'queue_full': 1})
+
+    async def test_circuit_open(self):
+        guard = ServiceGuard(
+            CircuitBreaker('medical-card-service', 1, 10),
+            ConcurrencyLimiter('medical-card-service', max_concurrent=10, max_queue=10, queue_timeout=1)
+        )
+        await guard.acquire()
+        guard.record(failed=True)
+        guard.release()
+        with self.assertRaises(ServiceUnavailable):
+            await guard.acquire()
+        self.assertEqual(guard.stats, {
+            'state': CIRCUIT_OPEN, 'active': 0, 'waiting': 0, 'rejections': {'circuit_open': 1}
+        })
+
+
+class RouteTimeoutTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_service_without_timeout(self):
+        config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'test_policies.yaml')
+        secret = '4e7c09ff-f69e-45f0-8285-99f80a289320'
+        enforcer = RequestEnforcer(config_path, secret, token_cache_size=0)
+        token = jwt.encode({
+            'sub': '4ef277c1-94fd-4045-b6a6-c126bc851b0e', 'group_id': 1, 'aud': ['fastapi-users:auth']
+        }, key=secret)
+        request = Request({
+            'type': 'http', 'method': 'GET', 'path': '/templates', 'path_params': {'path_name': 'templates'},
+            'headers': Headers({'authorization': f'Bearer {token}'}).raw, 'query_string': b''
+        })
+        self.assertIsNone(enforcer.policies.services['template-service'].timeout)
+
+        result = await enforcer.enforce(request)
+        self.assertTrue(result.access_allowed)
+        self.assertEqual(result.service_name, 'template-service')
+        # Без ограничения в политике и у сервиса используется общее время ожидания шлюза
+        self.assertIsNone(result.timeout)
+
+
+if __name__ == '__main__':
+    unittest.main()
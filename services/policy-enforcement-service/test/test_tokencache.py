@@ -0,0 +1,66 @@
+import time
+import unittest
+
+import jwt
+
+from app.policies.tokencache import JWT_AUDIENCE, TokenCache
+
+JWT_SECRET = '4e7c09ff-f69e-45f0-8285-99f80a289320'
+
+USER_ID = '4ef277c1-94fd-4045-b6a6-c126bc851b0e'
+
+
+def make_token(secret: str = JWT_SECRET, **claims) -> str:
+    return jwt.encode({'sub': USER_ID, 'group_id': 3, 'aud': JWT_AUDIENCE, **claims}, key=secret)
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = TokenCache(JWT_SECRET, max_size=2)
+
+    def test_decode(self):
+        token = make_token()
+        self.assertEqual(self.cache.decode(token)['group_id'], 3)
+        self.assertEqual(self.cache.decode(token)['sub'], USER_ID)
+        self.assertEqual(self.cache.stats['hits'], 1)
+        self.assertEqual(self.cache.stats['misses'], 1)
+
+    def test_returns_copy(self):
+        token = make_token()
+        self.cache.decode(token)['group_id'] = 1
+        self.assertEqual(self.cache.decode(token)['group_id'], 3)
+
+    def test_invalid_token(self):
+        for token in ('invalid', make_token(secret='other'), make_token(aud=['other'])):
+            for _ in range(2):
+                with self.assertRaises(jwt.InvalidTokenError):
+                    self.cache.decode(token)
+            self.cache.clear()
+        self.assertEqual(self.cache.stats['rejections'], 3)
+
+    def test_expiration(self):
+        token = make_token(exp=int(time.time()) + 1)
+        self.cache.decode(token)
+        time.sleep(1.1)
+        with self.assertRaises(jwt.ExpiredSignatureError):
+            self.cache.decode(token)
+
+    def test_ttl(self):
+        cache = TokenCache(JWT_SECRET, max_size=2, ttl=0)
+        token = make_token()
+        cache.decode(token)
+        cache.decode(token)
+        self.assertEqual(cache.stats['misses'], 2)
+
+    def test_max_size(self):
+        tokens = [make_token(group_id=group_id) for group_id in (1, 2, 3)]
+        for token in tokens:
+            self.cache.decode(token)
+        self.cache.decode(tokens[2])
+        self.cache.decode(tokens[0])
+        self.assertEqual(self.cache.stats['size'], 2)
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
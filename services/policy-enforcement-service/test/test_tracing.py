@@ -0,0 +1,121 @@
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from common.tracing import Exporter, NoneExporter, SpanContext, Tracer, parse_traceparent, tracer
+from common.instrumentation import DB_QUERY_DURATION, instrument_sqlalchemy
+
+
+class MemoryExporter(Exporter):
+    def __init__(self) -> None:
+        self.batches = []
+
+    def export(self, spans: list[dict]) -> None:
+        self.batches.append(spans)
+
+
+class TracingTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.exporter = MemoryExporter()
+        self.tracer = Tracer()
+        self.tracer.configure('policy-enforcement-service', self.exporter, 1.0)
+
+    def test_parse_traceparent(self):
+        context = parse_traceparent('00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01')
+        self.assertEqual(context.trace_id, '0af7651916cd43dd8448eb211c80319c')
+        self.assertEqual(context.span_id, 'b7ad6b7169203331')
+        self.assertTrue(context.sampled)
+        self.assertEqual(context.traceparent, '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01')
+
+    def test_parse_invalid_traceparent(self):
+        self.assertIsNone(parse_traceparent(None))
+        self.assertIsNone(parse_traceparent('invalid'))
+        self.assertIsNone(parse_traceparent('00-00000000000000000000000000000000-b7ad6b7169203331-01'))
+        self.assertIsNone(parse_traceparent('01-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'))
+
+    def test_child_spans_are_exported_with_root(self):
+        with self.tracer.span('GET /cards', kind='server') as root:
+            with self.tracer.child_span('policy.enforce') as child:
+                pass
+
+        self.assertEqual(len(self.exporter.batches), 1)
+        spans = self.exporter.batches[0]
+        self.assertEqual([span['name'] for span in spans], ['policy.enforce', 'GET /cards'])
+        self.assertEqual(spans[0]['trace_id'], root.context.trace_id)
+        self.assertEqual(spans[0]['parent_id'], root.context.span_id)
+        self.assertEqual(spans[0]['span_id'], child.context.span_id)
+        self.assertIsNone(spans[1]['parent_id'])
+
+    def test_remote_parent(self):
+        parent = SpanContext('0af7651916cd43dd8448eb211c80319c', 'b7ad6b7169203331', True)
+        with self.tracer.span('GET /cards', kind='server', parent=parent):
+            pass
+
+        span = self.exporter.batches[0][0]
+        self.assertEqual(span['trace_id'], parent.trace_id)
+        self.assertEqual(span['parent_id'], parent.span_id)
+
+    def test_child_span_without_trace(self):
+        with self.tracer.child_span('policy.enforce') as span:
+            self.assertIsNone(span)
+        self.assertEqual(self.exporter.batches, [])
+
+    def test_not_sampled(self):
+        self.tracer.configure('policy-enforcement-service', self.exporter, 0.0)
+        with self.tracer.span('GET /cards', kind='server') as span:
+            headers = self.tracer.inject_headers([])
+        self.assertEqual(self.exporter.batches, [])
+        self.assertEqual(headers, [(b'traceparent', span.context.traceparent.encode())])
+        self.assertTrue(headers[0][1].endswith(b'-00'))
+
+    def test_error_status(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span('GET /cards', kind='server'):
+                raise ValueError('error')
+
+        span = self.exporter.batches[0][0]
+        self.assertEqual(span['status'], 'error')
+        self.assertEqual(span['attributes']['error.type'], 'ValueError')
+
+    def test_inject_headers(self):
+        headers = [(b'authorization', b'Bearer token'), (b'traceparent', b'00-forged')]
+        with self.tracer.span('upstream', kind='client') as span:
+            result = self.tracer.inject_headers(headers)
+
+        self.assertEqual(result, [
+            (b'authorization', b'Bearer token'),
+            (b'traceparent', span.context.traceparent.encode())
+        ])
+
+
+class SqlAlchemyHooksTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.exporter = MemoryExporter()
+        tracer.configure('policy-enforcement-service', self.exporter, 1.0)
+
+    def tearDown(self) -> None:
+        tracer.configure('unknown', NoneExporter(), 1.0)
+
+    def select_count(self) -> int:
+        for line in DB_QUERY_DURATION.samples():
+            if line.startswith('db_query_duration_seconds_count{operation="select"}'):
+                return int(line.rsplit(' ', 1)[1])
+        return 0
+
+    def test_metrics_and_spans_share_listeners(self):
+        # Длительность запроса в метриках и span запроса фиксируют одни и те же обработчики событий движка
+        instrument_sqlalchemy()
+        engine = create_engine('sqlite://')
+        before = self.select_count()
+        with tracer.span('GET /cards', kind='server'):
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+
+        self.assertEqual(self.select_count(), before + 1)
+        spans = self.exporter.batches[0]
+        self.assertEqual([span['name'] for span in spans], ['db.select', 'GET /cards'])
+        self.assertEqual(spans[0]['attributes']['db.statement'], 'SELECT 1')
+
+
+if __name__ == '__main__':
+    unittest.main()
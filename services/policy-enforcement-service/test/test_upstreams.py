@@ -0,0 +1,148 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.policies.policiesconfig import Service
+from app.upstreams import UpstreamPool, UpstreamRegistry
+
+
+def make_stub_app(health_status: int) -> Starlette:
+    async def health(request):
+        return PlainTextResponse('ok', status_code=health_status)
+
+    return Starlette(routes=[Route('/health', health)])
+
+
+class StubServer:
+    """
+    Реплика сервиса: uvicorn в отдельном потоке на свободном порту
+    """
+
+    def __init__(self, health_status: int = 200) -> None:
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(('127.0.0.1', 0))
+        self.url = f'http://127.0.0.1:{self.socket.getsockname()[1]}/'
+        self.server = uvicorn.Server(uvicorn.Config(make_stub_app(health_status), log_level='error'))
+        self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [self.socket]}, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+        self.socket.close()
+
+
+class UpstreamPoolTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.service = Service(
+            name='record-service',
+            endpoints=['http://127.0.0.1:8004/', 'http://127.0.0.1:8014/', 'http://127.0.0.1:8024/']
+        )
+
+    def test_entrypoint(self):
+        self.assertEqual(self.service.entrypoint.unicode_string(), 'http://127.0.0.1:8004/')
+        service = Service(name='record-service', entrypoint='http://127.0.0.1:8004/')
+        self.assertEqual(service.endpoint_list, ['http://127.0.0.1:8004/'])
+        with self.assertRaises(ValueError):
+            Service(name='record-service')
+
+    def test_least_outstanding(self):
+        pool = UpstreamPool(self.service)
+        endpoints = [pool.acquire() for _ in range(6)]
+        self.assertEqual([e.outstanding for e in pool.endpoints], [2, 2, 2])
+
+        pool.release(endpoints[0])
+        self.assertIs(pool.acquire(), endpoints[0])
+
+    def test_power_of_two_choices(self):
+        pool = UpstreamPool(self.service, strategy='p2c')
+        busy = pool.endpoints[0]
+        busy.outstanding = 10
+        for _ in range(20):
+            self.assertIsNot(pool.choose(), busy)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            UpstreamPool(self.service, strategy='random')
+
+    def test_ejection(self):
+        pool = UpstreamPool(self.service, failure_threshold=2, eject_seconds=60)
+        failing = pool.endpoints[1]
+        for _ in range(2):
+            pool.record(failing, 0.01, failed=True)
+        self.assertNotIn(failing, {pool.acquire() for _ in range(10)})
+
+        failing.ejected_until = 0
+        self.assertIn(failing, {pool.acquire() for _ in range(10)})
+
+    def test_all_endpoints_ejected(self):
+        pool = UpstreamPool(self.service, failure_threshold=1)
+        for endpoint in pool.endpoints:
+            pool.record(endpoint, 0.01, failed=True)
+        self.assertIn(pool.choose(), pool.endpoints)
+
+    def test_latency(self):
+        pool = UpstreamPool(self.service)
+        pool.record(pool.endpoints[0], 0.1, failed=False)
+        pool.record(pool.endpoints[0], 0.2, failed=False)
+        stats = pool.stats[0]
+        self.assertEqual(stats['requests'], 2)
+        self.assertAlmostEqual(stats['latency_ms'], 120)
+
+
+class HealthCheckTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.servers = [StubServer(), StubServer(), StubServer(health_status=503)]
+        for server in self.servers:
+            server.start()
+
+    def tearDown(self) -> None:
+        for server in self.servers:
+            if server.thread.is_alive():
+                server.stop()
+
+    async def test_health_check(self):
+        service = Service(
+            name='record-service', endpoints=[s.url for s in self.servers], health_check='health'
+        )
+        registry = UpstreamRegistry([service], failure_threshold=1)
+        pool = registry.get('record-service')
+
+        await registry.check_health(timeout=1)
+        self.assertEqual([e.healthy for e in pool.endpoints], [True, True, False])
+        self.assertNotIn(self.servers[2].url, {pool.acquire().url for _ in range(10)})
+
+        self.servers[1].stop()
+        await registry.check_health(timeout=1)
+        self.assertEqual([e.healthy for e in pool.endpoints], [True, False, False])
+        self.assertEqual({pool.acquire().url for _ in range(10)}, {self.servers[0].url})
+
+    async def test_background_checks(self):
+        service = Service(name='record-service', endpoints=[self.servers[2].url], health_check='health')
+        registry = UpstreamRegistry([service], failure_threshold=2)
+
+        registry.start(interval=0.05, timeout=1)
+        try:
+            for _ in range(100):
+                if not registry.get('record-service').endpoints[0].healthy:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await registry.stop()
+        self.assertFalse(registry.stats['record-service'][0]['healthy'])
+
+
+if __name__ == '__main__':
+    unittest.main()
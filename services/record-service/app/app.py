@@ -6,13 +6,15 @@ import asyncio
 from fastapi import FastAPI, Depends, HTTPException
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from common.instrumentation import setup_metrics
+from common.tracing import setup_tracing
 from .schemas import (Record,
                       RecordIn,
                       RecordOptional,
                       ScheduleIn,
                       Schedule,
                       ScheduleOptional)
-from .database import DB_INITIALIZER, get_async_session
+from .database import DB_INITIALIZER, get_async_session, make_engine_options, pool_monitor
 from . import crud, config
 
 description = """"""
@@ -34,6 +36,9 @@ app = FastAPI(title='Record Service',
               description=description,
               openapi_tags=tags_metadata)
 
+setup_metrics(app, pool_monitor)
+setup_tracing(app, cfg, 'record-service')
+
 locale.setlocale(locale.LC_ALL, '')
 
 
@@ -149,10 +154,16 @@ async def delete_schedule(schedule_id: int, db: AsyncSession = Depends(get_async
     return deleted_schedule
 
 
+@app.get('/metrics/db-pool', summary='Возвращает статистику пула соединений с базой данных', tags=["metrics"])
+async def get_db_pool_metrics():
+    return pool_monitor.stats
+
+
 @app.on_event("startup")
 async def on_startup():
     await DB_INITIALIZER.init_database(
-        cfg.postgres_dsn_async.unicode_string()
+        cfg.postgres_dsn_async.unicode_string(),
+        **make_engine_options(cfg)
     )
 
     asyncio.create_task(delete_old_records())
@@ -1,3 +1,4 @@
 from .database import DatabaseInitializer, DB_INITIALIZER, get_async_session
+from common.pool import make_engine_options, pool_monitor
 
-__all__ = [DatabaseInitializer, DB_INITIALIZER, get_async_session]
+__all__ = [DatabaseInitializer, DB_INITIALIZER, get_async_session, make_engine_options, pool_monitor]
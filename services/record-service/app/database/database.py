@@ -3,14 +3,17 @@ from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
+from common.pool import pool_monitor
+
 
 class DatabaseInitializer:
     def __init__(self, base) -> None:
         self.__base = base
         self.__async_session_maker = None
 
-    async def init_database(self, postgres_dsn):
-        engine = create_async_engine(postgres_dsn)
+    async def init_database(self, postgres_dsn, **engine_options):
+        engine = create_async_engine(postgres_dsn, **engine_options)
+        pool_monitor.attach(engine)
         self.__async_session_maker = async_sessionmaker(
             engine, expire_on_commit=False
         )
@@ -1,10 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from common.httpcache import make_etag, make_response
+from common.instrumentation import register_cache_metrics, setup_metrics
+from common.tracing import setup_tracing
 
 from .schemas import Template, TemplateIn
-from .database import DB_INITIALIZER
-from . import crud, config
+from .database import DB_INITIALIZER, get_async_session, make_engine_options, pool_monitor
+from . import crud, config, templatecache
 
 
 description = """
@@ -35,52 +38,68 @@ tags_metadata = [
 ]
 
 cfg: config.Config = config.load_config()
-SessionLocal = DB_INITIALIZER.init_database(str(cfg.postgres_dsn))
 
 app = FastAPI(title='Template Service',
               description=description,
               openapi_tags=tags_metadata)
 
+setup_metrics(app, pool_monitor)
+register_cache_metrics('template_cache', 'шаблоны и список шаблонов', templatecache.template_cache)
+setup_tracing(app, cfg, 'template-service')
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+@app.on_event("startup")
+async def on_startup():
+    await DB_INITIALIZER.init_database(
+        cfg.postgres_dsn_async.unicode_string(),
+        **make_engine_options(cfg)
+    )
 
 
 @app.post('/templates', response_model=Template, summary='Добавляет шаблон в базу', tags=["templates"])
-def add_template(
+async def add_template(
         template_in: TemplateIn,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_session)
 ):
-    return crud.create_template(db, template_in)
+    return await crud.create_template(db, template_in)
 
 
 @app.get('/templates/{template_id}', response_model=Template, summary='Возвращает шаблон', tags=["templates"])
-def get_template(template_id: int, db: Session = Depends(get_db)):
-    template = crud.get_template(db, template_id)
-    if template is None:
-        raise HTTPException(status_code=404, detail="Шаблон не найден")
-    return template
+async def get_template(template_id: int, request: Request, db: AsyncSession = Depends(get_async_session)):
+    cache = templatecache.template_cache
+    entry = cache.get(template_id)
+    if entry is None:
+        generation = cache.generation
+        template = await crud.get_template(db, template_id)
+        if template is None:
+            raise HTTPException(status_code=404, detail="Шаблон не найден")
+        body = templatecache.dump_json(templatecache.make_template_dict(template))
+        entry = cache.set(template_id, generation, body, templatecache.make_template_etag(template))
+    return make_response(entry, request)
 
 
 @app.get('/templates',
          response_model=list[Template],
          summary='Возвращает список всех шаблонов',
          tags=["templates"])
-def get_templates(db: Session = Depends(get_db)):
-    return crud.get_templates(db)
+async def get_templates(request: Request, db: AsyncSession = Depends(get_async_session)):
+    cache = templatecache.template_cache
+    entry = cache.get(None)
+    if entry is None:
+        generation = cache.generation
+        templates = await crud.get_templates(db)
+        body = templatecache.dump_json([templatecache.make_template_dict(t) for t in templates])
+        entry = cache.set(None, generation, body, make_etag(body))
+    return make_response(entry, request)
 
 
 @app.put('/templates/{template_id}', response_model=Template, summary='Обновляет шаблон', tags=["templates"])
-def update_template(
+async def update_template(
         template_id: int,
         template_in: TemplateIn,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_session)
     ):
-    template = crud.update_template(db, template_id, template_in)
+    template = await crud.update_template(db, template_id, template_in)
     if template is None:
         raise HTTPException(status_code=404, detail="Шаблон не найден")
     return template
@@ -92,8 +111,13 @@ def update_template(
     summary='Удаляет шаблон из базы',
     tags=["templates"]
     )
-def delete_template(template_id: int, db: Session = Depends(get_db)):
-    deleted_template = crud.delete_template(db, template_id)
+async def delete_template(template_id: int, db: AsyncSession = Depends(get_async_session)):
+    deleted_template = await crud.delete_template(db, template_id)
     if deleted_template is None:
         raise HTTPException(status_code=404, detail="Шаблон не найден")
     return deleted_template
+
+
+@app.get('/metrics/db-pool', summary='Возвращает статистику пула соединений с базой данных', tags=["metrics"])
+async def get_db_pool_metrics():
+    return pool_monitor.stats
@@ -1,13 +1,12 @@
-import os
-import uuid
-
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from .database import models
 from .schemas import TemplateIn
+from .templatecache import template_cache
 
 
-def create_template(
-        db: Session, template_in: TemplateIn
+async def create_template(
+        db: AsyncSession, template_in: TemplateIn
     ) -> models.Template:
     """
     Создает новый шаблон в БД
@@ -17,56 +16,65 @@ def create_template(
     )
 
     db.add(db_template)
-    db.commit()
-    db.refresh(db_template)
+    await db.commit()
+    await db.refresh(db_template)
+    template_cache.invalidate(db_template.id)
     return db_template
 
 
-def get_templates(db: Session) -> list[models.Template]:
+async def get_templates(db: AsyncSession) -> list[models.Template]:
     """
     Возвращает все шаблоны
     """
-    return db.query(models.Template).order_by(models.Template.name).all()
+    result = await db.execute(select(models.Template).order_by(models.Template.name))
+    return result.scalars().all()
 
 
-def get_template(
-        db: Session, template_id: int
+async def get_template(
+        db: AsyncSession, template_id: int
     ) -> models.Template | None:
     """
     Возвращает конкретный шаблон
     """
-    return db.query(models.Template) \
-            .filter(models.Template.id == template_id) \
-            .first()
+    result = await db.execute(select(models.Template) \
+                              .filter(models.Template.id == template_id) \
+                              .limit(1)
+                              )
+    return result.scalars().one_or_none()
 
 
-def update_template(
-        db: Session, template_id: int, template_in: TemplateIn
+async def update_template(
+        db: AsyncSession, template_id: int, template_in: TemplateIn
     ) -> models.Template | None:
     """
-    Обновляет информацию о шаблоне
+    Обновляет информацию о шаблоне и увеличивает его версию
     """
-    result = db.query(models.Template) \
-        .filter(models.Template.id == template_id) \
-        .update(template_in.model_dump())
-    db.commit()
+    result = await db.execute(update(models.Template) \
+                              .where(models.Template.id == template_id) \
+                              .values(**template_in.model_dump(), version=models.Template.version + 1)
+                              )
+    await db.commit()
+    template_cache.invalidate(template_id)
 
-    if result == 1:
-        return get_template(db, template_id)
+    if result.rowcount == 1:
+        return await get_template(db, template_id)
     return None
 
 
-def delete_template(
-        db: Session, template_id: int
+async def delete_template(
+        db: AsyncSession, template_id: int
     ) -> models.Template | None:
     """
-    Удаляет информацию о шаблоне
+    Удаляет информацию о шаблоне и увеличивает его версию
     """
-    deleted_template = get_template(db, template_id)
+    deleted_template = await get_template(db, template_id)
     if deleted_template is None:
         return None
 
     deleted_template.is_deleted = True
-    db.commit()
+    deleted_template.version = models.Template.version + 1
+    await db.commit()
+    await db.refresh(deleted_template)
+    template_cache.invalidate(template_id)
 
     return deleted_template
@@ -11,3 +11,4 @@ class Template(Base):
     name = Column(String, nullable=False)
     structure = Column(ARRAY(JSONB), nullable=False)
     is_deleted = Column(Boolean, default=False)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
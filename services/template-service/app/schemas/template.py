@@ -52,6 +52,7 @@ class Template(TemplateBase):
     """
     id: int = Field(title='Идентификатор шаблона')
     is_deleted: bool
+    version: int = Field(title='Версия шаблона, увеличивается при каждом изменении')
 
 
 class TemplateIn(TemplateBase):
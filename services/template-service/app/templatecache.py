@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from common.httpcache import CacheEntry, make_entry
+
+from . import config
+from .database import models
+
+
+cfg: config.Config = config.load_config()
+
+
+class TemplateCache:
+    """
+    LRU-кэш сериализованных шаблонов. Хранит готовые байты ответа, поэтому
+    повторное чтение шаблона не требует ни запроса к базе, ни валидации структуры.
+    Счетчик записей увеличивается при любом изменении шаблонов, поэтому данные,
+    прочитанные из базы до изменения, не попадут в кэш после него.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+        self.__generation = 0
+        self.__entries: OrderedDict[int | None, CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        with self.__lock:
+            return self.__generation
+
+    def get(self, template_id: int | None) -> CacheEntry | None:
+        """
+        Возвращает сериализованный шаблон (или список шаблонов для None) из кэша
+        """
+        with self.__lock:
+            entry = self.__entries.get(template_id)
+            if entry is None or entry.expire_at < time.monotonic():
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(template_id)
+            self.hits += 1
+            return entry
+
+    def set(self, template_id: int | None, generation: int, body: bytes, etag: str) -> CacheEntry:
+        """
+        Сохраняет сериализованный шаблон, если с момента чтения шаблоны не изменялись
+        """
+        entry = make_entry(body, self.ttl, etag)
+        with self.__lock:
+            if self.__generation == generation:
+                self.__entries[template_id] = entry
+                self.__entries.move_to_end(template_id)
+                while len(self.__entries) > self.max_size:
+                    self.__entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, template_id: int) -> None:
+        """
+        Сбрасывает шаблон и список шаблонов
+        """
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.pop(template_id, None)
+            self.__entries.pop(None, None)
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.__entries),
+            "generation": self.__generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+def make_template_dict(db_template: models.Template) -> dict:
+    # Структура проверяется схемой TemplateIn при записи,
+    # поэтому при чтении она отдается как есть
+    return {
+        "name": db_template.name,
+        "structure": db_template.structure,
+        "id": db_template.id,
+        "is_deleted": bool(db_template.is_deleted),
+        "version": db_template.version
+    }
+
+
+def dump_json(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def make_template_etag(db_template: models.Template) -> str:
+    return f'"{db_template.id}-{db_template.version}"'
+
+
+template_cache: TemplateCache = TemplateCache(
+    ttl=cfg.template_cache_ttl, max_size=cfg.template_cache_max_size
+)
@@ -1 +1 @@
-sudo docker build -t medical-system/template-service:0.0.1 . --network=host
\ No newline at end of file
+sudo docker build -t medical-system/template-service:0.0.1 -f Dockerfile .. --network=host
\ No newline at end of file
@@ -3,19 +3,25 @@ import os
 import pathlib
 import uuid
 import asyncio
+from typing import Literal
 from datetime import datetime, timezone, timedelta
 
-from fastapi import Depends, FastAPI, HTTPException, UploadFile, APIRouter, Request
+from fastapi import Depends, FastAPI, HTTPException, UploadFile, APIRouter, Request, Response, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
-from pydantic import ValidationError
+from pydantic import TypeAdapter, ValidationError
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from common import pool, seeder
+from common.httpcache import make_entry, make_response
+from common.instrumentation import register_cache_metrics, setup_metrics
+from common.tracing import setup_tracing
+
 from . import config, users
 from .users import schemas
-from .users.database import database
+from .users.database import database, models
 from .users.userapp import fastapi_users
 
 
@@ -61,8 +67,19 @@ app = FastAPI(title='User Service',
               description=description,
               openapi_tags=tags_metadata)
 
+setup_metrics(app, pool.pool_monitor)
+register_cache_metrics('user_cache', 'пользователи из JWT', users.usercache.user_cache)
+register_cache_metrics('reference_cache', 'справочники', users.referencecache.reference_cache)
+setup_tracing(app, app_config, 'user-service')
+
 ROOT_SERVICE_DIR = pathlib.Path(__file__).parent.parent.resolve()
 
+GROUP_LIST_ADAPTER = TypeAdapter(list[schemas.group.GroupRead])
+SPECIALIZATION_LIST_ADAPTER = TypeAdapter(list[schemas.specialization.Specialization])
+
+# Размер страницы списка пользователей, если передан только cursor
+DEFAULT_PAGE_SIZE = 100
+
 users.inject_secrets(
     jwt_secret=app_config.jwt_secret.get_secret_value(),
     verification_token_secret=app_config.verification_token_secret.get_secret_value(),
@@ -101,12 +118,24 @@ async def add_group(
     tags=['user-groups']
     )
 async def get_group_list(
+    request: Request,
     session: AsyncSession = Depends(database.get_async_session),
     skip: int = 0,
     limit: int = 100
     ):
 
-    return await users.groupcrud.get_groups(session, skip, limit)
+    cache = users.referencecache.reference_cache
+    # Кэшируется только страница по умолчанию, иначе произвольные skip и limit вытесняли бы ее из кэша
+    cached = (skip, limit) == (0, 100)
+    entry = cache.get('groups') if cached else None
+    if entry is None:
+        version = cache.version('groups')
+        groups = await users.groupcrud.get_groups(session, skip, limit)
+        body = GROUP_LIST_ADAPTER.dump_json(GROUP_LIST_ADAPTER.validate_python(groups, from_attributes=True))
+        if not cached:
+            return make_response(make_entry(body), request)
+        entry = cache.set('groups', None, version, body)
+    return make_response(entry, request)
 
 
 @app.get("/groups/{group_id}", summary='Возвращает информацию о группе пользователей', tags=['user-groups'])
@@ -150,9 +179,18 @@ async def delete_group(
     summary="Возвращает список врачей конкретной специализации", tags=["users"]
     )
 async def get_doctors_of_specialization(
-    specialization_id: int, session: AsyncSession = Depends(database.get_async_session)
+    specialization_id: int,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(database.get_async_session)
     ):
-    return await users.crud_user.get_doctors_of_specialization(specialization_id, session)
+    limit = get_page_size(limit, cursor)
+    doctors = await users.crud_user.get_doctors_of_specialization(
+        specialization_id, session, limit, parse_cursor(cursor)
+    )
+    set_next_cursor(response, doctors, limit)
+    return doctors
 
 
 @app.patch(
@@ -166,13 +204,8 @@ async def update_user_image(
     current_user: schemas.user.UserRead = Depends(fastapi_users.current_user(active=True, verified=True)),
     session: AsyncSession = Depends(database.get_async_session)
 ):
-    if file.content_type not in ['image/png', 'image/jpeg']:
-        raise HTTPException(status_code=400, detail="Недопустимый тип файла")
-    file_path = current_user.img
-    if file_path is not None:
-        os.remove(file_path)
-    file_path = make_path_to_file(app_config.path_to_storage, file.filename)
-    make_img_file(file_path, file)
+    file_path = await make_img_file(file)
+    await remove_img_file(current_user.img, current_user.id, session, keep=file_path)
     return await users.crud_user.update_img(file_path, current_user.id, session)
 
 
@@ -186,9 +219,7 @@ async def delete_user_image(
     current_user: schemas.user.UserRead = Depends(fastapi_users.current_user(active=True, verified=True)),
     session: AsyncSession = Depends(database.get_async_session)
 ):
-    file_path = current_user.img
-    if file_path is not None:
-        os.remove(file_path)
+    await remove_img_file(current_user.img, current_user.id, session)
     return await users.crud_user.update_img(None, current_user.id, session)
 
 
@@ -207,13 +238,8 @@ async def update_user_image_by_id(
     user = await users.crud_user.get_user(id, session)
     if user is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    if file.content_type not in ['image/png', 'image/jpeg']:
-        raise HTTPException(status_code=400, detail="Недопустимый тип файла")
-    file_path = user.img
-    if file_path is not None:
-        os.remove(file_path)
-    file_path = make_path_to_file(app_config.path_to_storage, file.filename)
-    make_img_file(file_path, file)
+    file_path = await make_img_file(file)
+    await remove_img_file(user.img, user.id, session, keep=file_path)
     return await users.crud_user.update_img(file_path, user.id, session)
 
 
@@ -231,9 +257,7 @@ async def delete_user_image_by_id(
     user = await users.crud_user.get_user(id, session)
     if user is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    file_path = user.img
-    if file_path is not None:
-        os.remove(file_path)
+    await remove_img_file(user.img, user.id, session)
     return await users.crud_user.update_img(None, user.id, session)
 
 
@@ -363,9 +387,33 @@ async def delete_user(
     tags=["users"]
     )
 async def get_list_users(
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    search: str | None = Query(None, min_length=1, max_length=128),
     session: AsyncSession = Depends(database.get_async_session)
     ):
-    return await users.crud_user.get_users_list(session)
+    limit = get_page_size(limit, cursor)
+    users_list = await users.crud_user.get_users_list(session, limit, parse_cursor(cursor), search)
+    set_next_cursor(response, users_list, limit)
+    return users_list
+
+
+@app.get(
+    "/users/all/summary/export",
+    summary="Выгружает список всех пользователей в формате NDJSON",
+    dependencies=[Depends(fastapi_users.current_user(active=True, verified=True))],
+    tags=["users"]
+    )
+async def export_list_users(
+    search: str | None = Query(None, min_length=1, max_length=128),
+    session: AsyncSession = Depends(database.get_async_session)
+    ):
+    async def make_lines():
+        async for user in users.crud_user.stream_users_list(session, search):
+            yield schemas.user.UserReadSummary(**user).model_dump_json() + "\n"
+
+    return StreamingResponse(make_lines(), media_type="application/x-ndjson")
 
 
 @app.post(
@@ -389,12 +437,24 @@ async def add_specialization(
     tags=['specialization']
     )
 async def get_specialization_list(
+    request: Request,
     session: AsyncSession = Depends(database.get_async_session),
     skip: int = 0,
     limit: int = 100
     ):
 
-    return await users.crud_specialization.get_specialization_list(session, skip, limit)
+    cache = users.referencecache.reference_cache
+    # Кэшируется только страница по умолчанию, иначе произвольные skip и limit вытесняли бы ее из кэша
+    cached = (skip, limit) == (0, 100)
+    entry = cache.get('specializations') if cached else None
+    if entry is None:
+        version = cache.version('specializations')
+        specializations = await users.crud_specialization.get_specialization_list(session, skip, limit)
+        body = SPECIALIZATION_LIST_ADAPTER.dump_json(SPECIALIZATION_LIST_ADAPTER.validate_python(specializations, from_attributes=True))
+        if not cached:
+            return make_response(make_entry(body), request)
+        entry = cache.set('specializations', None, version, body)
+    return make_response(entry, request)
 
 
 @app.get("/specializations/{specialization_id}",
@@ -483,15 +543,25 @@ async def check_confirm_code(
     "/storage/{file_name}",
     summary="Возвращает изображение пользователя",
     tags=["users"])
-async def serve_user_static_file(file_name: str):
+async def serve_user_static_file(
+    file_name: str,
+    request: Request,
+    size: Literal["small", "medium", "large"] | None = None
+):
     user_storage = os.path.join(ROOT_SERVICE_DIR, "storage")
+    if size is not None and users.imagestorage.is_hashed_file_name(file_name):
+        extension = "webp" if "image/webp" in request.headers.get("accept", "") else "jpg"
+        file_name = users.imagestorage.make_variant_name(file_name, size, extension)
     file_path = os.path.join(user_storage, file_name)
 
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Файл не найден")
 
-    return FileResponse(file_path)
-    
+    headers = None
+    if users.imagestorage.is_hashed_file_name(file_name):
+        # Имя файла определяется его содержимым, поэтому файл можно кэшировать бессрочно
+        headers = {"Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept"}
+    return FileResponse(file_path, headers=headers)
 
 
 @app.get(
@@ -508,49 +578,98 @@ async def serve_spec_static_file(file_name: str):
     return FileResponse(file_path)
 
 
+@app.get(
+    "/metrics/db-pool",
+    summary="Возвращает статистику пула соединений с базой данных",
+    tags=["metrics"])
+async def get_db_pool_stats():
+    return pool.pool_monitor.stats
+
+
 @app.on_event("startup")
 async def on_startup():
     await database.DB_INITIALIZER.init_database(
-        app_config.postgres_dsn_async.unicode_string()
+        app_config.postgres_dsn_async.unicode_string(),
+        **pool.make_engine_options(app_config)
+    )
+
+    await seed_reference_table(
+        app_config.default_groups_config_path,
+        models.Group,
+        schemas.group.GroupUpsert,
+        update_columns=["name"],
+        cache_name="groups"
+    )
+    await seed_reference_table(
+        app_config.default_specializations_config_path,
+        models.Specialization,
+        schemas.specialization.SpecializationUpsert,
+        update_columns=["name", "img"],
+        cache_name="specializations"
     )
 
-    groups = []
-    with open(app_config.default_groups_config_path, encoding="utf-8") as f:
-        groups = json.load(f)   
+    asyncio.create_task(delete_old_confirmation_codes())        
 
-    async for session in database.get_async_session():
-        for group in groups:
-            await users.groupcrud.upsert_group(
-                session, schemas.group.GroupUpsert(**group)
-            )
 
-    specializations = []
-    with open(app_config.default_specializations_config_path, encoding="utf-8") as f:
-        specializations = json.load(f) 
+async def seed_reference_table(path_to_file, model, schema, update_columns: list[str], cache_name: str):
+    with open(path_to_file, "rb") as f:
+        content = f.read()
+
+    def load_tables(content: bytes) -> list[seeder.SeedTable]:
+        rows = [schema(**item).model_dump() for item in json.loads(content)]
+        return [seeder.SeedTable(model, rows, update_columns)]
 
     async for session in database.get_async_session():
-        for specialization in specializations:
-            await users.crud_specialization.upsert_specialization(
-                session, schemas.specialization.SpecializationUpsert(**specialization)
-            )
+        seed_name = f"user-service:{model.__tablename__}"
+        if await seeder.seed(session, models.SeedHash, seed_name, content, load_tables):
+            users.referencecache.reference_cache.invalidate(cache_name)
 
-    asyncio.create_task(delete_old_confirmation_codes())        
+
+def parse_cursor(cursor: str | None):
+    if cursor is None:
+        return None
+    try:
+        return users.crud_user.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def get_page_size(limit: int | None, cursor: str | None) -> int | None:
+    # Без limit и cursor список возвращается целиком, как до появления постраничной выдачи
+    if limit is None and cursor is None:
+        return None
+    return limit if limit is not None else DEFAULT_PAGE_SIZE
 
 
-def make_path_to_file(path_to_storage, file_name):
-    extension = pathlib.Path(file_name).suffix
-    path_to_file = os.path.join(path_to_storage, str(uuid.uuid4()) + extension)
-    return path_to_file
+def set_next_cursor(response: Response, users_list: list[dict], limit: int | None):
+    if limit is not None and len(users_list) == limit:
+        last_user = users_list[-1]
+        response.headers["X-Next-Cursor"] = users.crud_user.encode_cursor(last_user["surname"], last_user["id"])
 
 
-def make_img_file(path_to_file, file):
+async def make_img_file(file: UploadFile) -> str:
+    if file.content_type not in ['image/png', 'image/jpeg', 'image/webp']:
+        raise HTTPException(status_code=400, detail="Недопустимый тип файла")
+    content = await file.read()
     try:
-        with open(path_to_file, 'wb') as out_file:
-            out_file.write(file.file.read())
-    except Exception:
+        return await users.imagestorage.save_user_image(content, app_config.path_to_storage)
+    except users.imagestorage.InvalidImageError:
+        raise HTTPException(status_code=400, detail="Некорректное изображение")
+    except OSError:
         raise HTTPException(status_code=500, detail="Ошибка при работе с файлом")
 
 
+async def remove_img_file(
+    file_path: str | None, user_id: uuid.UUID, session: AsyncSession, keep: str | None = None
+):
+    if file_path is None or file_path == keep:
+        return
+    # Одинаковые фотографии хранятся в одном файле, поэтому удаляем его, только если он больше никому не нужен
+    if await users.crud_user.is_img_used_by_others(file_path, user_id, session):
+        return
+    users.imagestorage.remove_image(file_path)
+
+
 def make_template_change_email(code: str):
     return f"""
     <html>
@@ -10,6 +10,66 @@ class Config(BaseSettings):
         alias='POSTGRES_DSN_ASYNC'
     )
 
+    db_pool_size: int = Field(
+        default=5,
+        env='DB_POOL_SIZE',
+        alias='DB_POOL_SIZE'
+    )
+
+    db_max_overflow: int = Field(
+        default=10,
+        env='DB_MAX_OVERFLOW',
+        alias='DB_MAX_OVERFLOW'
+    )
+
+    db_pool_timeout: float = Field(
+        default=30,
+        env='DB_POOL_TIMEOUT',
+        alias='DB_POOL_TIMEOUT'
+    )
+
+    db_pool_recycle: int = Field(
+        default=1800,
+        env='DB_POOL_RECYCLE',
+        alias='DB_POOL_RECYCLE'
+    )
+
+    db_pool_pre_ping: bool = Field(
+        default=True,
+        env='DB_POOL_PRE_PING',
+        alias='DB_POOL_PRE_PING'
+    )
+
+    db_statement_timeout: int = Field(
+        default=0,
+        env='DB_STATEMENT_TIMEOUT',
+        alias='DB_STATEMENT_TIMEOUT'
+    )
+
+    db_session_warn_seconds: float = Field(
+        default=5,
+        env='DB_SESSION_WARN_SECONDS',
+        alias='DB_SESSION_WARN_SECONDS'
+    )
+
+    tracing_exporter: str = Field(
+        default='none',
+        env='TRACING_EXPORTER',
+        alias='TRACING_EXPORTER'
+    )
+
+    tracing_file_path: str = Field(
+        default='traces.jsonl',
+        env='TRACING_FILE_PATH',
+        alias='TRACING_FILE_PATH'
+    )
+
+    tracing_sample_ratio: float = Field(
+        default=1.0,
+        env='TRACING_SAMPLE_RATIO',
+        alias='TRACING_SAMPLE_RATIO'
+    )
+
     jwt_secret: SecretStr = Field(
         default='jwt_secret',
         env='JWT_SECRET',
@@ -70,6 +130,36 @@ class Config(BaseSettings):
         alias='PATH_TO_STORAGE'
     )
 
+    user_cache_ttl: float = Field(
+        default=30,
+        env='USER_CACHE_TTL',
+        alias='USER_CACHE_TTL'
+    )
+
+    user_cache_max_size: int = Field(
+        default=10000,
+        env='USER_CACHE_MAX_SIZE',
+        alias='USER_CACHE_MAX_SIZE'
+    )
+
+    image_workers: int = Field(
+        default=2,
+        env='IMAGE_WORKERS',
+        alias='IMAGE_WORKERS'
+    )
+
+    reference_cache_ttl: float = Field(
+        default=300,
+        env='REFERENCE_CACHE_TTL',
+        alias='REFERENCE_CACHE_TTL'
+    )
+
+    reference_cache_max_entries: int = Field(
+        default=64,
+        env='REFERENCE_CACHE_MAX_ENTRIES',
+        alias='REFERENCE_CACHE_MAX_ENTRIES'
+    )
+
     model_config = SettingsConfigDict(env_file=".env", extra='allow')
 
     @classmethod
@@ -1,5 +1,5 @@
-from . import groupcrud, crud_specialization, crud_user, crud_confirm_code, usermanager
+from . import groupcrud, crud_specialization, crud_user, crud_confirm_code, usermanager, usercache, imagestorage, referencecache
 from .secretprovider import inject_secrets
 from .userapp import include_routers
 
-__all__ = [include_routers, inject_secrets, groupcrud, crud_specialization, crud_user, crud_confirm_code, usermanager]
+__all__ = [include_routers, inject_secrets, groupcrud, crud_specialization, crud_user, crud_confirm_code, usermanager, usercache, imagestorage, referencecache]
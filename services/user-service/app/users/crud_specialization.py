@@ -5,6 +5,7 @@ from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .database import models
+from .referencecache import reference_cache
 from . import schemas
 
 
@@ -21,6 +22,7 @@ async def create_specialization(
 
     session.add(db_specialization)
     await session.commit()
+    reference_cache.invalidate('specializations')
     await session.refresh(db_specialization)
     return db_specialization
 
@@ -66,6 +68,7 @@ async def update_specialization(
                                    .values(specialization.model_dump(exclude_unset=True))
                                    )
     await session.commit()
+    reference_cache.invalidate('specializations')
     if result:
         return await get_specialization(session, specialization_id)
     return None
@@ -86,6 +89,7 @@ async def upsert_specialization(
     result = await session.execute(stm)
 
     await session.commit()
+    reference_cache.invalidate('specializations')
     if result:
         return await get_specialization(session, specialization.id)
     return None
@@ -103,4 +107,5 @@ async def delete_specialization(
                           .filter(models.Specialization.id == specialization_id)
                           )
     await session.commit()
+    reference_cache.invalidate('specializations')
     return bool(has_specialization)
@@ -1,10 +1,14 @@
+import base64
+import json
 import uuid
+from typing import AsyncIterator
 
-from sqlalchemy import select, update
+from sqlalchemy import Select, func, or_, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .database import models
 from .schemas import user
+from .usercache import user_cache
 
 
 async def get_user(
@@ -44,6 +48,7 @@ async def update_user(
     
     result = await session.execute(update(models.User).filter(models.User.id == user_id).values(user_in))
     await session.commit()
+    user_cache.invalidate(user_id)
     if result:
         return await get_user(user_id, session)
     return None
@@ -61,6 +66,7 @@ async def delete_user(
 
     deleted_user.is_deleted = True
     await session.commit()
+    user_cache.invalidate(user_id)
 
     return deleted_user.is_deleted
 
@@ -76,6 +82,7 @@ async def update_user_email(
                                    .values({"email": email, "is_verified": False})
                                    )
     await session.commit()
+    user_cache.invalidate(user_id)
     if result:
         return await get_user(user_id, session)
     return None
@@ -95,30 +102,128 @@ async def update_user_email(
 #     return result.scalars().one_or_none()
 
 
+USER_SUMMARY_COLUMNS = (
+    models.User.id,
+    models.User.name,
+    models.User.surname,
+    models.User.patronymic,
+    models.User.birthday,
+    models.User.img,
+    models.User.date_employment,
+    models.User.desc,
+    models.User.is_superuser,
+    models.Specialization.id.label('specialization_id'),
+    models.Specialization.name.label('specialization_name'),
+    models.Specialization.img.label('specialization_img')
+)
+
+
+def encode_cursor(surname: str, user_id: uuid.UUID) -> str:
+    """
+    Формирует курсор для получения следующей страницы списка пользователей
+    """
+    data = json.dumps([surname, str(user_id)]).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, uuid.UUID]:
+    """
+    Разбирает курсор страницы списка пользователей
+    """
+    try:
+        surname, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return surname, uuid.UUID(user_id)
+    except (ValueError, TypeError):
+        raise ValueError('Некорректный курсор')
+
+
+def make_user_summary(row) -> dict:
+    """
+    Преобразует строку выборки в краткую информацию о пользователе
+    """
+    summary = dict(row._mapping)
+    specialization_id = summary.pop('specialization_id')
+    specialization_name = summary.pop('specialization_name')
+    specialization_img = summary.pop('specialization_img')
+    summary['specialization'] = None
+    if specialization_id is not None:
+        summary['specialization'] = {
+            'id': specialization_id,
+            'name': specialization_name,
+            'img': specialization_img
+        }
+    return summary
+
+
+def make_users_summary_query(
+        search: str | None = None,
+        after: tuple[str, uuid.UUID] | None = None
+    ) -> Select:
+    """
+    Формирует запрос краткой информации о пользователях, отсортированных по фамилии
+    """
+    stmt = select(*USER_SUMMARY_COLUMNS) \
+        .outerjoin(models.Specialization, models.User.specialization_id == models.Specialization.id) \
+        .filter(models.User.is_deleted == False)
+
+    if search:
+        prefix = search.strip().lower()
+        stmt = stmt.filter(
+            or_(
+                func.lower(models.User.surname).startswith(prefix, autoescape=True),
+                func.lower(models.User.name).startswith(prefix, autoescape=True)
+            )
+        )
+    if after is not None:
+        stmt = stmt.filter(tuple_(models.User.surname, models.User.id) > tuple_(*after))
+
+    return stmt.order_by(models.User.surname, models.User.id)
+
+
 async def get_doctors_of_specialization(
         specialization_id: int,
-        session: AsyncSession
-    ) -> list[models.User]:
+        session: AsyncSession,
+        limit: int | None = 100,
+        after: tuple[str, uuid.UUID] | None = None
+    ) -> list[dict]:
     """
-    Возвращает список врачей конкретной специализации
+    Возвращает список врачей конкретной специализации, при limit=None - без ограничения
     """
 
-    result = await session.execute(select(models.User) \
-                                   .filter(models.User.specialization_id == specialization_id)
-                                   .filter(models.User.is_deleted == False))
-    return result.scalars().all()
+    stmt = make_users_summary_query(after=after) \
+        .filter(models.User.specialization_id == specialization_id) \
+        .limit(limit)
+    result = await session.execute(stmt)
+    return [make_user_summary(row) for row in result]
 
 
 async def get_users_list(
-        session: AsyncSession
-    ) -> list[models.User]:
+        session: AsyncSession,
+        limit: int | None = 100,
+        after: tuple[str, uuid.UUID] | None = None,
+        search: str | None = None
+    ) -> list[dict]:
     """
-    Возвращает список пользователей
+    Возвращает страницу списка пользователей, при limit=None - весь список
     """
-    stmt = select(models.User).filter(models.User.is_deleted == False)
-    
-    result = await session.execute(stmt.order_by(models.User.surname))
-    return result.scalars().all()
+    stmt = make_users_summary_query(search, after).limit(limit)
+
+    result = await session.execute(stmt)
+    return [make_user_summary(row) for row in result]
+
+
+async def stream_users_list(
+        session: AsyncSession,
+        search: str | None = None
+    ) -> AsyncIterator[dict]:
+    """
+    Возвращает весь список пользователей порциями через серверный курсор
+    """
+    stmt = make_users_summary_query(search).execution_options(yield_per=1000)
+
+    result = await session.stream(stmt)
+    async for row in result:
+        yield make_user_summary(row)
 
 
 async def update_img(
@@ -134,6 +239,20 @@ async def update_img(
                                    .values(fields_for_update)
                                    )
     await session.commit()
+    user_cache.invalidate(user_id)
     if result:
         return await get_user(user_id, session)
     return None
+
+
+async def is_img_used_by_others(
+        path_to_file: str, user_id: uuid.UUID, session: AsyncSession
+    ) -> bool:
+    """
+    Проверяет, используется ли фотография другими пользователями
+    """
+    result = await session.execute(select(models.User.id) \
+                                   .filter(models.User.img == path_to_file, models.User.id != user_id) \
+                                   .limit(1)
+                                   )
+    return result.first() is not None
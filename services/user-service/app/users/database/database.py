@@ -5,6 +5,7 @@ from fastapi_users.db import SQLAlchemyUserDatabase
 
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from common.pool import pool_monitor
 
 from . import models
 
@@ -14,13 +15,22 @@ class DatabaseInitializer:
         self.__base = base
         self.__async_session_maker = None
 
-    async def init_database(self, postgres_dsn):
-        engine = create_async_engine(postgres_dsn)
+    async def init_database(self, postgres_dsn, **engine_options):
+        engine = create_async_engine(postgres_dsn, **engine_options)
+        pool_monitor.attach(engine)
         self.__async_session_maker = async_sessionmaker(
             engine, expire_on_commit=False
         )
         async with engine.begin() as conn:
             await conn.run_sync(self.__base.metadata.create_all)
+            await conn.run_sync(self.__create_missing_indexes)
+
+    def __create_missing_indexes(self, conn):
+        # create_all создает индексы только вместе с новыми таблицами,
+        # поэтому индексы, добавленные к уже существующим таблицам, создаются отдельно
+        for table in self.__base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
     @property
     def async_session_maker(self):
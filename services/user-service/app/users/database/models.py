@@ -1,5 +1,5 @@
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID
-from sqlalchemy import Column, ForeignKey, Integer, String, Date, DateTime, Boolean
+from sqlalchemy import Column, ForeignKey, Integer, String, Date, DateTime, Boolean, Index, func
 from sqlalchemy.orm import mapped_column, relationship
 
 from . import database
@@ -27,6 +27,22 @@ class User(SQLAlchemyBaseUserTableUUID, database.Base):
     is_deleted = Column(Boolean, default=False)
 
 
+# Индекс для постраничной выборки пользователей по фамилии (keyset pagination)
+Index('ix_user_surname_id', User.surname, User.id)
+
+# Индексы для поиска пользователей по префиксу фамилии и имени
+Index(
+    'ix_user_surname_prefix',
+    func.lower(User.surname).label('surname_lower'),
+    postgresql_ops={'surname_lower': 'text_pattern_ops'}
+)
+Index(
+    'ix_user_name_prefix',
+    func.lower(User.name).label('name_lower'),
+    postgresql_ops={'name_lower': 'text_pattern_ops'}
+)
+
+
 class ConfirmCode(database.Base):
     __tablename__ = "confirm_code"
 
@@ -42,3 +58,10 @@ class Specialization(database.Base):
     id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     name = Column(String, nullable=False)
     img = Column(String, nullable=False)
+
+
+class SeedHash(database.Base):
+    __tablename__ = 'seed_hash'
+
+    name = Column(String, primary_key=True)
+    hash = Column(String(length=64), nullable=False)
@@ -5,6 +5,7 @@ from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .database import models
+from .referencecache import reference_cache
 from . import schemas
 
 
@@ -21,6 +22,7 @@ async def create_group(
 
     session.add(db_group)
     await session.commit()
+    reference_cache.invalidate('groups')
     await session.refresh(db_group)
     return db_group
 
@@ -65,6 +67,7 @@ async def update_group(
                                    .values(group.model_dump())
                                    )
     await session.commit()
+    reference_cache.invalidate('groups')
     if result:
         return await get_group(session, group_id)
     return None
@@ -85,6 +88,7 @@ async def upsert_group(
     result = await session.execute(stm)
 
     await session.commit()
+    reference_cache.invalidate('groups')
     if result:
         return await get_group(session, group.id)
     return None
@@ -102,4 +106,5 @@ async def delete_group(
                           .filter(models.Group.id == group_id)
                           )
     await session.commit()
+    reference_cache.invalidate('groups')
     return bool(has_group)
@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app import config
+
+
+app_config: config.Config = config.load_config()
+
+# Размеры (в пикселях) квадратных уменьшенных копий фотографии пользователя
+VARIANT_SIZES = {
+    "small": 64,
+    "medium": 256,
+    "large": 512
+}
+
+VARIANT_FORMATS = {
+    "webp": "WEBP",
+    "jpg": "JPEG"
+}
+
+ORIGINAL_MAX_SIZE = 2048
+
+HASHED_FILE_NAME = re.compile(r'^[0-9a-f]{64}(_(small|medium|large))?\.(jpg|webp)$')
+
+Image.MAX_IMAGE_PIXELS = 40_000_000
+
+image_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=app_config.image_workers, thread_name_prefix='image'
+)
+
+
+class InvalidImageError(Exception):
+    pass
+
+
+def make_variant_name(file_name: str, size: str, extension: str) -> str:
+    """
+    Возвращает имя файла уменьшенной копии фотографии
+    """
+    content_hash = os.path.splitext(os.path.basename(file_name))[0]
+    return f'{content_hash}_{size}.{extension}'
+
+
+def is_hashed_file_name(file_name: str) -> bool:
+    """
+    Проверяет, что имя файла сформировано по хэшу его содержимого (такие файлы неизменяемы)
+    """
+    return HASHED_FILE_NAME.match(file_name) is not None
+
+
+def process_image(content: bytes, path_to_storage: str) -> str:
+    """
+    Декодирует фотографию, удаляет метаданные, сохраняет оригинал и уменьшенные копии
+    под именами на основе хэша содержимого. Возвращает путь к оригиналу
+    """
+    content_hash = hashlib.sha256(content).hexdigest()
+    path_to_file = os.path.join(path_to_storage, f'{content_hash}.jpg')
+    if os.path.exists(path_to_file):
+        return path_to_file
+
+    try:
+        with Image.open(io.BytesIO(content)) as source:
+            source.load()
+            # Поворачиваем изображение по EXIF до того, как метаданные будут отброшены
+            image = ImageOps.exif_transpose(source).convert('RGB')
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        raise InvalidImageError() from exc
+
+    original = image.copy()
+    original.thumbnail((ORIGINAL_MAX_SIZE, ORIGINAL_MAX_SIZE))
+    for size_name, size in VARIANT_SIZES.items():
+        variant = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+        for extension, image_format in VARIANT_FORMATS.items():
+            variant_path = os.path.join(path_to_storage, make_variant_name(content_hash, size_name, extension))
+            save_image(variant, variant_path, image_format)
+    # Оригинал сохраняется последним: его наличие означает, что все копии уже созданы
+    save_image(original, path_to_file, 'JPEG')
+    return path_to_file
+
+
+def save_image(image: Image.Image, path_to_file: str, image_format: str):
+    tmp_path = f'{path_to_file}.{uuid.uuid4().hex}.tmp'
+    image.save(tmp_path, format=image_format, quality=85, optimize=True)
+    os.replace(tmp_path, path_to_file)
+
+
+def remove_image(path_to_file: str):
+    """
+    Удаляет фотографию пользователя вместе с ее уменьшенными копиями
+    """
+    paths = [path_to_file]
+    path_to_storage, file_name = os.path.split(path_to_file)
+    if is_hashed_file_name(file_name):
+        paths.extend(
+            os.path.join(path_to_storage, make_variant_name(file_name, size_name, extension))
+            for size_name in VARIANT_SIZES
+            for extension in VARIANT_FORMATS
+        )
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def save_user_image(content: bytes, path_to_storage: str) -> str:
+    """
+    Обрабатывает фотографию в пуле потоков, не блокируя цикл событий
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(image_executor, process_image, content, path_to_storage)
@@ -8,15 +8,46 @@ from fastapi_users.authentication import (AuthenticationBackend,
 
 from . import secretprovider, usermanager
 from .database import models
+from .usercache import user_cache
 from . import schemas
-from typing import Any
-from fastapi_users.jwt import generate_jwt
+from typing import Any, Optional
+import jwt
+from fastapi_users import exceptions
+from fastapi_users.jwt import generate_jwt, decode_jwt
 
 
 bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 
 
 class CustomJWTStrategy(JWTStrategy):
+    async def read_token(
+        self, token: Optional[str], user_manager: usermanager.UserManager
+    ) -> Optional[models.User]:
+        if token is None:
+            return None
+
+        try:
+            data = decode_jwt(
+                token, self.decode_key, self.token_audience, algorithms=[self.algorithm]
+            )
+            if data.get("sub") is None:
+                return None
+            user_id = user_manager.parse_id(data["sub"])
+        except (jwt.PyJWTError, exceptions.InvalidID):
+            return None
+
+        user = user_cache.get(user_id)
+        if user is not None:
+            # Копия из кэша привязывается к сессии запроса без обращения к базе
+            return await user_manager.user_db.session.merge(user, load=False)
+
+        try:
+            user = await user_manager.get(user_id)
+        except exceptions.UserNotExists:
+            return None
+        user_cache.set(user)
+        return user
+
     async def write_token(self, user: Any) -> str:
         data = {"sub": str(user.id), "aud": self.token_audience, "group_id": user.group_id}
         return generate_jwt(
@@ -0,0 +1,92 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app import config
+
+from .database import models
+
+
+app_config: config.Config = config.load_config()
+
+
+class UserCache:
+    """
+    Кэш пользователей, полученных по идентификатору из JWT (поле sub).
+    Ограничен по времени жизни записи и по количеству записей (LRU).
+    Хранятся копии значений колонок, а не объекты ORM: объект, привязанный к сессии одного запроса,
+    нельзя использовать в сессии другого, поэтому при каждом чтении создается новый отсоединенный объект.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.__users: OrderedDict[uuid.UUID, tuple[float, dict[str, Any]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: uuid.UUID) -> models.User | None:
+        """
+        Возвращает пользователя из кэша, если запись еще не устарела. Объект отсоединен от сессии,
+        перед использованием его нужно добавить в сессию запроса через session.merge(user, load=False)
+        """
+        item = self.__users.get(user_id)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expire_at, values = item
+        if expire_at < time.monotonic():
+            del self.__users[user_id]
+            self.misses += 1
+            return None
+
+        self.__users.move_to_end(user_id)
+        self.hits += 1
+        user = models.User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def set(self, user: models.User) -> None:
+        """
+        Добавляет пользователя в кэш
+        """
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(user).mapper.column_attrs}
+        self.__users[user.id] = (time.monotonic() + self.ttl, values)
+        self.__users.move_to_end(user.id)
+        while len(self.__users) > self.max_size:
+            self.__users.popitem(last=False)
+
+    def invalidate(self, user_id: uuid.UUID) -> None:
+        """
+        Удаляет пользователя из кэша
+        """
+        self.__users.pop(user_id, None)
+
+    def clear(self) -> None:
+        self.__users.clear()
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.__users),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "db_lookups_saved": self.hits
+        }
+
+
+user_cache: UserCache = UserCache(
+    ttl=app_config.user_cache_ttl,
+    max_size=app_config.user_cache_max_size
+)
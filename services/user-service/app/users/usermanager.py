@@ -1,11 +1,12 @@
 import uuid
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Union
 
 from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, UUIDIDMixin, InvalidPasswordException
 
 from .database import database, models
 from . import secretprovider, schemas
+from .usercache import user_cache
 
 from app import config
 
@@ -55,6 +56,26 @@ class UserManager(UUIDIDMixin, BaseUserManager[models.User, uuid.UUID]):
         message = make_verify_email_template(token, user.email, password)
         await send_email(message, subject, user.email)
 
+    async def on_after_update(
+            self, user: models.User, update_dict: Dict[str, Any], request: Optional[Request] = None
+    ):
+        user_cache.invalidate(user.id)
+
+    async def on_after_verify(
+            self, user: models.User, request: Optional[Request] = None
+    ):
+        user_cache.invalidate(user.id)
+
+    async def on_after_reset_password(
+            self, user: models.User, request: Optional[Request] = None
+    ):
+        user_cache.invalidate(user.id)
+
+    async def on_after_delete(
+            self, user: models.User, request: Optional[Request] = None
+    ):
+        user_cache.invalidate(user.id)
+
 
 async def get_user_manager(
         user_db=Depends(database.get_user_db),